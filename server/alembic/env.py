@@ -1,5 +1,6 @@
 from logging.config import fileConfig
 
+from core.config import DATABASE_URL
 from database.database import Base
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
@@ -10,6 +11,8 @@ from database.models import *
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
+# Same database as the app (core/config.py, DATABASE_URL environment variable); % is escaped for configparser
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -0,0 +1,112 @@
+"""
+Overhead of authenticating a request (dependencies.get_current_user): the former path (AuthService built per
+request, .env read, JWT decoded and user row queried on a sync session every time) vs the shared AuthService
+on an async session, without and with its token / user caches.
+
+Users live in a SQLite file (aiosqlite for the async engine); each query sleeps --db-latency-ms to stand for
+the round-trip to Postgres.
+
+Run from the server folder:
+    python -m benchmarks.bench_auth
+    python -m benchmarks.bench_auth --requests 5000 --db-latency-ms 2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from time import perf_counter
+from dotenv import load_dotenv
+from jose import jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from database.database import async_url
+from database.models.user import User
+from dependencies import get_current_user
+from services.auth_cache import TtlCache
+from services.auth_service import AuthService
+
+
+def legacy_current_user(authorization: str, db, secret_key: str) -> User:
+    """get_current_user before the shared AuthService, kept as the reference."""
+    load_dotenv(".env")
+    _, token = authorization.split()
+    user_id = jwt.decode(token, secret_key, algorithms=["HS256"]).get("sub")
+    return db.query(User).filter(User.id == user_id).first()
+
+
+async def run_async(args, async_engine, auth_service: AuthService, headers, user_ids) -> float:
+    SessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    start = perf_counter()
+    for i in range(args.requests):
+        # A request session per call, like dependencies.get_db
+        async with SessionLocal() as db:
+            user = await get_current_user(headers[i % len(headers)], db, auth_service)
+        assert user.id == user_ids[i % len(user_ids)]
+    elapsed = perf_counter() - start
+    await async_engine.dispose() # Its connections belong to this event loop
+    return elapsed / args.requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--users", type=int, default=20, help="Distinct users sending the requests")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(directory, 'users.db')}"
+    engine = create_engine(url)
+    async_engine = create_async_engine(async_url(url))
+    User.__table__.create(engine)
+    queries = 0
+
+    def round_trip(*_):
+        nonlocal queries
+        queries += 1
+        time.sleep(args.db_latency_ms / 1_000)
+
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        db.add_all([User(email=f"user{i}@example.com", name=f"User {i}", hashed_password="x") for i in range(args.users)])
+        db.commit()
+        user_ids = [user.id for user in db.query(User).all()]
+    event.listen(engine, "before_cursor_execute", round_trip)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", round_trip)
+
+    auth_service = AuthService()
+    auth_service.SECRET_KEY = "bench-secret"
+    headers = [f"Bearer {auth_service._create_access_token({'sub': str(user_id)})}" for user_id in user_ids]
+
+    queries = 0
+    start = perf_counter()
+    for i in range(args.requests):
+        with SessionLocal() as db:
+            user = legacy_current_user(headers[i % len(headers)], db, auth_service.SECRET_KEY)
+        assert user.id == user_ids[i % len(user_ids)]
+    legacy_us = (perf_counter() - start) / args.requests * 1e6
+    legacy_queries = queries / args.requests
+
+    uncached_service = AuthService()
+    uncached_service.SECRET_KEY = auth_service.SECRET_KEY
+    uncached_service.token_cache, uncached_service.user_cache = TtlCache(ttl_seconds=0), TtlCache(ttl_seconds=0)
+    queries = 0
+    uncached_us = asyncio.run(run_async(args, async_engine, uncached_service, headers, user_ids))
+    uncached_queries = queries / args.requests
+
+    queries = 0
+    cached_us = asyncio.run(run_async(args, async_engine, auth_service, headers, user_ids))
+    cached_queries = queries / args.requests
+
+    print(f"{args.requests} requests from {args.users} users, {args.db_latency_ms} ms per query")
+    print(f"{'legacy (sync)':>15}: {legacy_us:8.1f} us/request, {legacy_queries:.2f} queries/request")
+    print(f"{'async, no cache':>15}: {uncached_us:8.1f} us/request, {uncached_queries:.2f} queries/request")
+    print(f"{'async, cached':>15}: {cached_us:8.1f} us/request, {cached_queries:.2f} queries/request "
+          f"({legacy_us / cached_us:.1f}x)")
+    print(f"{'':>15}  {auth_service.cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Per-crop vs batched OCR latency on a synthetic shelf.
+
+Run from the server folder:
+    python -m benchmarks.bench_batched_ocr              # stub OCR engine
+    python -m benchmarks.bench_batched_ocr --paddle     # real PaddleOCR (needs the weights)
+"""
+import argparse
+import cv2
+from time import perf_counter
+from core.config import OCR_BATCH_SIZE
+from core.detection.utils import get_warped_crop, read_ocr_result, run_batched_ocr
+from benchmarks.synthetic import make_shelf_image, StubOcrEngine
+
+
+def load_ocr_engine(use_paddle: bool):
+    if not use_paddle:
+        return StubOcrEngine()
+    from core.detection.models import load_ocr_engine as load_paddle_ocr
+    return load_paddle_ocr()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spines", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=OCR_BATCH_SIZE)
+    parser.add_argument("--paddle", action="store_true", help="use the real PaddleOCR engine")
+    args = parser.parse_args()
+
+    img, obb_points = make_shelf_image(args.spines)
+    crops = [cv2.rotate(get_warped_crop(img, points), cv2.ROTATE_90_CLOCKWISE) for points in obb_points]
+    ocr_engine = load_ocr_engine(args.paddle)
+
+    # Warm-up (first calls of the real engine allocate memory)
+    run_batched_ocr(ocr_engine, crops[:args.batch_size], args.batch_size)
+
+    per_crop_times, batched_times = [], []
+    for _ in range(args.repeat):
+        start = perf_counter()
+        per_crop = [read_ocr_result(ocr_engine.predict(crop)[0]) for crop in crops]
+        per_crop_times.append(perf_counter() - start)
+
+        start = perf_counter()
+        batched = run_batched_ocr(ocr_engine, crops, args.batch_size)
+        batched_times.append(perf_counter() - start)
+
+        assert per_crop == batched, "Batched OCR results differ from per-crop results"
+
+    per_crop_ms = min(per_crop_times) * 1_000
+    batched_ms = min(batched_times) * 1_000
+    print(f"{len(crops)} spines, batch size {args.batch_size}")
+    print(f"per-crop : {per_crop_ms:8.1f} ms")
+    print(f"batched  : {batched_ms:8.1f} ms  (x{per_crop_ms / batched_ms:.2f})")
+
+
+if __name__ == "__main__":
+    main()
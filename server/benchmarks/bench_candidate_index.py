@@ -0,0 +1,51 @@
+"""
+Recall and latency of the trigram candidate index against brute-force matching.
+
+Run from the server folder:
+    python -m benchmarks.bench_candidate_index
+    python -m benchmarks.bench_candidate_index --rows 10000 100000 1000000 --queries 30
+"""
+import argparse
+import numpy as np
+from time import perf_counter
+from core.catalogue import build_signatures
+from core.detection.candidate_index import TrigramIndex
+from core.detection.utils import find_top_matches_batch
+from benchmarks.synthetic import make_catalogue, add_ocr_noise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=60, help="spines per simulated image")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'rows':>9} {'build ms':>9} {'index MB':>9} {'brute ms':>9} {'index ms':>9} {'top1 =':>7} {'found':>7}")
+    for n_rows in args.rows:
+        df = make_catalogue(n_rows)
+        signatures = build_signatures(df)
+        truth = rng.choice(n_rows, size=args.queries, replace=False)
+        queries = [add_ocr_noise(signatures[row], rng) for row in truth]
+
+        start = perf_counter()
+        index = TrigramIndex(signatures)
+        build_ms = (perf_counter() - start) * 1_000
+
+        start = perf_counter()
+        brute_indices, brute_scores = find_top_matches_batch(queries, signatures)
+        brute_ms = (perf_counter() - start) * 1_000
+
+        start = perf_counter()
+        index_indices, index_scores = find_top_matches_batch(queries, signatures, candidate_index=index)
+        index_ms = (perf_counter() - start) * 1_000
+
+        # Same best score as brute force (ties may pick another row), and true row still in the top 3
+        same_top1 = np.mean(np.isclose(brute_scores[:, 0], index_scores[:, 0]))
+        found = np.mean([row in candidates for row, candidates in zip(truth, index_indices)])
+        print(f"{n_rows:>9} {build_ms:>9.0f} {index.nbytes / 2**20:>9.1f} {brute_ms:>9.0f} {index_ms:>9.0f} "
+              f"{same_top1:>7.1%} {found:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Catalogue CSV ingestion: legacy parsing (whole upload in memory, python engine sniffing every line)
+vs core.catalogue.read_catalogue_csv (prefix sniffing, streamed C / pyarrow parsing, needed columns only).
+
+Each measure runs in a fresh process; peak RSS is sampled during the parsing.
+
+Run from the server folder:
+    python -m benchmarks.bench_csv_ingestion
+    python -m benchmarks.bench_csv_ingestion --rows 100000 1000000 --extra-columns 10
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import pandas as pd
+import psutil
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from benchmarks.synthetic import make_catalogue
+
+
+def write_csv(path: str, n_rows: int, extra_columns: int):
+    # Library exports carry many more columns than the ones we use
+    base = make_catalogue(min(n_rows, 100_000))
+    df = pd.concat([base] * -(-n_rows // len(base)), ignore_index=True).iloc[:n_rows]
+    for i in range(extra_columns):
+        df[f"extra_{i}"] = "lorem ipsum dolor"
+    df.to_csv(path, sep=";", index=False)
+
+
+def parse_legacy(path: str) -> pd.DataFrame:
+    with open(path, "rb") as file:
+        contents = file.read()
+    return pd.read_csv(io.BytesIO(contents), sep=None, engine="python")
+
+
+def parse_streamed(path: str, engine: str) -> pd.DataFrame:
+    from core.catalogue import read_catalogue_csv
+    with open(path, "rb") as file:
+        return read_catalogue_csv(file, engine=engine)
+
+
+def measure(mode: str, path: str):
+    """Runs in a child process. Returns (seconds, peak RSS increase in MB, dataframe MB)."""
+    import core.catalogue  # noqa: F401 (imports are not part of the measure)
+    process = psutil.Process()
+    rss_before = peak_rss = process.memory_info().rss
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak_rss
+        while not done.wait(0.005):
+            peak_rss = max(peak_rss, process.memory_info().rss)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    start = perf_counter()
+    df = parse_legacy(path) if mode == "legacy" else parse_streamed(path, mode)
+    seconds = perf_counter() - start
+    done.set()
+    sampler.join()
+    peak_rss = max(peak_rss, process.memory_info().rss)
+    return seconds, (peak_rss - rss_before) / 1024**2, df.memory_usage(deep=True).sum() / 1024**2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--extra-columns", type=int, default=6)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'file MB':>8} | {'mode':>8} {'s':>7} {'speedup':>7} {'peak RSS MB':>11} {'df MB':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n_rows in args.rows:
+            path = os.path.join(directory, f"catalogue_{n_rows}.csv")
+            write_csv(path, n_rows, args.extra_columns)
+            file_mb = os.path.getsize(path) / 1024**2
+
+            legacy_seconds = None
+            for mode in ["legacy", "c", "pyarrow"]:
+                # Fresh (spawned, not forked) process, so that memory freed by a previous run does not hide allocations
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    seconds, peak_mb, df_mb = executor.submit(measure, mode, path).result()
+                legacy_seconds = legacy_seconds or seconds
+                print(f"{n_rows:>9} {file_mb:>8.1f} | {mode:>8} {seconds:>7.2f} {legacy_seconds / seconds:>7.1f} "
+                      f"{peak_mb:>11.0f} {df_mb:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
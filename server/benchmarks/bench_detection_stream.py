@@ -0,0 +1,57 @@
+"""
+Perceived latency of a detection: detection_pipeline (everything at the end) vs stream_detection
+(polygons right after YOLO, then the books after each OCR batch).
+
+Run from the server folder:
+    python -m benchmarks.bench_detection_stream
+    python -m benchmarks.bench_detection_stream --spines 80 --rows 200000
+"""
+import argparse
+import numpy as np
+from functools import partial
+from time import perf_counter
+from core.catalogue import build_signatures, build_candidate_index
+from core.detection.detection_pipeline import detection_pipeline, stream_detection
+from core.detection.utils import detect_books
+from core.entities.detection import DetectionParams
+from benchmarks.synthetic import make_catalogue, make_shelf_image, StubYoloModel, StubOcrEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spines", type=int, default=60)
+    parser.add_argument("--rows", type=int, default=50_000, help="Catalogue size")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_catalogue(args.rows)
+    signatures = build_signatures(df)
+    candidate_index = build_candidate_index(signatures)
+    img, obb_points = make_shelf_image(args.spines, height=1600)
+    detector = partial(detect_books, StubYoloModel(obb_points, reference_width=img.shape[1]))
+    params = DetectionParams()
+
+    blocking_ms, boxes_ms, first_books_ms, result_ms = [], [], [], []
+    for _ in range(args.repeat):
+        start = perf_counter()
+        detection_pipeline(detector, StubOcrEngine(), img, "bench", signatures, df, params, candidate_index)
+        blocking_ms.append((perf_counter() - start) * 1_000)
+
+        start = perf_counter()
+        for update in stream_detection(detector, StubOcrEngine(), img, "bench", signatures, df, params,
+                                       candidate_index=candidate_index):
+            elapsed_ms = (perf_counter() - start) * 1_000
+            if update.event == "boxes":
+                boxes_ms.append(elapsed_ms)
+            elif update.event == "detections" and len(first_books_ms) < len(boxes_ms):
+                first_books_ms.append(elapsed_ms)
+        result_ms.append(elapsed_ms)
+
+    print(f"{args.spines} spines, catalogue of {args.rows} rows (median of {args.repeat} runs)")
+    print(f"{'detection_pipeline':>20}: everything after {np.median(blocking_ms):6.0f} ms")
+    print(f"{'stream_detection':>20}: boxes after {np.median(boxes_ms):6.0f} ms, first books after "
+          f"{np.median(first_books_ms):6.0f} ms, result after {np.median(result_ms):6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Accuracy and speed of the exported detection models against the PyTorch / native Paddle ones.
+
+For each backend, YOLO boxes are matched to the reference (.pt) boxes by polygon IoU
+and OCR texts are compared to the reference texts (similarity 0-100).
+Needs the weights and the exports (python -m scripts.export_models).
+
+Run from the server folder:
+    python -m benchmarks.bench_inference_backends --images ../photos/*.jpg
+    python -m benchmarks.bench_inference_backends --images shelf.jpg --backends onnx openvino --int8 --threads 4 --ocr
+"""
+import argparse
+import cv2
+import numpy as np
+from rapidfuzz import fuzz
+from time import perf_counter
+from core.config import DEFAULT_YOLO_CONF_THRESHOLD
+from core.detection.models import load_yolo_model, load_ocr_engine
+from core.detection.utils import decode_image, predict_obbs, get_warped_crop, run_batched_ocr
+from benchmarks.synthetic import make_shelf_image
+
+
+def polygon_iou(a: np.ndarray, b: np.ndarray) -> float:
+    a, b = a.astype(np.float32), b.astype(np.float32)
+    intersection, _ = cv2.intersectConvexConvex(a, b)
+    union = cv2.contourArea(a) + cv2.contourArea(b) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def compare_boxes(reference, candidate, iou_threshold: float = 0.5):
+    """Greedy matching of the candidate boxes on the reference ones. Returns (recall, precision, mean IoU, mean |dconf|)."""
+    (ref_points, ref_conf), (points, conf) = reference, candidate
+    used, ious, conf_diffs = set(), [], []
+    for i in np.argsort(-ref_conf):
+        best_j, best_iou = None, iou_threshold
+        for j in range(len(points)):
+            if j not in used:
+                iou = polygon_iou(ref_points[i], points[j])
+                if iou >= best_iou:
+                    best_j, best_iou = j, iou
+        if best_j is not None:
+            used.add(best_j)
+            ious.append(best_iou)
+            conf_diffs.append(abs(float(ref_conf[i]) - float(conf[best_j])))
+    return (len(ious) / max(len(ref_points), 1), len(ious) / max(len(points), 1),
+            float(np.mean(ious)) if ious else 0.0, float(np.mean(conf_diffs)) if conf_diffs else 0.0)
+
+
+def time_it(fn, repeat: int):
+    """Median duration (ms) of `repeat` calls, after a warm-up call."""
+    result = fn()
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        times.append((perf_counter() - start) * 1_000)
+    return result, float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", nargs="+", help="shelf photos (default: a synthetic shelf, for speed only)")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "openvino"], choices=["onnx", "openvino"])
+    parser.add_argument("--int8", action="store_true", help="also run the INT8 exports")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads per model")
+    parser.add_argument("--conf", type=float, default=DEFAULT_YOLO_CONF_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ocr", action="store_true", help="also compare PaddleOCR texts and speed")
+    args = parser.parse_args()
+
+    images = [decode_image(path) for path in args.images] if args.images else [make_shelf_image(40)[0]]
+    variants = [(backend, False) for backend in args.backends]
+    if args.int8:
+        variants += [(backend, True) for backend in args.backends]
+
+    # Reference: PyTorch YOLO + native Paddle OCR
+    model = load_yolo_model("pytorch", cpu_threads=args.threads)
+    reference, ref_ms = time_it(lambda: predict_obbs(model, images, args.conf), args.repeat)
+    crops = [cv2.rotate(get_warped_crop(img, points), cv2.ROTATE_90_CLOCKWISE)
+             for img, (obb_points, _) in zip(images, reference) for points in obb_points]
+    if args.ocr:
+        ocr_engine = load_ocr_engine("pytorch", cpu_threads=args.threads)
+        ref_texts, ref_ocr_ms = time_it(lambda: run_batched_ocr(ocr_engine, crops), args.repeat)
+
+    print(f"{len(images)} image(s), {sum(len(points) for points, _ in reference)} reference boxes, "
+          f"{len(crops)} crops")
+    print(f"{'backend':>14} | {'yolo ms':>8} {'speedup':>7} {'recall':>6} {'prec.':>6} {'IoU':>5} {'dconf':>6}"
+          + (f" | {'ocr ms':>8} {'speedup':>7} {'text sim':>8} {'exact':>6}" if args.ocr else ""))
+    row = f"{'pytorch':>14} | {ref_ms:>8.1f} {1:>7.2f} {1:>6.3f} {1:>6.3f} {1:>5.3f} {0:>6.3f}"
+    print(row + (f" | {ref_ocr_ms:>8.1f} {1:>7.2f} {100:>8.1f} {1:>6.3f}" if args.ocr else ""))
+
+    for backend, int8 in variants:
+        name = backend + (" int8" if int8 else "")
+        model = load_yolo_model(backend, int8=int8, cpu_threads=args.threads)
+        results, ms = time_it(lambda: predict_obbs(model, images, args.conf), args.repeat)
+        recall, precision, iou, conf_diff = np.mean([compare_boxes(ref, res) for ref, res in zip(reference, results)],
+                                                    axis=0)
+        row = f"{name:>14} | {ms:>8.1f} {ref_ms / ms:>7.2f} {recall:>6.3f} {precision:>6.3f} {iou:>5.3f} {conf_diff:>6.3f}"
+
+        if args.ocr:
+            # Same crops for every backend, so that only the recognizer differs
+            ocr_engine = load_ocr_engine(backend, int8=int8, cpu_threads=args.threads)
+            texts, ocr_ms = time_it(lambda: run_batched_ocr(ocr_engine, crops), args.repeat)
+            similarity = np.mean([fuzz.ratio(ref[0], text[0]) for ref, text in zip(ref_texts, texts)]) if crops else 100
+            exact = np.mean([ref[0] == text[0] for ref, text in zip(ref_texts, texts)]) if crops else 1
+            row += f" | {ocr_ms:>8.1f} {ref_ocr_ms / ocr_ms:>7.2f} {similarity:>8.1f} {exact:>6.3f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+OCR cache: how many spines of a session skip the recognizer, and how many of those get the text of another spine.
+
+A long shelf of look-alike spines (catalogue titles, random fonts and colours) is photographed in overlapping
+windows, each photo with its own scale, tilt, framing, exposure and JPEG compression, and every box with a few
+pixels of jitter (like YOLO). The photos are read in order through one OcrCache:
+    - hit rate: spines already seen on a previous photo that were taken from the cache
+    - wrong hits: cache hits that returned the text of another spine (must stay at 0)
+A second shelf of other books is then read in the same session: every hit on it would be a wrong one.
+Finally the OCR stage is timed with and without the cache, with the latency of StubOcrEngine.
+
+Run from the server folder:
+    python -m benchmarks.bench_ocr_cache
+    python -m benchmarks.bench_ocr_cache --spines 200 --photos 12 --min-similarity 0.7
+"""
+import argparse
+import cv2
+import numpy as np
+from time import perf_counter
+from core.config import OCR_CACHE_MIN_SIMILARITY
+from core.detection.ocr_cache import OcrCache
+from core.detection.utils import get_warped_crop, run_batched_ocr
+from benchmarks.synthetic import make_catalogue, make_shelf_image, StubOcrEngine
+
+
+def make_shelf(n_spines: int, seed: int):
+    catalogue = make_catalogue(n_spines, seed=seed)
+    titles = (catalogue["title"] + " " + catalogue["author"]).tolist()
+    return make_shelf_image(n_spines, height=1000, seed=seed, titles=titles)
+
+
+def take_photos(img: np.ndarray, obb_points: np.ndarray, n_photos: int, window: float, seed: int):
+    """
+    Overlapping photos of the shelf: each one frames `window` of its width, from left to right, then is
+    scaled, tilted, exposed and compressed differently. Returns [(crops, spine ids)] per photo.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = img.shape[:2]
+    frame_width = int(width * window)
+    photos = []
+    for k in range(n_photos):
+        left = int((width - frame_width) * k / max(n_photos - 1, 1))
+        scale, angle = rng.uniform(0.6, 1.1), rng.uniform(-1.5, 1.5)
+        M = cv2.getRotationMatrix2D((left + frame_width / 2, height / 2), angle, scale)
+        M[:, 2] += (frame_width * scale / 2 - (left + frame_width / 2), height * scale / 2 - height / 2)
+        M[:, 2] += rng.uniform(-10, 10, size=2)
+        photo = cv2.warpAffine(img, M, (int(frame_width * scale), int(height * scale)), borderValue=(235, 235, 235))
+        photo = cv2.convertScaleAbs(photo, alpha=rng.uniform(0.9, 1.1), beta=rng.uniform(-10, 10))
+        quality = int(rng.integers(60, 95))
+        photo = cv2.imdecode(cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_COLOR)
+
+        crops, ids = [], []
+        for spine_id, points in enumerate(obb_points):
+            moved = np.c_[points, np.ones(4)] @ M.T + rng.uniform(-2, 2, size=(4, 2))
+            if moved[:, 0].min() < 0 or moved[:, 0].max() >= photo.shape[1]:
+                continue # Spine cut by the frame: not detected
+            crop = get_warped_crop(photo, moved.astype(np.float32))
+            crops.append(cv2.rotate(crop, cv2.ROTATE_90_CLOCKWISE))
+            ids.append(spine_id)
+        photos.append((crops, ids))
+    return photos
+
+
+def replay(cache: OcrCache, scope: str, photos, seen: set, id_offset: int = 0):
+    """Read the photos through the cache with an oracle OCR (the spine id). Returns (repeats, hits, wrong)."""
+    repeats = hits = wrong = 0
+    for crops, ids in photos:
+        pending = []
+        for crop, spine_id in zip(crops, ids):
+            fingerprint, cached = cache.get(scope, crop)
+            repeats += (spine_id + id_offset) in seen
+            if cached is not None:
+                hits += 1
+                wrong += cached[0] != str(spine_id + id_offset)
+            else:
+                pending.append((fingerprint, spine_id))
+        # Like run_batched_ocr: the misses of a photo are cached after its OCR
+        for fingerprint, spine_id in pending:
+            cache.put(scope, fingerprint, (str(spine_id + id_offset), 1.0))
+        seen.update(spine_id + id_offset for spine_id in ids)
+    return repeats, hits, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spines", type=int, default=120)
+    parser.add_argument("--photos", type=int, default=8)
+    parser.add_argument("--window", type=float, default=0.35, help="Fraction of the shelf framed by each photo")
+    parser.add_argument("--min-similarity", type=float, default=OCR_CACHE_MIN_SIMILARITY)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    img, obb_points = make_shelf(args.spines, seed=args.seed)
+    photos = take_photos(img, obb_points, args.photos, args.window, seed=args.seed)
+    n_crops = sum(len(ids) for _, ids in photos)
+    print(f"{args.photos} photos, {n_crops} spine crops ({args.spines} distinct spines), "
+          f"min similarity {args.min_similarity}")
+
+    # Correctness: same shelf retaken, then another shelf in the same session
+    cache = OcrCache(min_similarity=args.min_similarity)
+    seen = set()
+    repeats, hits, wrong = replay(cache, "session", photos, seen)
+    print(f"{'same shelf':>14}: {hits}/{repeats} repeated spines from the cache ({hits / max(repeats, 1):.0%}), "
+          f"{wrong} wrong hits")
+
+    other_img, other_points = make_shelf(args.spines, seed=args.seed + 1)
+    other_photos = take_photos(other_img, other_points, args.photos, args.window, seed=args.seed + 1)
+    _, other_hits, other_wrong = replay(cache, "session", other_photos, seen, id_offset=args.spines)
+    print(f"{'other shelf':>14}: {other_wrong} wrong hits out of {other_hits} hits "
+          f"({sum(len(ids) for _, ids in other_photos)} crops)")
+    print(f"{'cache':>14}: {cache.stats()}")
+
+    # Time saved on the OCR stage
+    for label, ocr_cache in (("no cache", None), ("OcrCache", OcrCache(min_similarity=args.min_similarity))):
+        engine = StubOcrEngine()
+        start = perf_counter()
+        for crops, _ in photos:
+            run_batched_ocr(engine, crops, ocr_cache=ocr_cache, scope="session")
+        elapsed = perf_counter() - start
+        print(f"{label:>14}: {elapsed * 1_000:7.0f} ms OCR for the session, {engine.calls} recognizer calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Password hashing: throughput of the bcrypt process pool per cost factor, and latency of inventory requests
+during a login storm, with bcrypt run inline on the request threadpool (former sync routes) vs PasswordHasher.
+
+Inventory requests are short CPU-bound jobs sent every --interval-ms on a 40-thread pool, like the threadpool
+FastAPI runs sync routes and dependencies on.
+
+Run from the server folder:
+    python -m benchmarks.bench_password_hashing
+    python -m benchmarks.bench_password_hashing --rounds 10 12 --logins 64 --workers 2
+"""
+import argparse
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from services.password_hasher import PasswordHasher, hash_password
+
+REQUEST_THREADS = 40 # anyio's default limit, used by FastAPI for sync routes
+
+
+def inventory_work():
+    """Stands for a light request (session stats, redecision...): ~1 ms of Python holding the GIL."""
+    return sum(i * i for i in range(20_000))
+
+
+async def throughput(rounds: int, workers: int, n_hashes: int) -> float:
+    hasher = PasswordHasher(max_workers=workers, max_queue=n_hashes, rounds=rounds)
+    try:
+        await hasher.hash("warm-up")
+        start = perf_counter()
+        await asyncio.gather(*(hasher.hash(f"password{i}") for i in range(n_hashes)))
+        return n_hashes / (perf_counter() - start)
+    finally:
+        hasher.shutdown()
+
+
+async def storm(mode: str, args) -> np.ndarray:
+    """Inventory request latencies (ms) while `args.logins` logins are hashed ("none": no logins)."""
+    loop = asyncio.get_running_loop()
+    threadpool = ThreadPoolExecutor(REQUEST_THREADS)
+    hasher = PasswordHasher(max_workers=args.workers, max_queue=args.logins, rounds=args.storm_rounds)
+    await hasher.hash("warm-up")
+    try:
+        if mode == "inline":
+            logins = [loop.run_in_executor(threadpool, hash_password, f"password{i}", args.storm_rounds)
+                      for i in range(args.logins)]
+        elif mode == "pool":
+            logins = [asyncio.ensure_future(hasher.hash(f"password{i}")) for i in range(args.logins)]
+        else:
+            logins = []
+
+        async def request():
+            start = perf_counter()
+            await loop.run_in_executor(threadpool, inventory_work)
+            return (perf_counter() - start) * 1_000
+
+        requests = []
+        for _ in range(args.requests):
+            requests.append(asyncio.ensure_future(request()))
+            await asyncio.sleep(args.interval_ms / 1_000)
+        latencies = await asyncio.gather(*requests)
+        await asyncio.gather(*logins)
+        return np.array(latencies)
+    finally:
+        hasher.shutdown()
+        threadpool.shutdown()
+
+
+async def run(args):
+    print(f"bcrypt throughput ({args.workers} processes, {args.hashes} hashes)")
+    for rounds in args.rounds:
+        per_second = await throughput(rounds, args.workers, args.hashes)
+        print(f"  rounds {rounds:>2}: {per_second:7.1f} hashes/s ({args.workers / per_second * 1_000:6.0f} ms per hash)")
+
+    print(f"\ninventory requests during {args.logins} logins (rounds {args.storm_rounds}), "
+          f"one request every {args.interval_ms} ms")
+    for mode in ["none", "inline", "pool"]:
+        latencies = await storm(mode, args)
+        print(f"  {mode:>6}: p50 {np.percentile(latencies, 50):7.1f} ms, p95 {np.percentile(latencies, 95):7.1f} ms, "
+              f"max {latencies.max():7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12], help="Cost factors timed")
+    parser.add_argument("--workers", type=int, default=2, help="Hashing processes")
+    parser.add_argument("--hashes", type=int, default=16, help="Hashes per throughput measure")
+    parser.add_argument("--logins", type=int, default=48, help="Concurrent logins of the storm")
+    parser.add_argument("--storm-rounds", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100, help="Inventory requests sent during the storm")
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Persistence of the inventory sessions (services/inventory_store.py):
+- cost added to a detection request: queueing the result for the background writer vs writing its rows with
+  the ORM before answering (one INSERT per detection, commit);
+- catalogue ingest: books added one by one with the ORM vs the bulk load of InventoryStore (COPY on Postgres,
+  executemany here);
+- session restore after a restart: books read back from the database and the session rebuilt.
+
+The database is a SQLite file (aiosqlite for the async engine); each statement sleeps --db-latency-ms to stand
+for the round-trip to Postgres.
+
+Run from the server folder:
+    python -m benchmarks.bench_persistence
+    python -m benchmarks.bench_persistence --rows 200000 --requests 1000 --db-latency-ms 0.5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from time import perf_counter
+import numpy as np
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.synthetic import make_catalogue
+from core.catalogue import COLUMN_DTYPES
+from core.entities.detection import (DetectionColumns, DetectionResult, DetectionStatus, MatchMethod, STATUS_CODES,
+                                     METHOD_CODES)
+from database.database import Base, async_url
+from database.models import User, Catalogue, CatalogueBook, ScanSession, Detection
+from services.inventory_session_service import InventorySessionService
+from services.inventory_store import InventoryStore, catalogue_records, detection_rows
+from services.session_backends import InMemorySessionBackend
+
+
+def make_result(image_id: str, n_books: int, rng: np.random.Generator) -> DetectionResult:
+    x = np.arange(n_books, dtype=np.float32)[:, None] * 20
+    polygons = np.stack([np.hstack([x, np.zeros_like(x)]), np.hstack([x + 18, np.zeros_like(x)]),
+                         np.hstack([x + 18, np.full_like(x, 400)]), np.hstack([x, np.full_like(x, 400)])], axis=1)
+    candidate_rows = np.full((n_books, 3), -1, dtype=np.int32)
+    candidate_rows[:, 0] = rng.integers(0, 1_000, size=n_books)
+    detections = DetectionColumns(
+        polygons=polygons,
+        yolo_confidences=rng.uniform(0.3, 1, size=n_books).astype(np.float32),
+        ocr_confidences=rng.uniform(0.3, 1, size=n_books).astype(np.float32),
+        ocr_raw_texts=["fdio - Hary P."] * n_books,
+        ocr_cleaned_texts=["harry p"] * n_books,
+        statuses=np.full(n_books, STATUS_CODES[DetectionStatus.MATCHED], dtype=np.uint8),
+        match_methods=np.full(n_books, METHOD_CODES[MatchMethod.FUZZY], dtype=np.uint8),
+        candidate_rows=candidate_rows,
+        candidate_scores=np.where(candidate_rows >= 0, 91.0, 0.0).astype(np.float32)
+    )
+    return DetectionResult(detections=detections, session_id="1", image_id=image_id)
+
+
+def orm_save_result(SessionLocal, scan_session_id: str, result: DetectionResult):
+    """Synchronous write in the request: one ORM object per detection, then commit."""
+    with SessionLocal() as db:
+        db.query(Detection).filter(Detection.scan_session_id == scan_session_id,
+                                   Detection.image_id == result.image_id).delete()
+        for row in detection_rows(scan_session_id, result):
+            db.add(Detection(**row))
+        db.commit()
+
+
+def orm_ingest(SessionLocal, catalogue_id: str, df):
+    with SessionLocal() as db:
+        db.add(Catalogue(id=catalogue_id, row_count=len(df)))
+        for record in catalogue_records(catalogue_id, df):
+            db.add(CatalogueBook(**dict(zip(["catalogue_id", "row", "title", "author", "isbn", "editor"], record))))
+            db.flush() # Row by row, like an ingest loop committing each book
+        db.commit()
+
+
+async def run_store(args, url: str, df, results, scan_session_id: str):
+    engine = create_async_engine(async_url(url))
+    event.listen(engine.sync_engine, "before_cursor_execute", args.round_trip)
+    store = InventoryStore(engine=engine, max_pending=len(results) + 10)
+    try:
+        # Catalogue ingest
+        start = perf_counter()
+        store.add_catalogue("bulk", df)
+        await store.flush()
+        ingest_s = perf_counter() - start
+
+        # Per request: only the enqueue is on the request path
+        start = perf_counter()
+        for result in results:
+            store.add_result(scan_session_id, result)
+        enqueue_us = (perf_counter() - start) / len(results) * 1e6
+        start = perf_counter()
+        await store.flush()
+        flush_ms = (perf_counter() - start) * 1_000
+
+        # Restore after a restart: a fresh service, its session rebuilt from the database
+        async with engine.begin() as conn:
+            await conn.execute(ScanSession.__table__.insert().values(
+                id="restore", user_id=1, catalogue_id="bulk", started_at=datetime.now(timezone.utc),
+                detection_params={"yolo_conf_threshold": 0.5, "match_conf_threshold": 80.0,
+                                  "match_ambiguity_ratio": 0.9}))
+        service = InventorySessionService(backend=InMemorySessionBackend(), catalogue_cache=None, store=store)
+        start = perf_counter()
+        session = await service.get_or_restore_session(1)
+        restore_ms = (perf_counter() - start) * 1_000
+        assert session is not None and len(session.df) == len(df)
+        assert session.df.astype(str).equals(df.astype(COLUMN_DTYPES).astype(str))
+        assert session.scan_session_id == "restore"
+        return ingest_s, enqueue_us, flush_ms, restore_ms, store.stats()
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="Books of the bulk-loaded catalogue")
+    parser.add_argument("--orm-rows", type=int, default=2_000, help="Books of the row-by-row ingest")
+    parser.add_argument("--requests", type=int, default=300, help="Detection results saved")
+    parser.add_argument("--books", type=int, default=40, help="Detections per result")
+    parser.add_argument("--db-latency-ms", type=float, default=0.2)
+    args = parser.parse_args()
+    args.round_trip = lambda *_: time.sleep(args.db_latency_ms / 1_000)
+
+    directory = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(directory, 'inventory.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        db.add(User(id=1, email="user@example.com", name="User", hashed_password="x"))
+        db.add(Catalogue(id="orm-ref", row_count=0))
+        for scan_session_id in ["orm", "store"]:
+            db.add(ScanSession(id=scan_session_id, user_id=1, catalogue_id="orm-ref", detection_params={},
+                               started_at=datetime.now(timezone.utc)))
+        db.commit()
+    event.listen(engine, "before_cursor_execute", args.round_trip)
+
+    rng = np.random.default_rng(0)
+    df = make_catalogue(args.rows).astype(COLUMN_DTYPES)
+    results = [make_result(f"{i:040x}", args.books, rng) for i in range(args.requests)]
+
+    start = perf_counter()
+    for result in results:
+        orm_save_result(SessionLocal, "orm", result)
+    orm_us = (perf_counter() - start) / len(results) * 1e6
+
+    orm_df = df.head(args.orm_rows)
+    start = perf_counter()
+    orm_ingest(SessionLocal, "row-by-row", orm_df)
+    orm_rows_per_s = len(orm_df) / (perf_counter() - start)
+
+    ingest_s, enqueue_us, flush_ms, restore_ms, stats = asyncio.run(run_store(args, url, df, results, "store"))
+
+    with SessionLocal() as db:
+        saved = db.scalar(select(func.count()).select_from(Detection).where(Detection.scan_session_id == "store"))
+    assert saved == args.requests * args.books
+
+    print(f"{args.requests} results of {args.books} detections, {args.db_latency_ms} ms per statement")
+    print(f"  {'ORM write in request':>22}: {orm_us:9.1f} us/request")
+    print(f"  {'store enqueue':>22}: {enqueue_us:9.1f} us/request ({orm_us / enqueue_us:.0f}x), "
+          f"background flush {flush_ms:.0f} ms for all")
+    print(f"catalogue ingest")
+    print(f"  {'ORM row by row':>22}: {orm_rows_per_s:9.0f} books/s ({len(orm_df)} books)")
+    print(f"  {'store bulk load':>22}: {args.rows / ingest_s:9.0f} books/s ({args.rows} books, "
+          f"{args.rows / ingest_s / orm_rows_per_s:.0f}x)")
+    print(f"session restore ({args.rows} books): {restore_ms:.0f} ms")
+    print(f"  {stats}")
+
+
+if __name__ == "__main__":
+    main()
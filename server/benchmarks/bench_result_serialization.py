@@ -0,0 +1,151 @@
+"""
+Detection results: the former representation (a BookDetection dataclass per book, a BookCandidate per candidate,
+lists of lists for the polygons, serialized by jsonable_encoder + json.dumps) vs DetectionColumns (a few arrays
+per image, serialized by orjson, see core/detection/serialization.py).
+
+Measures the time to build the result of an image from its model outputs, the time to serialize it, the memory
+and the number of Python objects it holds, and checks that both give the same JSON.
+
+Run from the server folder:
+    python -m benchmarks.bench_result_serialization
+    python -m benchmarks.bench_result_serialization --spines 120 --rows 50000 --repeat 50
+"""
+import argparse
+import gc
+import json
+import math
+import tracemalloc
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from benchmarks.run_all import measure
+from benchmarks.synthetic import make_catalogue, add_ocr_noise
+from core.catalogue import build_signatures, build_candidate_index, build_isbn_index
+from core.detection.detection_pipeline import match_spines, decide_detections
+from core.detection.serialization import dumps
+from core.detection.utils import build_candidates, decide_statuses
+from core.entities.detection import BookDetection, DetectionIntermediates, DetectionParams, DetectionResult, \
+    DetectionStatus, MatchMethod, DETECTION_STATUSES
+
+TIMING_KEYS = {"timestamp", "processing_time_ms", "stage_timings_ms"} # Differ from one run to the other
+
+
+def make_intermediates(df, n_spines: int, rng: np.random.Generator) -> DetectionIntermediates:
+    """Model outputs of a shelf photo: noisy OCR of random catalogue books, matched like the pipeline does."""
+    signatures = build_signatures(df)
+    rows = rng.integers(0, len(df), size=n_spines)
+    ocr_results = [(add_ocr_noise(f"{df.at[row, 'title']} {df.at[row, 'author']}", rng), float(rng.uniform(0.5, 1)))
+                   for row in rows]
+    texts, match_indices, match_scores, isbn_matched = match_spines(ocr_results, signatures,
+                                                                    build_candidate_index(signatures),
+                                                                    build_isbn_index(df))
+    x = rng.uniform(0, 3_000, size=(n_spines, 1, 1))
+    corners = np.array([[0, 0], [40, 0], [40, 900], [0, 900]], dtype=np.float32)
+    return DetectionIntermediates(
+        session_id="bench", catalogue_id="bench", floor_conf=0.1,
+        obb_points=(corners + np.concatenate([x, np.zeros_like(x)], axis=2)).astype(np.float32),
+        yolo_confidences=rng.uniform(0.3, 1, size=n_spines).astype(np.float32),
+        ocr_results=ocr_results, ocr_cleaned_texts=texts, match_indices=match_indices, match_scores=match_scores,
+        isbn_matched=isbn_matched
+    )
+
+
+def legacy_result(intermediates: DetectionIntermediates, df, params) -> DetectionResult:
+    """decide_detections before DetectionColumns (one object per book and per candidate), kept as the reference."""
+    keep = np.flatnonzero(intermediates.yolo_confidences >= params.yolo_conf_threshold)
+    match_indices, match_scores = intermediates.match_indices[keep], intermediates.match_scores[keep]
+    statuses = [DETECTION_STATUSES[code] for code in decide_statuses(match_indices, match_scores, params)]
+    methods = [MatchMethod.NONE if status == DetectionStatus.UNKNOWN else MatchMethod.FUZZY for status in statuses]
+    for j, i in enumerate(keep):
+        if intermediates.isbn_matched[i]:
+            statuses[j], methods[j] = DetectionStatus.MATCHED, MatchMethod.ISBN
+
+    detections = []
+    for j, i in enumerate(keep):
+        raw_text, ocr_confidence = intermediates.ocr_results[i]
+        matches = build_candidates(match_indices[j], match_scores[j], df)
+        if statuses[j] == DetectionStatus.MATCHED:
+            matches = matches[:1]
+        detections.append(BookDetection(
+            box_polygon=intermediates.obb_points[i].tolist(),
+            yolo_confidence=float(intermediates.yolo_confidences[i]),
+            ocr_raw_text=raw_text,
+            ocr_cleaned_text=intermediates.ocr_cleaned_texts[i],
+            ocr_confidence=ocr_confidence,
+            status=statuses[j],
+            best_matches=matches,
+            match_method=methods[j]
+        ))
+
+    result = DetectionResult(detections=detections, session_id=intermediates.session_id)
+    result.total_detected = len(keep)
+    result.count_matched = statuses.count(DetectionStatus.MATCHED)
+    result.count_ambiguous = statuses.count(DetectionStatus.AMBIGUOUS)
+    result.count_unknown = statuses.count(DetectionStatus.UNKNOWN)
+    return result
+
+
+def legacy_dumps(result) -> bytes:
+    return json.dumps(jsonable_encoder(result)).encode()
+
+
+def footprint(build, n: int):
+    """Bytes allocated and gc-tracked objects held by `n` results alive at once."""
+    gc.collect()
+    objects = len(gc.get_objects())
+    tracemalloc.start()
+    results = [build() for _ in range(n)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    objects = len(gc.get_objects()) - objects
+    del results
+    return current / n, objects / n
+
+
+def same_json(a, b) -> bool:
+    """Equal JSON documents, the floats compared at float32 precision (the confidences are stored as float32)."""
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same_json(a[k], b[k]) for k in a if k not in TIMING_KEYS)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same_json(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-6)
+    return a == b
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spines", type=int, default=80, help="Books on the photo")
+    parser.add_argument("--rows", type=int, default=10_000, help="Books of the catalogue")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--alive", type=int, default=200, help="Results held at once for the memory measure")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = make_catalogue(args.rows)
+    params = DetectionParams(yolo_conf_threshold=0.3)
+    intermediates = make_intermediates(df, args.spines, rng)
+
+    legacy, columnar = legacy_result(intermediates, df, params), decide_detections(intermediates, df, params)
+    assert same_json(json.loads(legacy_dumps(legacy)), json.loads(dumps(columnar))), "different JSON"
+
+    rows = []
+    for name, build, serialize in [("dataclasses", lambda: legacy_result(intermediates, df, params), legacy_dumps),
+                                   ("columns", lambda: decide_detections(intermediates, df, params), dumps)]:
+        result = build()
+        build_ms = measure(build, args.repeat)["median_ms"]
+        serialize_ms = measure(lambda: serialize(result), args.repeat)["median_ms"]
+        nbytes, objects = footprint(build, args.alive)
+        rows.append((name, build_ms, serialize_ms, nbytes, objects, len(serialize(result))))
+
+    print(f"{args.spines} books per photo, catalogue of {args.rows} rows (median of {args.repeat})")
+    for name, build_ms, serialize_ms, nbytes, objects, size in rows:
+        print(f"  {name:>11}: build {build_ms:6.2f} ms, serialize {serialize_ms:6.2f} ms, "
+              f"{nbytes / 1_024:6.1f} KiB and {objects:6.0f} objects per result, JSON {size / 1_024:.1f} KiB")
+    (_, legacy_build, legacy_serialize, legacy_bytes, legacy_objects, _), (_, build, serialize, nbytes, objects, _) = rows
+    print(f"  {'gain':>11}: build + serialize x{(legacy_build + legacy_serialize) / (build + serialize):.1f}, "
+          f"memory x{legacy_bytes / nbytes:.1f}, objects x{legacy_objects / max(objects, 1):.0f}")
+
+
+if __name__ == "__main__":
+    main()
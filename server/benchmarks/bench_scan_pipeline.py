@@ -0,0 +1,66 @@
+"""
+Multi-photo scan: photos detected one after the other (analyze_bookshelf + decide_detections per photo)
+vs ShelfScan, where decoding, YOLO, OCR and matching of successive photos overlap.
+
+Stub YOLO and OCR engines sleep like real models (they release the GIL, like the native runtimes do),
+so the stages can overlap; the sequential time is the sum of the stages, the pipelined one tends to the
+busiest stage.
+
+Run from the server folder:
+    python -m benchmarks.bench_scan_pipeline
+    python -m benchmarks.bench_scan_pipeline --photos 30 --spines 40 --rows 100000
+"""
+import argparse
+import cv2
+from functools import partial
+from time import perf_counter
+from core.catalogue import build_signatures, build_candidate_index
+from core.detection.detection_pipeline import analyze_bookshelf, decide_detections
+from core.detection.scan_pipeline import ShelfScan
+from core.detection.utils import detect_books
+from core.entities.detection import DetectionParams
+from benchmarks.synthetic import make_catalogue, make_shelf_image, StubYoloModel, StubOcrEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=20)
+    parser.add_argument("--spines", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=50_000, help="Catalogue size")
+    args = parser.parse_args()
+
+    df = make_catalogue(args.rows)
+    signatures = build_signatures(df)
+    candidate_index = build_candidate_index(signatures)
+    img, obb_points = make_shelf_image(args.spines, height=1600)
+    photos = [cv2.imencode(".jpg", img)[1].tobytes() for _ in range(args.photos)]
+    detector = partial(detect_books, StubYoloModel(obb_points, reference_width=img.shape[1]))
+    params = DetectionParams()
+
+    start = perf_counter()
+    for photo in photos:
+        intermediates = analyze_bookshelf(detector, StubOcrEngine(), photo, "bench", signatures,
+                                          params.yolo_conf_threshold, candidate_index)
+        decide_detections(intermediates, df, params)
+    sequential_s = perf_counter() - start
+
+    shelf_scan = ShelfScan(detector, StubOcrEngine(), photos, "bench", signatures, df, params,
+                           candidate_index=candidate_index)
+    first_result_ms = None
+    start = perf_counter()
+    for _ in shelf_scan:
+        if first_result_ms is None:
+            first_result_ms = (perf_counter() - start) * 1_000
+    pipelined_s = perf_counter() - start
+
+    print(f"{args.photos} photos of {args.spines} spines, catalogue of {args.rows} rows")
+    print(f"{'sequential':>11}: {sequential_s:6.2f} s ({args.photos / sequential_s:5.1f} photos/s)")
+    print(f"{'ShelfScan':>11}: {pipelined_s:6.2f} s ({args.photos / pipelined_s:5.1f} photos/s, "
+          f"{sequential_s / pipelined_s:.1f}x), first photo after {first_result_ms:.0f} ms")
+    busy = shelf_scan.summary.stage_busy_ms
+    print(f"{'stage busy':>11}: " + ", ".join(f"{stage} {ms / 1_000:.2f} s" for stage, ms in busy.items())
+          + f" (slowest: {max(busy, key=busy.get)})")
+
+
+if __name__ == "__main__":
+    main()
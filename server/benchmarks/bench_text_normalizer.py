@@ -0,0 +1,89 @@
+"""
+OCR text cleaning: the former clean_ocr_text (7 re.sub per call) vs OcrTextNormalizer (one precompiled alternation).
+
+Checks first that both give the same output on every generated text, then times them.
+
+Run from the server folder:
+    python -m benchmarks.bench_text_normalizer
+    python -m benchmarks.bench_text_normalizer --texts 200000
+"""
+import argparse
+import re
+import numpy as np
+from time import perf_counter
+from core.detection.text_normalizer import OcrTextNormalizer
+from benchmarks.synthetic import make_catalogue, add_ocr_noise
+
+
+def legacy_clean_ocr_text(text):
+    """clean_ocr_text before OcrTextNormalizer, kept as the parity reference."""
+    if not text: return ""
+
+    garbage_patterns = [
+        r'\bdio\b', r'\bfdio\b', r'\bolio\b', r'\b6ho\b', r'\bBo\b', r'\bdo\b', r'\bOP\b',
+        r'\bfolio\b',
+        r'\d+\.\d+',
+        r'\b\d{4,}\b'
+    ]
+
+    cleaned = text
+    for pattern in garbage_patterns:
+        cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+
+    cleaned = cleaned.replace('-', ' ')
+    cleaned = ' '.join([w for w in cleaned.split() if len(w) > 1 or w.lower() in ['a', 'y', 'à', 'l', 'd']])
+    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+
+    return cleaned
+
+
+def make_ocr_texts(n_texts: int, seed: int = 0):
+    """Spine-like OCR outputs: noisy title and author lines, logo misreadings, prices, barcodes..."""
+    rng = np.random.default_rng(seed)
+    catalogue = make_catalogue(min(n_texts, 20_000), seed=seed)
+    extras = ["Folio", "FOLIO", "dio", "fdio", "olio", "6ho", "Bo", "do", "OP", "12.96", "7,50", "30875", "978207036",
+              "i", "à", "y", "L'", "-", "Édition", "n°", "1984", "Tome 2", "\t", "  "]
+    texts = []
+    for i in range(n_texts):
+        row = catalogue.iloc[i % len(catalogue)]
+        lines = [add_ocr_noise(row["title"], rng), add_ocr_noise(row["author"], rng)]
+        lines += list(rng.choice(extras, size=rng.integers(0, 4)))
+        rng.shuffle(lines)
+        texts.append(" - ".join(lines))
+    return texts + ["", " - ", "folio.dio", "1.51234", "1234.5.6789", "x1.21234 dio", "Do-do DIO 12345678"]
+
+
+def time_per_text(fn, texts, repeat: int) -> float:
+    """Best of `repeat` runs, in microseconds per text."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        fn(texts)
+        best = min(best, perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = make_ocr_texts(args.texts)
+    normalizer = OcrTextNormalizer()
+
+    mismatches = [(text, legacy_clean_ocr_text(text), normalizer.clean(text)) for text in texts
+                  if legacy_clean_ocr_text(text) != normalizer.clean(text)]
+    assert not mismatches, f"{len(mismatches)} outputs differ, e.g. {mismatches[:3]}"
+    print(f"parity: {len(texts)} texts, identical outputs")
+
+    legacy_us = time_per_text(lambda batch: [legacy_clean_ocr_text(text) for text in batch], texts, args.repeat)
+    clean_us = time_per_text(normalizer.clean_batch, texts, args.repeat)
+    normalize_us = time_per_text(lambda batch: normalizer.fold_batch(normalizer.clean_batch(batch)), texts, args.repeat)
+    print(f"{'legacy clean_ocr_text':>24}: {legacy_us:6.2f} us/text")
+    print(f"{'OcrTextNormalizer.clean':>24}: {clean_us:6.2f} us/text ({legacy_us / clean_us:.1f}x)")
+    print(f"{'clean + fold':>24}: {normalize_us:6.2f} us/text")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Load generator: YOLO throughput and latency with and without micro-batching.
+
+Concurrent clients send shelf images back to back to a stub YOLO model
+that behaves like a single GPU (fixed cost per call + cost per image).
+
+Run from the server folder:
+    python -m benchmarks.bench_yolo_batching
+    python -m benchmarks.bench_yolo_batching --clients 1 4 16 --window-ms 5
+"""
+import argparse
+import threading
+import numpy as np
+from functools import partial
+from time import perf_counter
+from core.detection.utils import detect_books
+from core.detection.yolo_batcher import YoloBatcher
+from benchmarks.synthetic import make_shelf_image, StubYoloModel
+
+
+def run_load(detector, img: np.ndarray, n_clients: int, requests_per_client: int):
+    """Every client sends its requests one after the other. Returns (images/s, latencies in ms)."""
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(requests_per_client):
+            start = perf_counter()
+            detector(img, 0.25)
+            with lock:
+                latencies.append((perf_counter() - start) * 1_000)
+
+    threads = [threading.Thread(target=client) for _ in range(n_clients)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies) / (perf_counter() - start), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    img, obb_points = make_shelf_image(40, height=800)
+    model = StubYoloModel(obb_points, reference_width=img.shape[1])
+
+    print(f"{'clients':>7} | {'mode':>8} {'img/s':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    for n_clients in args.clients:
+        batcher = YoloBatcher(model, max_batch_size=args.max_batch_size, window_ms=args.window_ms)
+        for mode, detector in [("direct", partial(detect_books, model)), ("batched", batcher.detect)]:
+            throughput, latencies = run_load(detector, img, n_clients, args.requests)
+            print(f"{n_clients:>7} | {mode:>8} {throughput:>7.1f} "
+                  f"{np.percentile(latencies, 50):>7.1f} {np.percentile(latencies, 95):>7.1f}")
+        print(f"        | mean batch size {batcher.stats()['mean_batch_size']:.1f}")
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
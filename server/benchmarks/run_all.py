@@ -0,0 +1,239 @@
+"""
+Reproducible benchmark suite: the hot paths of a detection timed on synthetic catalogues and shelves,
+with stub YOLO / OCR models of controllable latency. Runs offline on CPU, with fixed seeds.
+
+Measures clean_ocr_text, find_top_matches (per text, batched brute force and trigram index),
+get_warped_crop, the CSV ingestion of POST /inventory/session (cold and from the catalogue cache)
+and the detection_pipeline throughput. Results are written as JSON, to be compared between commits.
+
+Run from the server folder:
+    python -m benchmarks.run_all --output ../bench/HEAD.json
+    python -m benchmarks.run_all --rows 10000 100000 1000000 --output ../bench/HEAD.json
+    python -m benchmarks.run_all --only matching csv --compare ../bench/main.json --tolerance 0.15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+import pandas as pd
+from functools import partial
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+from core.catalogue import build_signatures, build_candidate_index, build_isbn_index
+from core.config import OCR_BATCH_SIZE
+from core.detection.detection_pipeline import detection_pipeline
+from core.detection.utils import clean_ocr_text, detect_books, find_top_matches, find_top_matches_batch, \
+    get_warped_crop
+from core.entities.detection import DetectionParams
+from services.catalogue_cache import CatalogueCache
+from services.inventory_session_service import InventorySessionService
+from services.session_backends import InMemorySessionBackend
+from benchmarks.synthetic import make_catalogue, make_shelf_image, add_ocr_noise, StubYoloModel, StubOcrEngine
+from benchmarks.bench_text_normalizer import make_ocr_texts
+
+SCHEMA_VERSION = 1
+
+
+def measure(fn: Callable[[], Any], repeat: int, per: int = 1, warmup: int = 1) -> Dict[str, float]:
+    """Times `fn` `repeat` times (after `warmup` calls), in ms per item when one call handles `per` items."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        times.append((perf_counter() - start) * 1_000 / per)
+    return {"median_ms": float(np.median(times)), "min_ms": float(np.min(times)), "max_ms": float(np.max(times)),
+            "runs": repeat}
+
+
+def bench_cleaning(args, results: Dict[str, Dict[str, Any]]):
+    texts = make_ocr_texts(args.texts)
+    results["clean_ocr_text"] = {**measure(lambda: [clean_ocr_text(text) for text in texts], args.repeat,
+                                           per=len(texts)), "items": len(texts)}
+
+
+def bench_matching(args, results: Dict[str, Dict[str, Any]]):
+    rng = np.random.default_rng(1)
+    for n_rows in args.rows:
+        df = make_catalogue(n_rows)
+        signatures = build_signatures(df)
+        candidate_index = build_candidate_index(signatures)
+        truth = rng.choice(n_rows, size=args.queries, replace=False)
+        queries = [add_ocr_noise(signatures[row], rng) for row in truth]
+
+        # The per-text scorer is the slowest: a few texts are enough
+        few = queries[:max(1, args.queries // 10)]
+        results[f"find_top_matches/{n_rows}"] = {
+            **measure(lambda: [find_top_matches(query, signatures, df) for query in few], args.repeat,
+                      per=len(few)), "items": len(few)}
+        results[f"find_top_matches_batch/brute/{n_rows}"] = {
+            **measure(lambda: find_top_matches_batch(queries, signatures), args.repeat, per=len(queries)),
+            "items": len(queries)}
+        if candidate_index is not None:
+            results[f"find_top_matches_batch/index/{n_rows}"] = {
+                **measure(lambda: find_top_matches_batch(queries, signatures, candidate_index=candidate_index),
+                          args.repeat, per=len(queries)), "items": len(queries)}
+
+
+def bench_warping(args, results: Dict[str, Dict[str, Any]]):
+    img, obb_points = make_shelf_image(args.spines, height=1600)
+    results["get_warped_crop"] = {
+        **measure(lambda: [get_warped_crop(img, points) for points in obb_points], args.repeat,
+                  per=len(obb_points)), "items": len(obb_points)}
+
+
+def bench_csv(args, results: Dict[str, Dict[str, Any]]):
+    """create_session_from_csv, as called by POST /inventory/session, on a library export with extra columns."""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = CatalogueCache(os.path.join(directory, "cache"))
+        for n_rows in args.rows:
+            df = make_catalogue(n_rows)
+            for i in range(4):
+                df[f"extra_{i}"] = "lorem ipsum dolor"
+            contents = df.to_csv(sep=";", index=False).encode()
+            params = DetectionParams()
+
+            def ingest(service: InventorySessionService):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    service.create_session_from_csv("bench", io.BytesIO(contents), params)
+
+            cold = InventorySessionService(backend=InMemorySessionBackend(), catalogue_cache=cache)
+            cold.catalogue_cache = None
+            cached = InventorySessionService(backend=InMemorySessionBackend(), catalogue_cache=cache)
+            repeat = max(1, args.repeat // 2) if n_rows >= 500_000 else args.repeat
+            results[f"csv_ingestion/cold/{n_rows}"] = {
+                **measure(lambda: ingest(cold), repeat, warmup=0), "file_mb": len(contents) / 1024**2}
+            results[f"csv_ingestion/cached/{n_rows}"] = {
+                **measure(lambda: ingest(cached), repeat), "file_mb": len(contents) / 1024**2}
+
+
+def bench_pipeline(args, results: Dict[str, Dict[str, Any]]):
+    img, obb_points = make_shelf_image(args.spines, height=1600)
+    photo = cv2.imencode(".jpg", img)[1].tobytes()
+    yolo = StubYoloModel(obb_points, reference_width=img.shape[1], call_overhead_s=args.yolo_ms / 1_000,
+                         per_image_s=0.0)
+    ocr_engine = StubOcrEngine(call_overhead_s=args.ocr_call_ms / 1_000, per_image_s=args.ocr_crop_ms / 1_000)
+    detector = partial(detect_books, yolo)
+    params = DetectionParams()
+
+    for n_rows in args.rows:
+        df = make_catalogue(n_rows)
+        signatures = build_signatures(df)
+        candidate_index = build_candidate_index(signatures)
+        isbn_index = build_isbn_index(df)
+        run = partial(detection_pipeline, detector, ocr_engine, photo, "bench", signatures, df, params,
+                      candidate_index, isbn_index)
+        stats = measure(run, args.repeat)
+        results[f"detection_pipeline/{n_rows}"] = {
+            **stats, "images_per_s": 1_000 / stats["median_ms"], "spines": args.spines,
+            # Time slept in the stub models: the rest is our code
+            "stub_model_ms": args.yolo_ms + args.ocr_call_ms * -(-args.spines // OCR_BATCH_SIZE)
+                             + args.ocr_crop_ms * args.spines}
+
+
+BENCHMARKS = {
+    "cleaning": bench_cleaning,
+    "matching": bench_matching,
+    "warping": bench_warping,
+    "csv": bench_csv,
+    "pipeline": bench_pipeline,
+}
+
+
+def environment() -> Dict[str, Any]:
+    def git(*command: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *command], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print the change of every median against the baseline. Returns the names of the regressions."""
+    regressions = []
+    print(f"\nagainst {baseline['environment'].get('commit') or '?'} ({baseline['environment'].get('date')})")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:>42}: new")
+            continue
+        ratio = result["median_ms"] / before["median_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print(f"{name:>42}: {before['median_ms']:10.3f} -> {result['median_ms']:10.3f} ms ({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="Catalogue sizes")
+    parser.add_argument("--spines", type=int, default=60, help="Spines per shelf image")
+    parser.add_argument("--queries", type=int, default=60, help="OCR texts matched per catalogue size")
+    parser.add_argument("--texts", type=int, default=20_000, help="OCR texts cleaned")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--yolo-ms", type=float, default=30.0, help="Stub YOLO latency per image")
+    parser.add_argument("--ocr-call-ms", type=float, default=15.0, help="Stub OCR latency per batch")
+    parser.add_argument("--ocr-crop-ms", type=float, default=4.0, help="Stub OCR latency per crop")
+    parser.add_argument("--output", help="JSON file to write (default: stdout only)")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Slowdown reported as a regression")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in args.only:
+        start = perf_counter()
+        BENCHMARKS[name](args, results)
+        print(f"{name} done in {perf_counter() - start:.1f} s", file=sys.stderr)
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "environment": environment(),
+        "parameters": {key: value for key, value in vars(args).items()
+                       if key not in ("only", "output", "compare", "tolerance")},
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("parameters") != report["parameters"]:
+            print("warning: the baseline was run with other parameters", file=sys.stderr)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Synthetic data and stub models shared by the benchmarks (no weights, no GPU needed)."""
+import threading
+import time
+import cv2
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+
+SYLLABLES = [consonant + vowel for consonant in ["b", "c", "ch", "d", "f", "g", "j", "l", "m", "n", "p", "qu", "r",
+                                                  "s", "t", "v", "br", "gr", "pl", "tr"]
+             for vowel in ["a", "e", "i", "o", "u", "ou", "an", "on", "ai", "eu"]]
+EDITORS = ["Folio", "Gallimard", "Le Livre de Poche", "Pocket", "Flammarion", "Actes Sud", "Seuil", "J'ai lu"]
+
+
+def _word(rng: np.random.Generator) -> str:
+    return "".join(rng.choice(SYLLABLES, size=rng.integers(1, 4)))
+
+
+def make_isbn13(rng: np.random.Generator) -> str:
+    """Random ISBN-13 with a valid checksum."""
+    digits = [9, 7, 8] + rng.integers(0, 10, size=9).tolist()
+    checksum = (10 - sum(d * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return "".join(map(str, digits + [checksum]))
+
+
+def make_catalogue(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Library CSV look-alike with the title, author, isbn and editor columns."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "title": [" ".join(_word(rng).capitalize() for _ in range(rng.integers(1, 5))) for _ in range(n_rows)],
+        "author": [f"{_word(rng).capitalize()} {_word(rng).capitalize()}" for _ in range(n_rows)],
+        "isbn": [make_isbn13(rng) for _ in range(n_rows)],
+        "editor": rng.choice(EDITORS, size=n_rows),
+    })
+
+
+def add_ocr_noise(text: str, rng: np.random.Generator, rate: float = 0.08) -> str:
+    """Simulate OCR mistakes: dropped, substituted and duplicated characters."""
+    chars = []
+    for char in text:
+        draw = rng.random()
+        if draw < rate / 3:
+            continue
+        if draw < 2 * rate / 3:
+            char = chr(rng.integers(97, 123))
+        elif draw < rate:
+            char = char * 2
+        chars.append(char)
+    return "".join(chars)
+
+
+def make_shelf_image(n_spines: int = 60, height: int = 1200, seed: int = 0,
+                     titles: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draw a shelf of `n_spines` vertical book spines with a title on each one.
+    With `titles`, spine i shows titles[i] with its own font, size and position (more realistic look-alikes).
+
+    Returns the BGR image and the (n_spines, 4, 2) OBB points of every spine,
+    in the same layout as `yolo_results.obb.xyxyxyxy`.
+    """
+    rng = np.random.default_rng(seed)
+    widths = rng.integers(30, 70, size=n_spines)
+    img = np.full((height, int(widths.sum()) + 20, 3), 235, dtype=np.uint8)
+    obb_points = np.zeros((n_spines, 4, 2), dtype=np.float32)
+
+    x = 10
+    for i, width in enumerate(widths):
+        spine_height = int(rng.integers(height * 2 // 3, height - 20))
+        top = height - 10 - spine_height
+
+        # Text is drawn horizontally then rotated, like a real spine
+        patch = np.zeros((width, spine_height, 3), dtype=np.uint8)
+        patch[:] = rng.integers(40, 200, size=3)
+        if titles is None:
+            cv2.putText(patch, f"Book {i} Author {i}", (10, width * 2 // 3), cv2.FONT_HERSHEY_SIMPLEX,
+                        width / 50, (255, 255, 255), 2)
+        else:
+            font = int(rng.choice([cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX, cv2.FONT_HERSHEY_COMPLEX,
+                                   cv2.FONT_HERSHEY_TRIPLEX]))
+            color = (255, 255, 255) if patch[0, 0].mean() < 120 else (20, 20, 20)
+            cv2.putText(patch, titles[i], (int(rng.integers(5, spine_height // 4)), width * 2 // 3), font,
+                        width / rng.uniform(45, 70), color, int(rng.integers(1, 3)))
+        img[top:top + spine_height, x:x + width] = cv2.rotate(patch, cv2.ROTATE_90_CLOCKWISE)
+
+        obb_points[i] = [[x + width, top], [x + width, top + spine_height], [x, top + spine_height], [x, top]]
+        x += int(width)
+
+    return img, obb_points
+
+
+class _StubTensor:
+    """Mimics the torch tensors of Ultralytics results (`.cpu().numpy()`)."""
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self) -> np.ndarray:
+        return self.array
+
+
+class _StubObb:
+    def __init__(self, obb_points: np.ndarray, confidences: np.ndarray):
+        self.xyxyxyxy = _StubTensor(obb_points)
+        self.conf = _StubTensor(confidences)
+
+
+class _StubResult:
+    def __init__(self, obb_points: np.ndarray, confidences: np.ndarray):
+        self.obb = _StubObb(obb_points, confidences)
+
+
+class StubYoloModel:
+    """
+    Stand-in for the Ultralytics YOLO OBB model with a controllable latency.
+
+    Calls are serialized like on a single GPU: each one pays `call_overhead_s` once
+    plus `per_image_s` per image. Every image gets the same `obb_points`,
+    scaled to its width relatively to `reference_width`.
+    """
+
+    def __init__(self, obb_points: np.ndarray, reference_width: int,
+                 call_overhead_s: float = 0.030, per_image_s: float = 0.006):
+        self.obb_points = obb_points.astype(np.float32)
+        self.confidences = np.linspace(0.3, 0.95, len(obb_points), dtype=np.float32)
+        self.reference_width = reference_width
+        self.call_overhead_s = call_overhead_s
+        self.per_image_s = per_image_s
+        self.calls = 0
+        self._device = threading.Lock()
+
+    def predict(self, source, conf: float = 0.25, verbose: bool = False) -> list:
+        images = source if isinstance(source, list) else [source]
+        with self._device:
+            self.calls += 1
+            time.sleep(self.call_overhead_s + self.per_image_s * len(images))
+
+        keep = self.confidences >= conf
+        return [_StubResult(self.obb_points[keep] * (image.shape[1] / self.reference_width), self.confidences[keep])
+                for image in images]
+
+
+class StubOcrEngine:
+    """
+    Stand-in for PaddleOCR with a controllable latency.
+
+    Every `predict` call pays `call_overhead_s` once, plus `per_image_s` for each image,
+    which is what makes batching worthwhile on the real engine.
+    Texts are derived from the pixels so that results can be compared between runs.
+    """
+
+    def __init__(self, call_overhead_s: float = 0.015, per_image_s: float = 0.004):
+        self.call_overhead_s = call_overhead_s
+        self.per_image_s = per_image_s
+        self.calls = 0
+
+    def predict(self, images) -> List[dict]:
+        if isinstance(images, np.ndarray):
+            images = [images]
+        self.calls += 1
+        time.sleep(self.call_overhead_s + self.per_image_s * len(images))
+        results = []
+        for image in images:
+            checksum = int(image.sum()) % 10_000
+            results.append({"rec_texts": [f"Book {checksum}", f"Author {image.shape[1]}"],
+                            "rec_scores": [0.9, 0.8]})
+        return results
@@ -0,0 +1,185 @@
+import csv
+import glob
+import io
+import json
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from core.config import CSV_SNIFF_BYTES, CSV_ENGINE, MATCH_INDEX_MIN_ROWS
+from core.detection.candidate_index import TrigramIndex
+from core.detection.isbn import IsbnIndex
+from core.detection.text_normalizer import ocr_text_normalizer
+from core.entities.exceptions import BadCatalogueException
+
+MANDATORY_COLUMNS = ["title", "author", "isbn"]
+OPTIONAL_COLUMNS = ["editor"]
+
+# ISBNs stay strings (leading zeros, final "X"), editors repeat a lot
+COLUMN_DTYPES = {"title": "str", "author": "str", "isbn": "str", "editor": "category"}
+
+
+def sniff_csv_header(prefix: bytes):
+    """Delimiter and column names of a CSV, guessed from its first bytes only."""
+    text = prefix.decode("utf-8-sig", errors="replace")
+    # Drop the last (probably truncated) line, unless the whole file fits in the prefix
+    if len(prefix) >= CSV_SNIFF_BYTES and "\n" in text:
+        text = text[:text.rindex("\n")]
+
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = "," # Single column, or nothing to compare
+
+    header = next(csv.reader(io.StringIO(text), delimiter=delimiter), [])
+    return delimiter, header
+
+
+def read_catalogue_csv(file: BinaryIO, engine: str = CSV_ENGINE) -> pd.DataFrame:
+    """
+    Parse an uploaded library CSV, streaming from `file` (never loaded whole in memory).
+
+    Only the catalogue columns are kept, with compact dtypes.
+    Raises BadCatalogueException if the file can't be parsed, is empty, or misses a mandatory column.
+    """
+    delimiter, header = sniff_csv_header(file.read(CSV_SNIFF_BYTES))
+    if not set(MANDATORY_COLUMNS).issubset(header):
+        raise BadCatalogueException("CSV is empty or doesn't have mandatory columns")
+    usecols: List[str] = [column for column in MANDATORY_COLUMNS + OPTIONAL_COLUMNS if column in header]
+
+    file.seek(0)
+    try:
+        df = pd.read_csv(file, sep=delimiter, engine=engine, usecols=usecols,
+                         dtype={column: COLUMN_DTYPES[column] for column in usecols})
+    except Exception:
+        if engine == "c":
+            raise BadCatalogueException("Bad CSV")
+        # The pyarrow parser is stricter (ragged rows, odd quoting...): retry with the C one
+        file.seek(0)
+        return read_catalogue_csv(file, engine="c")
+
+    if len(df) == 0:
+        raise BadCatalogueException("CSV is empty or doesn't have mandatory columns")
+    return df
+
+
+def build_signatures(df: pd.DataFrame) -> List[str]:
+    """Text each catalogue row is fuzzy matched on, folded like the OCR texts."""
+    return ocr_text_normalizer.fold_batch((df['author'].astype(str) + " " + df['title'].astype(str)).tolist())
+
+
+def build_candidate_index(signatures: List[str]) -> Optional[TrigramIndex]:
+    """Large catalogues get a trigram index, so that matching does not scan every row."""
+    return TrigramIndex(signatures) if len(signatures) >= MATCH_INDEX_MIN_ROWS else None
+
+
+def build_isbn_index(df: pd.DataFrame) -> IsbnIndex:
+    """Normalized ISBN -> row of every valid ISBN of the catalogue."""
+    return IsbnIndex.from_column(df['isbn'])
+
+
+# Prepared catalogue on disk: <base>.arrow (columns + signatures, metadata in the schema),
+# <base>.isbn.npy (normalized ISBNs) and <base>.offsets.npy / <base>.postings.npy (trigram index, if any)
+SIGNATURE_COLUMN = "__signature"
+
+
+def to_arrow_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The catalogue with the dtypes load_catalogue gives (ArrowDtype columns), whether it was parsed or
+    loaded from disk: sessions always hold the same dtypes. Returned as is when already converted.
+    """
+    if all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes):
+        return df
+    return pa.Table.from_pandas(df, preserve_index=False).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def catalogue_files(base: str) -> List[str]:
+    """The .arrow file of a catalogue and its arrays (every generation still on disk)."""
+    return [f"{base}.arrow"] + sorted(glob.glob(f"{glob.escape(base)}.*.npy"))
+
+
+def save_catalogue(base: str, df: pd.DataFrame, signatures: List[str], candidate_index: Optional[TrigramIndex],
+                   isbn_index: IsbnIndex, metadata: Dict[str, Any]):
+    """
+    Write a prepared catalogue (files are written then renamed, so that readers never map a half-written one).
+    The arrays are written under a new generation (<base>.<generation>.isbn.npy...), named in the metadata of
+    the .arrow file, which is renamed last: a reader always gets the arrays of the table it mapped, even while
+    the catalogue is being replaced. The arrays of the replaced generation are removed afterwards.
+    """
+    metadata = dict(metadata)
+    previous = _arrays_prefix(base)
+    metadata["arrays"] = uuid.uuid4().hex
+    prefix = f"{base}.{metadata['arrays']}"
+    _save_array(f"{prefix}.isbn.npy", isbn_index.keys)
+    if candidate_index is not None:
+        _save_array(f"{prefix}.offsets.npy", candidate_index.offsets)
+        _save_array(f"{prefix}.postings.npy", candidate_index.postings)
+        metadata["index"] = {"grams": list(candidate_index.slots), "n_rows": candidate_index.n_rows,
+                             "max_hits": candidate_index.max_hits}
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.append_column(SIGNATURE_COLUMN, pa.array(signatures, type=pa.string()))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"catalogue": json.dumps(metadata).encode()})
+
+    tmp_path = f"{base}.arrow.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, f"{base}.arrow")
+    if previous is not None:
+        remove_files(f"{previous}.isbn.npy", f"{previous}.offsets.npy", f"{previous}.postings.npy")
+
+
+def load_catalogue(base: str) -> Tuple[pd.DataFrame, List[str], Optional[TrigramIndex], IsbnIndex, Dict[str, Any]]:
+    """
+    Memory-map a catalogue written by save_catalogue: the columns are read zero-copy (DataFrame backed
+    by ArrowDtype), so every process loading it shares one copy of the data in the page cache.
+    Same dtypes as to_arrow_dtypes.
+    """
+    table = pa.ipc.open_file(pa.memory_map(f"{base}.arrow", "r")).read_all()
+    metadata = json.loads(table.schema.metadata[b"catalogue"])
+    prefix = f"{base}.{metadata['arrays']}" if "arrays" in metadata else base
+
+    candidate_index = None
+    if "index" in metadata:
+        candidate_index = TrigramIndex.from_arrays(
+            grams=metadata["index"]["grams"],
+            offsets=np.load(f"{prefix}.offsets.npy", mmap_mode="r"),
+            postings=np.load(f"{prefix}.postings.npy", mmap_mode="r"),
+            n_rows=metadata["index"]["n_rows"],
+            max_hits=metadata["index"]["max_hits"]
+        )
+
+    isbn_index = IsbnIndex(np.load(f"{prefix}.isbn.npy", mmap_mode="r"))
+
+    # rapidfuzz needs Python strings: this is the only per-process copy
+    signatures = table.column(SIGNATURE_COLUMN).to_pylist()
+    df = table.drop_columns([SIGNATURE_COLUMN]).to_pandas(types_mapper=pd.ArrowDtype)
+    return df, signatures, candidate_index, isbn_index, metadata
+
+
+def remove_files(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _arrays_prefix(base: str) -> Optional[str]:
+    """Prefix of the arrays of the catalogue currently at `base`, None if there is none."""
+    try:
+        schema = pa.ipc.open_file(pa.memory_map(f"{base}.arrow", "r")).schema
+    except FileNotFoundError:
+        return None
+    metadata = json.loads(schema.metadata[b"catalogue"])
+    return f"{base}.{metadata['arrays']}" if "arrays" in metadata else base
+
+
+def _save_array(path: str, array: np.ndarray):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        np.save(file, array)
+    os.replace(tmp_path, path)
@@ -3,19 +3,119 @@ import os
 # Auth: JWT Config
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+AUTH_CACHE_TTL_SECONDS = 60 # How long a verified token and its user row are reused without a DB query (0 = no cache)
+AUTH_CACHE_MAX_ENTRIES = 10_000 # Tokens (and users) cached per worker
+
+# Auth: password hashing (bcrypt runs in its own processes, off the request threads)
+BCRYPT_ROUNDS = 12 # Cost factor of new hashes (each +1 doubles the time, ~250 ms at 12); existing hashes keep theirs
+PASSWORD_HASH_WORKERS = 2 # Processes hashing / verifying passwords at the same time
+PASSWORD_HASH_MAX_QUEUE = 32 # Hashes allowed to wait for a process, above that register / login get a 429
 
 # Models paths
 YOLO_MODEL_PATH = os.path.abspath("../models_weights/yolo/best.pt") # .pt file
 PADDLEOCR_MODEL_PATH = os.path.abspath("../models_weights/paddleocr/") # folder
+PADDLEOCR_REC_MODEL_PATH = None # folder of the recognizer, None = PaddleOCR's default French model (downloaded)
+
+# Inference backend (exports are produced by scripts/export_models.py)
+INFERENCE_BACKEND = "pytorch" # "pytorch" (.pt weights, native Paddle OCR), "onnx" (ONNX Runtime) or "openvino"
+INFERENCE_INT8 = False # Use the INT8-quantized exports ("onnx" and "openvino" only)
+INFERENCE_CPU_THREADS = None # Threads used by each model on CPU, None = library default
+YOLO_ONNX_PATH = os.path.abspath("../models_weights/yolo/best.onnx")
+YOLO_ONNX_INT8_PATH = os.path.abspath("../models_weights/yolo/best.int8.onnx")
+YOLO_OPENVINO_PATH = os.path.abspath("../models_weights/yolo/best_openvino_model/best.xml")
+YOLO_OPENVINO_INT8_PATH = os.path.abspath("../models_weights/yolo/best_int8_openvino_model/best.xml")
+
+# Models loading (once per worker, in the FastAPI lifespan)
+MODELS_LOAD_AT_STARTUP = True # False: models are loaded by the first detection instead
+MODELS_LOAD_IN_BACKGROUND = True # Accept requests while loading (/health answers "warming" and detections get a 503)
+MODELS_WARMUP = True # Run a synthetic inference after loading, so that the first real request is not slower
+MODELS_RETRY_SECONDS = 60 # After a failed loading, detections get a 503 for that long before the next attempt
+
+# Inference executor
+INFERENCE_WORKERS = 1 # Detections running at the same time (each one uses YOLO + PaddleOCR)
+INFERENCE_MAX_QUEUE = 8 # Detections allowed to wait for a worker, above that requests get a 429
+
+# YOLO micro-batching: images of concurrent detections are sent to YOLO together
+# (batches only form when several detections run at once: the batcher is only built when INFERENCE_WORKERS > 1,
+# so it is off by default, see "YOLO micro-batching" in the README)
+YOLO_BATCH_MAX_SIZE = 8 # 1 disables the batching
+YOLO_BATCH_WINDOW_MS = 10 # How long the first image of a batch waits for others
+
+# Detection cache: model outputs of the last images, to re-apply new thresholds without the models
+DETECTION_FLOOR_CONF = 0.1 # Boxes are kept (and read) down to this YOLO confidence, re-decisions can't go lower
+DETECTION_CACHE_MAX_IMAGES = 256 # Images kept per worker (and in DETECTION_CACHE_DIR), least recently used first out
+
+# Multi-photo scans (POST /inventory/scan): decode, YOLO, OCR and matching of successive photos overlap
+SCAN_MAX_IMAGES = 60 # Photos accepted in a single scan
+SCAN_QUEUE_SIZE = 2 # Photos buffered between two stages (bounds the memory of decoded images and crops)
+SCAN_MAX_CONCURRENT = 1 # Scans running at the same time (each one runs 4 threads), above that requests get a 429
+
+# Profiling (opt-in): a /detect request with the header "X-Profile: 1" dumps a profile of its detection
+PROFILING_ENABLED = False # Keep off in production: any authenticated user could ask for profiles
+PROFILER = "cprofile" # "cprofile" (.prof, for pstats/snakeviz) or "pyinstrument" (sampling, .html, pip install pyinstrument)
+PROFILE_DIR = os.path.abspath("../profiles/")
+
+# Metrics: /metrics is meant for an internal scraper (not exposed by the public proxy)
+# With the METRICS_TOKEN environment variable set, it also requires the header "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
 
-# PostgreSQL database (if modified, edit the sqlalchemy.url variable in alembic.ini)
+# Image decoding
+DETECTOR_MAX_SIDE = 1280 # Longest side of the image given to YOLO (None = full resolution). Crops always use full resolution
+
+# OCR batching
+OCR_BATCH_SIZE = 16 # How many spine crops are sent to the recognizer in a single call
+
+# OCR cache: spines seen again within a session (retaken or overlapping photos) skip the recognizer
+OCR_CACHE_MAX_BYTES = 64 * 1024**2 # Memory budget of the cached results per worker (0 disables the cache)
+OCR_CACHE_MIN_SIMILARITY = 0.8 # Correlation (0-1) of the thumbnails of two crops to count as the same spine
+OCR_CACHE_MAX_COLOR_CHANGE = 40 # Max difference of the mean colour (per channel, 0-255) of the two crops
+
+# Fuzzy matching
+# Without the index, scoring an image at once only gains from several cores: on a single core it costs as much as
+# scoring text by text (same pairs scored), lower MATCH_INDEX_MIN_ROWS there instead (see benchmarks.run_all)
+MATCH_WORKERS = -1 # Threads used by rapidfuzz to score a whole image at once (-1 = all cores)
+MATCH_CHUNK_SIZE = 50_000 # Catalogue rows scored per chunk (bounds the score matrix memory)
+MATCH_INDEX_MIN_ROWS = 20_000 # From this catalogue size, a trigram index shortlists candidates before scoring
+MATCH_SHORTLIST_SIZE = 300 # Candidates rescored with token_set_ratio for each OCR text when the index is used
+
+# PostgreSQL database (Alembic uses the same DATABASE_URL)
 POSTGRESQL_USER = "book_detective_admin"
 POSTGRESQL_PASSWORD = "a4fg86"
+POSTGRESQL_HOST = "localhost"
 POSTGRESQL_PORT = 5432
 POSTGRESQL_DATABASE = "book_detective_db"
+# The DATABASE_URL environment variable overrides it, e.g. sqlite:///../dev.db to run without Postgres
+DATABASE_URL = os.environ.get("DATABASE_URL", f"postgresql://{POSTGRESQL_USER}:{POSTGRESQL_PASSWORD}@{POSTGRESQL_HOST}:{POSTGRESQL_PORT}/{POSTGRESQL_DATABASE}")
+
+# Database connection pool (per worker; requests use the async engine, asyncpg / aiosqlite)
+DB_POOL_SIZE = 5 # Connections kept open
+DB_MAX_OVERFLOW = 10 # Extra connections opened under load, closed when given back
+DB_POOL_TIMEOUT = 10 # Seconds a request waits for a free connection before failing
+DB_POOL_RECYCLE_SECONDS = 1800 # Connections older than this are reopened (idle timeouts of Postgres or a proxy)
+DB_POOL_PRE_PING = True # Check a connection before handing it out (one cheap round-trip, survives Postgres restarts)
+
+# Persistence of inventory sessions and detections (written in batches by a background task, off the requests)
+PERSISTENCE_ENABLED = True # Sessions lost by a restart are restored from the database on their next request
+PERSISTENCE_FLUSH_INTERVAL_SECONDS = 0.5 # How often the queued writes are flushed
+PERSISTENCE_MAX_PENDING = 10_000 # Queued writes (catalogues, sessions, photo results) above which new ones are dropped
+PERSISTENCE_CHUNK_ROWS = 50_000 # Catalogue rows per COPY (asyncpg) / executemany chunk
 
 # Inventory session manager
 TTL_SECONDS = 3600 # How long should we keep an inactive user's CSV in RAM before expiring the session?
+SESSION_SWEEP_INTERVAL_SECONDS = 60 # How often expired sessions are looked for
+MAX_SESSIONS_BYTES = 2 * 1024**3 # Memory cap of all catalogues, least recently used sessions are evicted above it
+SESSION_BACKEND = "memory" # "memory": one store per worker / "arrow_file": catalogues shared by every uvicorn worker
+SESSION_STORE_DIR = "/dev/shm/book_detective_sessions" if os.path.isdir("/dev/shm") else os.path.abspath("../sessions/") # "arrow_file" backend only
+DETECTION_CACHE_DIR = os.path.join(SESSION_STORE_DIR, "detections") # "arrow_file" backend only: model outputs shared by the workers too
+
+# Catalogue CSV upload
+CSV_ENGINE = "pyarrow" # pandas parser: "pyarrow" (multithreaded, fastest) or "c" (lowest peak memory). Files the pyarrow parser rejects are retried with "c"
+CSV_SNIFF_BYTES = 64 * 1024 # Bytes read to guess the delimiter and the header
+
+# Catalogue cache: prepared catalogues kept on disk, keyed by the hash of the uploaded CSV
+CATALOGUE_CACHE_ENABLED = True
+CATALOGUE_CACHE_DIR = os.path.abspath("../catalogue_cache/")
+CATALOGUE_CACHE_MAX_BYTES = 5 * 1024**3 # Least recently used catalogues are deleted above it
 
 # Default detection params
 DEFAULT_YOLO_CONF_THRESHOLD: float = 0.25
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from itertools import repeat
+from typing import List, Set
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Character trigrams of every word, padded with spaces so that word starts and ends count."""
+    grams = set()
+    for word in text.lower().split():
+        word = f" {word} "
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Inverted trigram index over the catalogue signatures, built once per inventory session.
+
+    Postings are stored in CSR layout: the rows containing the trigram of slot `s` are
+    `postings[offsets[s]:offsets[s + 1]]`, sorted by row.
+    It is only used to shortlist candidates: the final score is still the exact token_set_ratio.
+    """
+
+    def __init__(self, signatures: List[str], max_hits: int = 50_000):
+        self.n_rows = len(signatures)
+        # Upper bound of postings read per query: keeps lookups flat as the catalogue grows
+        self.max_hits = max_hits
+
+        grams, rows = [], []
+        for row, text in enumerate(signatures):
+            row_grams = _trigrams(text)
+            grams.extend(row_grams)
+            rows.extend(repeat(row, len(row_grams)))
+
+        codes, uniques = pd.factorize(np.asarray(grams, dtype=object))
+        order = np.argsort(codes, kind="stable")
+
+        self.postings = np.asarray(rows, dtype=np.int32)[order]
+        self.offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(codes, minlength=len(uniques)))
+        self.slots = {gram: slot for slot, gram in enumerate(uniques)}
+
+    @classmethod
+    def from_arrays(cls, grams: List[str], offsets: np.ndarray, postings: np.ndarray, n_rows: int,
+                    max_hits: int = 50_000) -> "TrigramIndex":
+        """Rebuild an index from its arrays (e.g. memory-mapped by another worker) without re-indexing."""
+        index = cls.__new__(cls)
+        index.n_rows = n_rows
+        index.max_hits = max_hits
+        index.offsets = offsets
+        index.postings = postings
+        index.slots = {gram: slot for slot, gram in enumerate(grams)}
+        return index
+
+    def shortlist(self, text: str, size: int) -> np.ndarray:
+        """Return up to `size` row indices sharing the most trigrams with `text`, sorted by row."""
+        slots = [self.slots[gram] for gram in _trigrams(text) if gram in self.slots]
+        if not slots:
+            return np.empty(0, dtype=np.int32)
+
+        # Read the rarest trigrams first, until the postings budget is spent ("le ", " de"... come last)
+        slots = np.asarray(slots)
+        lengths = self.offsets[slots + 1] - self.offsets[slots]
+        order = np.argsort(lengths, kind="stable")
+        n_used = max(1, int(np.searchsorted(np.cumsum(lengths[order]), self.max_hits, side="right")))
+        slots, lengths = slots[order[:n_used]], lengths[order[:n_used]]
+
+        # Rare trigrams weigh more than frequent ones (idf)
+        hits = np.concatenate([self.postings[self.offsets[slot]:self.offsets[slot + 1]] for slot in slots])
+        weights = np.repeat(np.log(self.n_rows / lengths), lengths)
+        rows, positions = np.unique(hits, return_inverse=True)
+        counts = np.bincount(positions, weights=weights)
+
+        if len(rows) <= size:
+            return rows
+        candidates = rows[np.argpartition(-counts, size - 1)[:size]]
+        candidates.sort()
+        return candidates
+
+    @property
+    def nbytes(self) -> int:
+        return self.postings.nbytes + self.offsets.nbytes
@@ -1,80 +1,265 @@
 import cv2
 import pandas as pd
-from server.core.detection.utils import get_warped_crop, clean_ocr_text, find_top_matches
+import numpy as np
+from core.detection.utils import decode_image, resize_for_detector, get_warped_crop, \
+    run_batched_ocr, iter_batched_ocr, find_top_matches_batch, decide_statuses
+from core.detection.candidate_index import TrigramIndex
+from core.detection.isbn import IsbnIndex
+from core.detection.ocr_cache import OcrCache
+from core.detection.text_normalizer import ocr_text_normalizer
+from core.detection.timing import timed
+from core.entities.detection import DetectionColumns, DetectionResult, DetectionStatus, MatchMethod, \
+    DetectionIntermediates, DetectionUpdate, STATUS_CODES, METHOD_CODES
 from time import time
-from typing import Iterable, Any
-from statistics import mean
-from server.core.entities.exceptions import ImageNotFoundException, EmptyImageException
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple, Union
 
 
-def detection_pipeline(yolo_model,
+def locate_books(detector: Callable[[np.ndarray, float], Tuple[np.ndarray, np.ndarray]], img: np.ndarray,
+                 floor_conf: float,
+                 timings: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+    """YOLO stage: OBB points and confidences of the books down to `floor_conf`, and their upright crops."""
+    with timed(timings, "yolo"):
+        detector_img, scale = resize_for_detector(img)
+
+        # Book segmentation (detect_books, or a YoloBatcher shared with concurrent requests)
+        obb_points, confidences = detector(detector_img, floor_conf)
+        obb_points = obb_points * scale
+
+    # Crop & rotate every book first, so that OCR can run in batches
+    with timed(timings, "warp"):
+        crops = []
+        for points in obb_points:
+            crop = get_warped_crop(img, points)
+            crops.append(cv2.rotate(crop, cv2.ROTATE_90_CLOCKWISE))
+    return obb_points, confidences, crops
+
+
+def match_spines(ocr_results: List[Tuple[str, float]], signatures: List[str],
+                 candidate_index: Optional[TrigramIndex] = None, isbn_index: Optional[IsbnIndex] = None,
+                 timings: Optional[Dict[str, float]] = None):
+    """Matching stage: cleaned texts, top 3 catalogue rows and scores of every spine, and which ones matched an ISBN."""
+    # Clean, then fold like the signatures (case, accents, punctuation) for the matching
+    with timed(timings, "clean"):
+        texts = ocr_text_normalizer.clean_batch([raw_text for raw_text, _ in ocr_results])
+        queries = ocr_text_normalizer.fold_batch(texts)
+
+    # ISBN fast path: exact lookup of the ISBNs read on the spine (barcode caption, sticker...), no fuzzy matching
+    with timed(timings, "match"):
+        isbn_rows = [isbn_index.find_row(raw_text) if isbn_index is not None else None for raw_text, _ in ocr_results]
+        fuzzy = [i for i, row in enumerate(isbn_rows) if row is None]
+
+        # Top 3 Matching, for every other book at once
+        match_indices = np.full((len(ocr_results), 3), -1, dtype=np.int64)
+        match_scores = np.zeros((len(ocr_results), 3), dtype=np.float32)
+        match_indices[fuzzy], match_scores[fuzzy] = find_top_matches_batch([queries[i] for i in fuzzy], signatures,
+                                                                           limit=3, candidate_index=candidate_index)
+        isbn_matched = np.array([row is not None for row in isbn_rows], dtype=bool)
+        for i, row in enumerate(isbn_rows):
+            if row is not None:
+                match_indices[i, 0], match_scores[i, 0] = row, 100.0
+    return texts, match_indices, match_scores, isbn_matched
+
+
+def analyze_bookshelf(detector: Callable[[np.ndarray, float], Tuple[np.ndarray, np.ndarray]],
+                      ocr_engine,
+                      image: Union[str, bytes, np.ndarray],
+                      session_id: str,
+                      signatures: List[str],
+                      floor_conf: float,
+                      candidate_index: Optional[TrigramIndex] = None,
+                      isbn_index: Optional[IsbnIndex] = None,
+                      catalogue_id: str = "",
+                      ocr_cache: Optional[OcrCache] = None) -> DetectionIntermediates:
+    """
+    Model stages of the detection (YOLO, OCR, matching), for every box down to `floor_conf`.
+    The decision (thresholds of DetectionParams) is left to decide_detections, so that it can be re-applied.
+    Spines already read in the session are taken from `ocr_cache` instead of the recognizer.
+    """
+    starting_time = time()
+    timings: Dict[str, float] = {}
+
+    # Load image (decoded once, BGR like cv2 and Ultralytics expect)
+    with timed(timings, "decode"):
+        img = decode_image(image)
+    obb_points, confidences, crops = locate_books(detector, img, floor_conf, timings)
+
+    # Perform OCR
+    with timed(timings, "ocr"):
+        ocr_results = run_batched_ocr(ocr_engine, crops, ocr_cache=ocr_cache, scope=session_id)
+    del crops
+
+    texts, match_indices, match_scores, isbn_matched = match_spines(ocr_results, signatures, candidate_index,
+                                                                    isbn_index, timings)
+
+    return DetectionIntermediates(
+        session_id=session_id,
+        catalogue_id=catalogue_id,
+        floor_conf=floor_conf,
+        obb_points=np.asarray(obb_points, dtype=np.float32),
+        yolo_confidences=np.asarray(confidences, dtype=np.float32),
+        ocr_results=ocr_results,
+        ocr_cleaned_texts=texts,
+        match_indices=match_indices,
+        match_scores=match_scores,
+        isbn_matched=isbn_matched,
+        processing_time_ms=(time() - starting_time) * 1_000,
+        stage_timings_ms=timings
+    )
+
+
+def build_detections(intermediates: DetectionIntermediates, rows: np.ndarray, df: pd.DataFrame,
+                     detection_params) -> DetectionColumns:
+    """Decided detections of the boxes `rows` (indices in the intermediates), as columns."""
+    match_indices, match_scores = intermediates.match_indices[rows], intermediates.match_scores[rows]
+
+    # Decision (a book identified by its ISBN is always matched)
+    statuses = decide_statuses(match_indices, match_scores, detection_params)
+    methods = np.where(statuses == STATUS_CODES[DetectionStatus.UNKNOWN], METHOD_CODES[MatchMethod.NONE],
+                       METHOD_CODES[MatchMethod.FUZZY]).astype(np.uint8)
+    isbn_matched = intermediates.isbn_matched[rows]
+    statuses[isbn_matched], methods[isbn_matched] = STATUS_CODES[DetectionStatus.MATCHED], METHOD_CODES[MatchMethod.ISBN]
+
+    # A matched book only keeps its best candidate
+    candidate_rows = match_indices.astype(np.int32)
+    candidate_rows[statuses == STATUS_CODES[DetectionStatus.MATCHED], 1:] = -1
+
+    ocr_results = [intermediates.ocr_results[i] for i in rows]
+    return DetectionColumns(
+        polygons=intermediates.obb_points[rows],
+        yolo_confidences=intermediates.yolo_confidences[rows],
+        ocr_confidences=np.array([confidence for _, confidence in ocr_results], dtype=np.float32),
+        ocr_raw_texts=[raw_text for raw_text, _ in ocr_results],
+        ocr_cleaned_texts=[intermediates.ocr_cleaned_texts[i] for i in rows],
+        statuses=statuses,
+        match_methods=methods,
+        candidate_rows=candidate_rows,
+        candidate_scores=match_scores.astype(np.float32),
+        catalogue=df
+    )
+
+
+def decide_detections(intermediates: DetectionIntermediates, df: pd.DataFrame, detection_params,
+                      include_analysis_time: bool = True) -> DetectionResult:
+    """
+    Apply the thresholds of `detection_params` to the model outputs of an image (no model involved).
+    processing_time_ms counts the model stages too, unless `include_analysis_time` is False (re-decisions).
+    """
+    starting_time = time()
+
+    # Boxes below the YOLO threshold are dropped
+    keep = np.flatnonzero(intermediates.yolo_confidences >= detection_params.yolo_conf_threshold)
+
+    detection_result = DetectionResult(detections=build_detections(intermediates, keep, df, detection_params),
+                                       session_id=intermediates.session_id)
+    detection_result.total_detected = len(keep)
+    counts = np.bincount(detection_result.detections.statuses, minlength=len(STATUS_CODES))
+    detection_result.count_matched = int(counts[STATUS_CODES[DetectionStatus.MATCHED]])
+    detection_result.count_ambiguous = int(counts[STATUS_CODES[DetectionStatus.AMBIGUOUS]])
+    detection_result.count_unknown = int(counts[STATUS_CODES[DetectionStatus.UNKNOWN]])
+
+    detection_result.processing_time_ms = (time() - starting_time) * 1_000
+    detection_result.stage_timings_ms["decide"] = detection_result.processing_time_ms
+    if include_analysis_time:
+        detection_result.processing_time_ms += intermediates.processing_time_ms
+        detection_result.stage_timings_ms = {**intermediates.stage_timings_ms, **detection_result.stage_timings_ms}
+
+    return detection_result
+
+
+def detection_pipeline(detector: Callable[[np.ndarray, float], Tuple[np.ndarray, np.ndarray]],
                        ocr_engine,
-                       image_path:str,
+                       image: Union[str, bytes, np.ndarray],
                        session_id: str,
-                       signatures: Iterable[str],
+                       signatures: List[str],
                        df: pd.DataFrame,
-                       detection_params: dict[str, Any]):
+                       detection_params: dict[str, Any],
+                       candidate_index: Optional[TrigramIndex] = None,
+                       isbn_index: Optional[IsbnIndex] = None,
+                       ocr_cache: Optional[OcrCache] = None):
+    """Whole detection of a shelf photo at the thresholds of `detection_params`."""
+    intermediates = analyze_bookshelf(detector, ocr_engine, image, session_id, signatures,
+                                      detection_params.yolo_conf_threshold, candidate_index, isbn_index,
+                                      ocr_cache=ocr_cache)
+    return decide_detections(intermediates, df, detection_params)
+
+
+def stream_detection(detector: Callable[[np.ndarray, float], Tuple[np.ndarray, np.ndarray]],
+                     ocr_engine,
+                     image: Union[str, bytes, np.ndarray],
+                     session_id: str,
+                     signatures: List[str],
+                     df: pd.DataFrame,
+                     detection_params,
+                     floor_conf: Optional[float] = None,
+                     candidate_index: Optional[TrigramIndex] = None,
+                     isbn_index: Optional[IsbnIndex] = None,
+                     catalogue_id: str = "",
+                     ocr_cache: Optional[OcrCache] = None,
+                     on_analyzed: Optional[Callable[[DetectionIntermediates], None]] = None
+                     ) -> Iterator[DetectionUpdate]:
+    """
+    Same detection as analyze_bookshelf + decide_detections, yielded as it goes so that a client can draw early:
+    the polygons right after YOLO ("boxes"), the decided books after each OCR batch ("detections"),
+    then the whole DetectionResult ("result"). `on_analyzed` gets the model outputs (e.g. for the detection cache).
+    """
     starting_time = time()
+    timings: Dict[str, float] = {}
+    floor_conf = detection_params.yolo_conf_threshold if floor_conf is None else floor_conf
+
+    with timed(timings, "decode"):
+        img = decode_image(image)
+    obb_points, confidences, crops = locate_books(detector, img, floor_conf, timings)
+    del img
+    n_boxes = len(crops)
+    intermediates = DetectionIntermediates(
+        session_id=session_id,
+        catalogue_id=catalogue_id,
+        floor_conf=floor_conf,
+        obb_points=np.asarray(obb_points, dtype=np.float32),
+        yolo_confidences=np.asarray(confidences, dtype=np.float32),
+        ocr_results=[("", 0.0)] * n_boxes,
+        ocr_cleaned_texts=[""] * n_boxes,
+        match_indices=np.full((n_boxes, 3), -1, dtype=np.int64),
+        match_scores=np.zeros((n_boxes, 3), dtype=np.float32),
+        isbn_matched=np.zeros(n_boxes, dtype=bool),
+        stage_timings_ms=timings
+    )
+
+    # Position of each kept box (above the YOLO threshold) in the final detections, -1 for the others
+    keep = np.flatnonzero(intermediates.yolo_confidences >= detection_params.yolo_conf_threshold)
+    position = np.full(n_boxes, -1, dtype=np.int64)
+    position[keep] = np.arange(len(keep))
+    yield DetectionUpdate(event="boxes", elapsed_ms=(time() - starting_time) * 1_000,
+                          indices=list(range(len(keep))),
+                          polygons=intermediates.obb_points[keep].tolist(),
+                          yolo_confidences=intermediates.yolo_confidences[keep].tolist())
+
+    # OCR and matching batch by batch (boxes below the YOLO threshold are read too, for later re-decisions)
+    batches = iter_batched_ocr(ocr_engine, crops, ocr_cache=ocr_cache, scope=session_id)
+    while True:
+        with timed(timings, "ocr"):
+            batch = next(batches, None)
+        if batch is None:
+            break
+        rows = np.array([i for i, _ in batch], dtype=np.int64)
+        ocr_results = [result for _, result in batch]
+        texts, match_indices, match_scores, isbn_matched = match_spines(ocr_results, signatures, candidate_index,
+                                                                        isbn_index, timings)
+        for j, i in enumerate(rows):
+            intermediates.ocr_results[i] = ocr_results[j]
+            intermediates.ocr_cleaned_texts[i] = texts[j]
+        intermediates.match_indices[rows], intermediates.match_scores[rows] = match_indices, match_scores
+        intermediates.isbn_matched[rows] = isbn_matched
+
+        rows = np.sort(rows[position[rows] >= 0])
+        if len(rows):
+            yield DetectionUpdate(event="detections", elapsed_ms=(time() - starting_time) * 1_000,
+                                  indices=position[rows].tolist(),
+                                  detections=build_detections(intermediates, rows, df, detection_params))
+    del crops
 
-    # Load image
-    img = cv2.imread(image_path)
-    if img is None:
-        raise ImageNotFoundException("Image path is incorrect")
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-    # Book segmentation
-    yolo_results = yolo_model.predict(image_path, conf=detection_params.yolo_conf_threshold, verbose=False)[0]
-    if yolo_results.obb is None:
-        raise EmptyImageException("Image is empty")
-    obb_points = yolo_results.obb.xyxyxyxy.cpu().numpy()
-    confidences = yolo_results.obb.conf.cpu().numpy()
-
-    detection_result = DetectionResult()
-    detection_result.total_detected = len(obb_points)
-    detection_result.session_id = session_id
-    
-    # For each book
-    for points, confidence in zip(obb_points, confidences):
-        detection = BookDetection()
-        detection.box_polygon = points.tolist()
-        detection.yolo_confidence = confidence
-        
-        # Crop & rotate
-        crop = get_warped_crop(img, points)
-        crop = cv2.rotate(crop, cv2.ROTATE_90_CLOCKWISE)
-
-        # Perform OCR
-        ocr_result = ocr_engine.predict(crop)[0]
-        text = " - ".join(ocr_result["rec_texts"])
-        detection.ocr_raw_text = text
-        detection.ocr_confidence = mean(ocr_result["rec_scores"])
-        del ocr_result
-
-        # Clean
-        text = clean_ocr_text(text)
-        detection.ocr_cleaned_text = text
-
-        # Top 3 Matching
-        matches = find_top_matches(text, signatures, df, limit=3)
-
-        # Decision
-        if matches[0].match_score >= detection_params.match_conf_threshold:
-            if matches[0].match_score / matches[1].match_score >= detection.params.match_ambiguity_ratio:
-                detection.status = DetectionStatus.MATCHED
-                detection.best_matches = [matches[0]]
-                detection_result.count_matched += 1
-            else:
-                detection.status = DetectionStatus.AMBIGUOUS
-                detection.best_matches = matches
-                detection_result.count_ambiguous += 1
-        else:
-            detection.status = DetectionStatus.UNKNOWN
-            detection.best_matches = matches
-            detection_result.count_unknown += 1
-
-        detection_result.detections.append(detection)
-
-        ending_time = time()
-        detection_result.processing_time_ms = (ending_time - starting_time) * 1_000
-
-    return detection_result
\ No newline at end of file
+    intermediates.processing_time_ms = (time() - starting_time) * 1_000
+    if on_analyzed is not None:
+        on_analyzed(intermediates)
+    result = decide_detections(intermediates, df, detection_params)
+    yield DetectionUpdate(event="result", elapsed_ms=(time() - starting_time) * 1_000, result=result)
@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+def _letterbox(img: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """Resize keeping the aspect ratio and pad to `size` (h, w), centered, like Ultralytics' LetterBox."""
+    h, w = img.shape[:2]
+    ratio = min(size[0] / h, size[1] / w)
+    new_w, new_h = round(w * ratio), round(h * ratio)
+    dw, dh = (size[1] - new_w) / 2, (size[0] - new_h) / 2
+    if (w, h) != (new_w, new_h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = round(dh - 0.1), round(dh + 0.1)
+    left, right = round(dw - 0.1), round(dw + 0.1)
+    return cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def _covariance(boxes: np.ndarray):
+    """Covariance matrix terms of the gaussian of each rotated box (x, y, w, h, r)."""
+    a, b, r = boxes[:, 2] ** 2 / 12, boxes[:, 3] ** 2 / 12, boxes[:, 4]
+    cos, sin = np.cos(r), np.sin(r)
+    return a * cos ** 2 + b * sin ** 2, a * sin ** 2 + b * cos ** 2, (a - b) * cos * sin
+
+
+def _probiou(boxes: np.ndarray, eps: float = 1e-7) -> np.ndarray:
+    """Pairwise probabilistic IoU of rotated boxes (the overlap measure of Ultralytics' rotated NMS)."""
+    x, y = boxes[:, 0], boxes[:, 1]
+    a, b, c = _covariance(boxes)
+    x1, y1, a1, b1, c1 = (v[:, None] for v in (x, y, a, b, c))
+    x2, y2, a2, b2, c2 = (v[None, :] for v in (x, y, a, b, c))
+
+    denominator = (a1 + a2) * (b1 + b2) - (c1 + c2) ** 2 + eps
+    t1 = ((a1 + a2) * (y1 - y2) ** 2 + (b1 + b2) * (x1 - x2) ** 2) / denominator * 0.25
+    t2 = ((c1 + c2) * (x2 - x1) * (y1 - y2)) / denominator * 0.5
+    t3 = np.log(((a1 + a2) * (b1 + b2) - (c1 + c2) ** 2)
+                / (4 * np.sqrt(np.clip(a1 * b1 - c1 ** 2, 0, None) * np.clip(a2 * b2 - c2 ** 2, 0, None)) + eps)
+                + eps) * 0.5
+    distance = np.clip(t1 + t2 + t3, eps, 100.0)
+    return 1 - np.sqrt(1 - np.exp(-distance) + eps)
+
+
+def _xywhr_to_points(boxes: np.ndarray) -> np.ndarray:
+    """(N, 5) rotated boxes to (N, 4, 2) corner points, in the order of `obb.xyxyxyxy`."""
+    center = boxes[:, :2]
+    cos, sin = np.cos(boxes[:, 4:5]), np.sin(boxes[:, 4:5])
+    vec1 = np.concatenate([boxes[:, 2:3] / 2 * cos, boxes[:, 2:3] / 2 * sin], axis=1)
+    vec2 = np.concatenate([-boxes[:, 3:4] / 2 * sin, boxes[:, 3:4] / 2 * cos], axis=1)
+    return np.stack([center + vec1 + vec2, center + vec1 - vec2, center - vec1 - vec2, center - vec1 + vec2], axis=1)
+
+
+class ExportedObbDetector:
+    """
+    YOLO OBB detector running an exported model (ONNX Runtime or OpenVINO) on CPU, without PyTorch.
+
+    Pre/post-processing reproduce Ultralytics' (letterbox, rotated NMS on probiou, angle regularization),
+    so that results can be compared with the .pt model (see benchmarks/bench_inference_backends.py).
+    Exports are produced by scripts/export_models.py.
+    """
+
+    def __init__(self, model_path: str, backend: str, cpu_threads: Optional[int] = None,
+                 iou_threshold: float = 0.7, max_det: int = 300):
+        self.backend = backend
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+        if backend == "onnx":
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            if cpu_threads:
+                options.intra_op_num_threads = cpu_threads
+            self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            self._input_name = self._session.get_inputs()[0].name
+            input_shape = self._session.get_inputs()[0].shape
+        elif backend == "openvino":
+            import openvino as ov
+            core = ov.Core()
+            config = {"INFERENCE_NUM_THREADS": cpu_threads} if cpu_threads else {}
+            model = core.read_model(model_path)
+            self._compiled = core.compile_model(model, "CPU", config)
+            input_shape = [dim.get_length() if dim.is_static else None for dim in model.input(0).get_partial_shape()]
+        else:
+            raise ValueError(f"Unknown exported model backend: {backend}")
+
+        # Static (h, w) of the export, 640 if it was exported with dynamic axes
+        h, w = input_shape[2], input_shape[3]
+        self.imgsz = (h if isinstance(h, int) else 640, w if isinstance(w, int) else 640)
+
+    def predict_obbs(self, images: List[np.ndarray], conf: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """OBB points (N, 4, 2) and confidences (N,) of each BGR image, like utils.predict_obbs."""
+        blob = np.stack([_letterbox(img, self.imgsz)[..., ::-1].transpose(2, 0, 1) for img in images])
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255
+
+        if self.backend == "onnx":
+            outputs = self._session.run(None, {self._input_name: blob})[0]
+        else:
+            outputs = self._compiled(blob)[0]
+
+        return [self._postprocess(output, img.shape[:2], conf) for output, img in zip(outputs, images)]
+
+    def _postprocess(self, output: np.ndarray, image_shape: Tuple[int, int], conf: float):
+        # output: (4 + classes + 1, anchors) = cx, cy, w, h, class scores..., angle
+        predictions = output.T
+        class_scores = predictions[:, 4:-1]
+        scores = class_scores.max(axis=1)
+        keep = scores > conf
+        predictions, scores, classes = predictions[keep], scores[keep], class_scores[keep].argmax(axis=1)
+        boxes = np.concatenate([predictions[:, :4], predictions[:, -1:]], axis=1).astype(np.float64)
+
+        # Rotated NMS (per class, through a coordinate offset), highest scores first
+        order = np.argsort(-scores, kind="stable")[:30_000]
+        boxes, scores, classes = boxes[order], scores[order], classes[order]
+        shifted = boxes.copy()
+        shifted[:, :2] += classes[:, None] * 7680
+        overlaps = np.triu(_probiou(shifted), k=1) if len(boxes) else np.zeros((0, 0))
+        keep = (overlaps.max(axis=0) < self.iou_threshold) if len(boxes) else np.zeros(0, dtype=bool)
+        boxes, scores = boxes[keep][:self.max_det], scores[keep][:self.max_det]
+
+        # Regularize angles to [0, pi/2), swapping w and h when needed
+        swap = boxes[:, 4] % np.pi >= np.pi / 2
+        boxes[:, 2], boxes[:, 3] = np.where(swap, boxes[:, 3], boxes[:, 2]), np.where(swap, boxes[:, 2], boxes[:, 3])
+        boxes[:, 4] = boxes[:, 4] % (np.pi / 2)
+
+        # Back to the coordinates of the original image
+        gain = min(self.imgsz[0] / image_shape[0], self.imgsz[1] / image_shape[1])
+        boxes[:, 0] -= round((self.imgsz[1] - image_shape[1] * gain) / 2 - 0.1)
+        boxes[:, 1] -= round((self.imgsz[0] - image_shape[0] * gain) / 2 - 0.1)
+        boxes[:, :4] /= gain
+
+        return _xywhr_to_points(boxes).astype(np.float32), scores.astype(np.float32)
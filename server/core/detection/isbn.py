@@ -0,0 +1,94 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Optional
+
+# Digit runs that may hold an ISBN (with the separators printed on covers and stickers: "978-2-07-036002-4")
+_ISBN_CANDIDATE = re.compile(r"\d(?:[\s-]?[\dXx]){9,17}")
+_SEPARATORS = re.compile(r"[\s-]")
+
+
+def _isbn13_checksum_ok(digits: str) -> bool:
+    return sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10 == 0
+
+
+def _isbn10_checksum_ok(digits: str) -> bool:
+    total = sum((10 - i) * (10 if d in "Xx" else int(d)) for i, d in enumerate(digits))
+    return total % 11 == 0
+
+
+def normalize_isbn(value) -> int:
+    """
+    ISBN-10 or ISBN-13 (any separators) as the ISBN-13 number, or -1 if it is not a valid ISBN.
+    ISBN-10 are converted, so that both forms of the same book compare equal.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return -1
+    digits = _SEPARATORS.sub("", str(value))
+    if len(digits) == 13 and digits.isdigit() and digits[:3] in ("978", "979") and _isbn13_checksum_ok(digits):
+        return int(digits)
+    if len(digits) == 10 and digits[:9].isdigit() and (digits[9].isdigit() or digits[9] in "Xx") \
+            and _isbn10_checksum_ok(digits):
+        body = "978" + digits[:9]
+        check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(body)) % 10) % 10
+        return int(body + str(check))
+    return -1
+
+
+def find_isbns(text: str) -> List[int]:
+    """Valid ISBNs (as ISBN-13 numbers) printed in an OCR text, e.g. a barcode caption."""
+    found = []
+    for match in _ISBN_CANDIDATE.finditer(text or ""):
+        digits = _SEPARATORS.sub("", match.group())
+        isbn = normalize_isbn(digits)
+        if isbn == -1:
+            # The run holds more than the ISBN (EAN add-on, price, neighbouring line): look for a 978/979 prefix
+            for start in range(len(digits) - 12):
+                if digits.startswith(("978", "979"), start):
+                    isbn = normalize_isbn(digits[start:start + 13])
+                    if isbn != -1:
+                        break
+        if isbn != -1 and isbn not in found:
+            found.append(isbn)
+    return found
+
+
+class IsbnIndex:
+    """
+    Exact ISBN -> catalogue row lookup, built once per catalogue.
+
+    `keys` holds the normalized ISBN-13 of every row (-1 when the cell is not a valid ISBN);
+    lookups go through a pandas hash table built from it (first row wins for duplicates).
+    """
+
+    def __init__(self, keys: np.ndarray):
+        self.keys = keys
+        valid = np.flatnonzero(keys >= 0)
+        unique_keys, first = np.unique(keys[valid], return_index=True)
+        self._index = pd.Index(unique_keys)
+        self._rows = valid[first]
+
+    @classmethod
+    def from_column(cls, isbns: Iterable) -> "IsbnIndex":
+        return cls(np.fromiter((normalize_isbn(value) for value in isbns), dtype=np.int64))
+
+    def lookup(self, isbns: List[int]) -> List[int]:
+        """Catalogue row of each ISBN, -1 if it is not in the catalogue."""
+        if not isbns:
+            return []
+        positions = self._index.get_indexer(np.asarray(isbns, dtype=np.int64))
+        return [int(self._rows[p]) if p >= 0 else -1 for p in positions]
+
+    def find_row(self, text: str) -> Optional[int]:
+        """Catalogue row of the first catalogue ISBN printed in `text`, or None."""
+        for row in self.lookup(find_isbns(text)):
+            if row >= 0:
+                return row
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + self._rows.nbytes + self._index.nbytes)
+
+    def __len__(self) -> int:
+        return len(self._index)
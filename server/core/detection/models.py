@@ -0,0 +1,77 @@
+from core.config import YOLO_MODEL_PATH, PADDLEOCR_MODEL_PATH, PADDLEOCR_REC_MODEL_PATH, OCR_BATCH_SIZE, \
+    INFERENCE_BACKEND, INFERENCE_INT8, INFERENCE_CPU_THREADS, \
+    YOLO_ONNX_PATH, YOLO_ONNX_INT8_PATH, YOLO_OPENVINO_PATH, YOLO_OPENVINO_INT8_PATH
+import threading
+from core.detection.exported_detector import ExportedObbDetector
+
+# Heavy libraries (torch, paddle) are imported inside the loaders: the ONNX/OpenVINO backends never import torch
+
+
+def int8_model_dir(model_dir: str) -> str:
+    """Folder holding the INT8 export of a PaddleOCR model folder (written by scripts/export_models.py)."""
+    return model_dir.rstrip("/") + "_int8"
+
+
+def load_yolo_model(backend: str = INFERENCE_BACKEND, int8: bool = INFERENCE_INT8, cpu_threads=INFERENCE_CPU_THREADS):
+    """Load the book segmentation model of the selected backend (usable with utils.predict_obbs)."""
+    if backend == "pytorch":
+        import torch
+        from ultralytics import YOLO
+        if cpu_threads:
+            torch.set_num_threads(cpu_threads)
+        return YOLO(YOLO_MODEL_PATH)
+    if backend == "onnx":
+        return ExportedObbDetector(YOLO_ONNX_INT8_PATH if int8 else YOLO_ONNX_PATH, "onnx", cpu_threads)
+    if backend == "openvino":
+        return ExportedObbDetector(YOLO_OPENVINO_INT8_PATH if int8 else YOLO_OPENVINO_PATH, "openvino", cpu_threads)
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def load_ocr_engine(backend: str = INFERENCE_BACKEND, int8: bool = INFERENCE_INT8, cpu_threads=INFERENCE_CPU_THREADS):
+    """
+    Load PaddleOCR for the selected backend.
+    "onnx" and "openvino" use PaddleOCR's high-performance inference on the ONNX files exported next to the weights.
+    """
+    from paddleocr import PaddleOCR
+
+    det_model_dir, rec_model_dir = PADDLEOCR_MODEL_PATH, PADDLEOCR_REC_MODEL_PATH
+    if int8 and backend != "pytorch":
+        det_model_dir = int8_model_dir(det_model_dir)
+        rec_model_dir = int8_model_dir(rec_model_dir) if rec_model_dir else None
+
+    kwargs = {
+        "text_detection_model_dir": det_model_dir,
+        "use_doc_orientation_classify": True,
+        "lang": "fr",
+        "text_recognition_batch_size": OCR_BATCH_SIZE,
+    }
+    if rec_model_dir:
+        kwargs["text_recognition_model_dir"] = rec_model_dir
+    if cpu_threads:
+        kwargs["cpu_threads"] = cpu_threads
+
+    if backend in ("onnx", "openvino"):
+        backend_config = {"cpu_num_threads": cpu_threads} if cpu_threads else {}
+        kwargs["device"] = "cpu"
+        kwargs["enable_hpi"] = True
+        kwargs["hpi_config"] = {"backend": "onnxruntime" if backend == "onnx" else "openvino",
+                                "backend_config": backend_config}
+    elif backend != "pytorch":
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    return PaddleOCR(**kwargs)
+
+
+class LockedOcrEngine:
+    """
+    PaddleOCR engine shared by the inference threads (INFERENCE_WORKERS, scan stages): its predictors are not
+    thread-safe, so calls are serialized. Same `predict` as PaddleOCR.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+
+    def predict(self, *args, **kwargs):
+        with self._lock:
+            return self.engine.predict(*args, **kwargs)
@@ -0,0 +1,185 @@
+import sys
+import threading
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from core.config import OCR_CACHE_MAX_BYTES, OCR_CACHE_MIN_SIMILARITY, OCR_CACHE_MAX_COLOR_CHANGE
+
+HASH_SIZE = (32, 4) # (w, h) of the perceptual hash: a coarse, zero-mean grey thumbnail compared by cosine
+THUMBNAIL_SIZE = (256, 32) # (w, h) of the grey thumbnail the candidates are verified on (the letters stay readable)
+MAX_SHIFT = (10, 4) # Misalignment (thumbnail pixels) tolerated by the verification: boxes move between photos
+TRIM = (0.03, 0.15) # Margins dropped (along, across the spine): the box edges catch the neighbouring spines
+SHORTLIST_SIZE = 4 # Closest hashes verified per lookup
+MIN_CONTRAST = 8.0 # Flat crops (std of the thumbnail grey levels below this) all look alike: never cached
+
+
+def empty_ocr_cache_stats(max_bytes: int = OCR_CACHE_MAX_BYTES) -> Dict[str, Any]:
+    """OcrCache.stats() of a cache nothing went through yet (e.g. models not loaded)."""
+    if max_bytes <= 0:
+        return {"enabled": False}
+    return {"enabled": True, "entries": 0, "sessions": 0, "bytes": 0, "max_bytes": max_bytes, "hits": 0, "misses": 0,
+            "uncacheable": 0, "hit_rate": 0.0, "evictions": 0}
+
+
+class SpineFingerprint:
+    """What a spine crop is compared on: perceptual hash, verification thumbnail, aspect ratio and mean colour."""
+    __slots__ = ("hash", "thumbnail", "contrast", "aspect", "color")
+
+    def __init__(self, crop: np.ndarray):
+        h, w = crop.shape[:2]
+        self.aspect = w / max(h, 1)
+        self.color = np.array(cv2.mean(crop)[:3], dtype=np.float32)
+        dy, dx = int(h * TRIM[1]), int(w * TRIM[0])
+        thumbnail = cv2.resize(crop[dy:h - dy, dx:w - dx], THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        self.thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+        self.contrast = float(cv2.meanStdDev(self.thumbnail)[1][0, 0])
+        coarse = cv2.resize(self.thumbnail, HASH_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+        coarse -= coarse.mean()
+        self.hash = coarse / max(float(np.linalg.norm(coarse)), 1e-6)
+
+    def similarity(self, other: "SpineFingerprint") -> float:
+        """Best normalized cross-correlation of the thumbnails over the tolerated shifts (1 = identical)."""
+        (w, h), (dx, dy) = THUMBNAIL_SIZE, MAX_SHIFT
+        template = other.thumbnail[dy:h - dy, dx:w - dx]
+        return float(cv2.matchTemplate(self.thumbnail, template, cv2.TM_CCOEFF_NORMED).max())
+
+
+class _Entry:
+    __slots__ = ("scope", "fingerprint", "result", "nbytes")
+
+    def __init__(self, scope: str, fingerprint: SpineFingerprint, result: Tuple[str, float]):
+        self.scope, self.fingerprint, self.result = scope, fingerprint, result
+        self.nbytes = 300 + fingerprint.thumbnail.nbytes + fingerprint.hash.nbytes + sys.getsizeof(result[0])
+
+
+class _ScopeIndex:
+    """Entries of one session, with the arrays of a vectorized shortlist (rebuilt after changes)."""
+    __slots__ = ("entries", "_arrays")
+
+    def __init__(self):
+        self.entries: Dict[int, _Entry] = {}
+        self._arrays = None
+
+    def add(self, entry: _Entry):
+        self.entries[id(entry)] = entry
+        self._arrays = None
+
+    def remove(self, entry: _Entry):
+        del self.entries[id(entry)]
+        self._arrays = None
+
+    def arrays(self) -> Tuple[List[_Entry], np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is None:
+            entries = list(self.entries.values())
+            hashes = np.stack([entry.fingerprint.hash for entry in entries])
+            aspects = np.array([entry.fingerprint.aspect for entry in entries], dtype=np.float32)
+            colors = np.stack([entry.fingerprint.color for entry in entries])
+            self._arrays = (entries, hashes, aspects, colors)
+        return self._arrays
+
+
+class OcrCache:
+    """
+    LRU cache of OCR results in front of the recognizer, keyed by a perceptual hash of the spine crop.
+
+    Within a scope (session), the cached crops of similar aspect ratio and mean colour are shortlisted by hash,
+    then verified on a thumbnail where the letters are readable: a crop hits when one of them correlates
+    by `min_similarity` or more, i.e. the same spine photographed again or seen on an overlapping photo.
+    The thresholds favour precision: a wrong hit would give the spine the title of another book.
+    Least recently used results are dropped above `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = OCR_CACHE_MAX_BYTES, min_similarity: float = OCR_CACHE_MIN_SIMILARITY,
+                 max_color_change: float = OCR_CACHE_MAX_COLOR_CHANGE, max_aspect_change: float = 0.15):
+        self.max_bytes = max_bytes
+        self.min_similarity = min_similarity
+        self.max_color_change = max_color_change
+        self.max_aspect_change = max_aspect_change
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._scopes: Dict[str, _ScopeIndex] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.evictions = 0
+
+    def get(self, scope: str, crop: np.ndarray) -> Tuple[Optional[SpineFingerprint], Optional[Tuple[str, float]]]:
+        """
+        Fingerprint of the crop, and the cached OCR result of the same spine (or None).
+        The fingerprint is None for crops that cannot be cached (too flat to be told apart).
+        """
+        fingerprint = SpineFingerprint(crop) if crop.ndim == 3 and min(crop.shape[:2]) > 2 else None
+        if fingerprint is None or fingerprint.contrast < MIN_CONTRAST:
+            with self._lock:
+                self.uncacheable += 1
+            return None, None
+
+        with self._lock:
+            best = self._find(scope, fingerprint)
+            if best is None:
+                self.misses += 1
+                return fingerprint, None
+            self.hits += 1
+            self._entries.move_to_end(id(best))
+            return fingerprint, best.result
+
+    def put(self, scope: str, fingerprint: Optional[SpineFingerprint], result: Tuple[str, float]):
+        """Cache the OCR result of a crop, under the fingerprint returned by get (nothing for uncacheable crops)."""
+        if fingerprint is None or self.max_bytes <= 0:
+            return
+        entry = _Entry(scope, fingerprint, result)
+        with self._lock:
+            self._entries[id(entry)] = entry
+            self._scopes.setdefault(scope, _ScopeIndex()).add(entry)
+            self._total_bytes += entry.nbytes
+
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._unindex(evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._entries),
+                "sessions": len(self._scopes),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _find(self, scope: str, fingerprint: SpineFingerprint) -> Optional[_Entry]:
+        """Best verified entry of the scope for this fingerprint (caller holds the lock)."""
+        index = self._scopes.get(scope)
+        if index is None:
+            return None
+        entries, hashes, aspects, colors = index.arrays()
+        candidates = np.flatnonzero((np.abs(aspects / fingerprint.aspect - 1) <= self.max_aspect_change)
+                                    & (np.abs(colors - fingerprint.color).max(axis=1) <= self.max_color_change))
+        if len(candidates) == 0:
+            return None
+        scores = hashes[candidates] @ fingerprint.hash
+        best, best_similarity = None, self.min_similarity
+        for i in candidates[np.argsort(-scores)[:SHORTLIST_SIZE]]:
+            similarity = fingerprint.similarity(entries[i].fingerprint)
+            if similarity >= best_similarity:
+                best, best_similarity = entries[i], similarity
+        return best
+
+    def _unindex(self, entry: _Entry):
+        """Remove an evicted entry from its session index (caller holds the lock)."""
+        self._total_bytes -= entry.nbytes
+        index = self._scopes[entry.scope]
+        index.remove(entry)
+        if not index.entries:
+            del self._scopes[entry.scope]
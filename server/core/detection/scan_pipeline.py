@@ -0,0 +1,260 @@
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from collections import Counter
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from core.config import SCAN_QUEUE_SIZE
+from core.detection.detection_pipeline import locate_books, match_spines, decide_detections
+from core.detection.utils import decode_image, run_batched_ocr
+from core.detection.candidate_index import TrigramIndex
+from core.detection.isbn import IsbnIndex
+from core.detection.ocr_cache import OcrCache
+from core.detection.timing import timed
+from core.entities.detection import DetectionResult, DetectionStatus, DetectionIntermediates, ScanImageResult, \
+    ScanBook, ScanSummary, STATUS_CODES
+from core.entities.exceptions import ImageNotFoundException, EmptyImageException
+
+_DONE = object()
+
+
+class ShelfScanMerger:
+    """
+    Merges the MATCHED detections of overlapping photos by catalogue row.
+
+    A book seen on several photos counts once; copies side by side on the same photo stay distinct,
+    so the number of copies of a book is the most seen on a single photo.
+    """
+
+    def __init__(self):
+        self._books: Dict[int, ScanBook] = {}
+
+    def add(self, image_index: int, result: DetectionResult) -> Tuple[List[int], List[int]]:
+        """Merge a photo. Returns the db_id seen for the first time, and the indices of the detections already seen."""
+        new_book_ids, duplicates = [], []
+        copies = Counter()
+        detections = result.detections
+        matched = (detections.statuses == STATUS_CODES[DetectionStatus.MATCHED]) & (detections.candidate_rows[:, 0] >= 0)
+        for j in np.flatnonzero(matched).tolist():
+            db_id = int(detections.candidate_rows[j, 0])
+            book = self._books.get(db_id)
+            if book is None:
+                match = detections.catalogue.iloc[db_id]
+                book = self._books[db_id] = ScanBook(db_id=db_id, title=str(match["title"]), author=str(match["author"]),
+                                                     copies=0, image_indices=[])
+                new_book_ids.append(db_id)
+            elif book.image_indices and book.image_indices[0] != image_index:
+                duplicates.append(j)
+            if not book.image_indices or book.image_indices[-1] != image_index:
+                book.image_indices.append(image_index)
+            copies[db_id] += 1
+
+        for db_id, n in copies.items():
+            self._books[db_id].copies = max(self._books[db_id].copies, n)
+        return new_book_ids, duplicates
+
+    def books(self) -> List[ScanBook]:
+        return list(self._books.values())
+
+
+class _ScanItem:
+    """A photo moving through the stages."""
+    __slots__ = ("index", "img", "obb_points", "confidences", "crops", "ocr_results", "error", "exception",
+                 "analysis_ms", "timings")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.img = self.obb_points = self.confidences = self.crops = self.ocr_results = None
+        self.error: Optional[str] = None
+        self.exception: Optional[BaseException] = None
+        self.analysis_ms = 0.0
+        self.timings: Dict[str, float] = {}
+
+
+class ShelfScan:
+    """
+    Detection of many photos of a bookcase, with the stages of successive photos overlapping:
+    decoding, YOLO and OCR run on their own threads, linked by bounded queues, while matching and
+    decision run on the iterating thread. The throughput is bounded by the slowest stage instead of
+    the sum of all of them.
+
+    Iterating yields a ScanImageResult per photo, in order, as soon as it is decided; `summary` holds the
+    books merged across the photos once the iteration is over. Unreadable photos are reported and skipped.
+    """
+
+    def __init__(self,
+                 detector: Callable[[np.ndarray, float], Tuple[np.ndarray, np.ndarray]],
+                 ocr_engine,
+                 images: Sequence[Union[str, bytes, np.ndarray]],
+                 session_id: str,
+                 signatures: List[str],
+                 df: pd.DataFrame,
+                 detection_params,
+                 floor_conf: Optional[float] = None,
+                 candidate_index: Optional[TrigramIndex] = None,
+                 isbn_index: Optional[IsbnIndex] = None,
+                 catalogue_id: str = "",
+                 ocr_cache: Optional[OcrCache] = None,
+                 image_ids: Optional[Sequence[str]] = None,
+                 on_analyzed: Optional[Callable[[Optional[str], DetectionIntermediates], None]] = None,
+                 queue_size: int = SCAN_QUEUE_SIZE):
+        self.detector = detector
+        self.ocr_engine = ocr_engine
+        self.images = images
+        self.session_id = session_id
+        self.signatures = signatures
+        self.df = df
+        self.detection_params = detection_params
+        self.floor_conf = detection_params.yolo_conf_threshold if floor_conf is None else floor_conf
+        self.candidate_index = candidate_index
+        self.isbn_index = isbn_index
+        self.catalogue_id = catalogue_id
+        self.ocr_cache = ocr_cache
+        self.image_ids = image_ids
+        self.on_analyzed = on_analyzed
+        self.queue_size = queue_size
+
+        self.summary = ScanSummary(session_id=session_id)
+        self._stop = threading.Event()
+        self._busy_ms = {"decode": 0.0, "detect": 0.0, "ocr": 0.0, "match": 0.0}
+
+    def __iter__(self) -> Iterator[ScanImageResult]:
+        starting_time = perf_counter()
+        decoded, located, read = (queue.Queue(self.queue_size) for _ in range(3))
+        threads = [
+            threading.Thread(target=self._decode_stage, args=(decoded,), name="scan-decode", daemon=True),
+            threading.Thread(target=self._stage, args=("detect", self._detect, decoded, located),
+                             name="scan-detect", daemon=True),
+            threading.Thread(target=self._stage, args=("ocr", self._read, located, read),
+                             name="scan-ocr", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        merger = ShelfScanMerger()
+        try:
+            while True:
+                item = self._get(read)
+                if item is _DONE or item is None:
+                    break
+                if item.exception is not None:
+                    raise item.exception
+                yield self._decide(item, merger)
+        finally:
+            # Also reached when the consumer stops early: the stages exit at their next queue operation
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.summary.books = merger.books()
+            self.summary.unique_books = len(self.summary.books)
+            self.summary.wall_time_ms = (perf_counter() - starting_time) * 1_000
+            self.summary.stage_busy_ms = dict(self._busy_ms)
+
+    # --- Stages ---
+
+    def _decode_stage(self, output: queue.Queue):
+        for index, image in enumerate(self.images):
+            item = _ScanItem(index)
+            start = perf_counter()
+            try:
+                with timed(item.timings, "decode"):
+                    item.img = decode_image(image)
+            except ImageNotFoundException as e:
+                item.error = e.message
+            except Exception as e:
+                item.exception = e
+            self._account(item, "decode", start)
+            if not self._put(output, item) or item.exception is not None:
+                return
+        self._put(output, _DONE)
+
+    def _stage(self, name: str, work: Callable[[_ScanItem], None], input: queue.Queue, output: queue.Queue):
+        while True:
+            item = self._get(input)
+            if item is None:
+                return
+            if item is not _DONE and item.error is None and item.exception is None:
+                start = perf_counter()
+                try:
+                    work(item)
+                except EmptyImageException as e:
+                    item.error = e.message
+                except Exception as e:
+                    item.exception = e
+                self._account(item, name, start)
+            if not self._put(output, item) or item is _DONE or item.exception is not None:
+                return
+
+    def _detect(self, item: _ScanItem):
+        item.obb_points, item.confidences, item.crops = locate_books(self.detector, item.img, self.floor_conf,
+                                                                     item.timings)
+        item.img = None
+
+    def _read(self, item: _ScanItem):
+        with timed(item.timings, "ocr"):
+            item.ocr_results = run_batched_ocr(self.ocr_engine, item.crops, ocr_cache=self.ocr_cache,
+                                               scope=self.session_id)
+        item.crops = None
+
+    def _decide(self, item: _ScanItem, merger: ShelfScanMerger) -> ScanImageResult:
+        image_id = self.image_ids[item.index] if self.image_ids is not None else None
+        scan_result = ScanImageResult(image_index=item.index, image_id=image_id, error=item.error)
+        self.summary.images += 1
+        if item.error is not None:
+            self.summary.failed_images += 1
+            return scan_result
+
+        start = perf_counter()
+        texts, match_indices, match_scores, isbn_matched = match_spines(item.ocr_results, self.signatures,
+                                                                        self.candidate_index, self.isbn_index,
+                                                                        item.timings)
+        self._account(item, "match", start)
+        intermediates = DetectionIntermediates(
+            session_id=self.session_id,
+            catalogue_id=self.catalogue_id,
+            floor_conf=self.floor_conf,
+            obb_points=np.asarray(item.obb_points, dtype=np.float32),
+            yolo_confidences=np.asarray(item.confidences, dtype=np.float32),
+            ocr_results=item.ocr_results,
+            ocr_cleaned_texts=texts,
+            match_indices=match_indices,
+            match_scores=match_scores,
+            isbn_matched=isbn_matched,
+            processing_time_ms=item.analysis_ms,
+            stage_timings_ms=item.timings
+        )
+        if self.on_analyzed is not None:
+            self.on_analyzed(image_id, intermediates)
+
+        scan_result.result = decide_detections(intermediates, self.df, self.detection_params)
+        scan_result.result.image_id = image_id
+        scan_result.new_book_ids, scan_result.duplicate_detections = merger.add(item.index, scan_result.result)
+        self.summary.total_detected += scan_result.result.total_detected
+        return scan_result
+
+    # --- Plumbing ---
+
+    def _account(self, item: _ScanItem, stage: str, start: float):
+        elapsed_ms = (perf_counter() - start) * 1_000
+        item.analysis_ms += elapsed_ms
+        self._busy_ms[stage] += elapsed_ms # Each stage has a single thread: no lock needed
+
+    def _put(self, output: queue.Queue, item) -> bool:
+        """Put `item`, unless the scan is stopped in the meantime (False)."""
+        while not self._stop.is_set():
+            try:
+                output.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, input: queue.Queue):
+        """Next item, or None if the scan is stopped in the meantime."""
+        while not self._stop.is_set():
+            try:
+                return input.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
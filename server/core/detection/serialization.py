@@ -0,0 +1,80 @@
+import numpy as np
+import orjson
+import pandas as pd
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, List, Optional
+from core.entities.detection import DetectionColumns, DETECTION_STATUSES, MATCH_METHODS
+
+# numpy arrays and scalars are written by orjson itself; dataclasses go through json_default
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+
+def optional_str(value) -> Optional[str]:
+    """CSV cell as a JSON-friendly string (NaN and numpy scalars included)."""
+    return None if value is None or pd.isna(value) else str(value)
+
+
+def detection_dicts(detections: DetectionColumns) -> List[Dict[str, Any]]:
+    """
+    The detections as the API returns them (one BookDetection object per book, with its BookCandidate list).
+    The catalogue rows of every candidate are read in one go, the columns converted to Python lists once.
+    """
+    valid = detections.candidate_rows >= 0
+    rows = detections.candidate_rows[valid] # Row-major: the candidates of a detection are contiguous
+    ends = np.cumsum(valid.sum(axis=1)).tolist()
+    if len(rows) and detections.catalogue is not None:
+        books = detections.catalogue.iloc[rows]
+        titles = [str(value) for value in books["title"].tolist()]
+        authors = [str(value) for value in books["author"].tolist()]
+        editors = [optional_str(value) for value in books["editor"].tolist()] if "editor" in books else [None] * len(rows)
+        isbns = [optional_str(value) for value in books["isbn"].tolist()]
+    else:
+        titles = authors = editors = isbns = [None] * len(rows)
+    candidates = [
+        {"title": title, "author": author, "db_id": db_id, "match_score": score, "editor": editor, "isbn": isbn}
+        for title, author, db_id, score, editor, isbn in zip(titles, authors, rows.tolist(),
+                                                             detections.candidate_scores[valid].tolist(),
+                                                             editors, isbns)
+    ]
+
+    polygons = detections.polygons.tolist()
+    yolo_confidences = detections.yolo_confidences.tolist()
+    ocr_confidences = detections.ocr_confidences.tolist()
+    statuses, methods = detections.statuses.tolist(), detections.match_methods.tolist()
+    result, start = [], 0
+    for i, end in enumerate(ends):
+        result.append({
+            "box_polygon": polygons[i],
+            "yolo_confidence": yolo_confidences[i],
+            "ocr_confidence": ocr_confidences[i],
+            "ocr_raw_text": detections.ocr_raw_texts[i],
+            "ocr_cleaned_text": detections.ocr_cleaned_texts[i],
+            "status": DETECTION_STATUSES[statuses[i]],
+            "best_matches": candidates[start:end],
+            "match_method": MATCH_METHODS[methods[i]],
+        })
+        start = end
+    return result
+
+
+def dataclass_dict(obj) -> Dict[str, Any]:
+    """Fields of a dataclass, not converted (json_default is called again for the nested ones)."""
+    return {f.name: getattr(obj, f.name) for f in fields(obj)}
+
+
+def json_default(obj):
+    """orjson hook for the types it does not write itself."""
+    if isinstance(obj, DetectionColumns):
+        return detection_dicts(obj)
+    if is_dataclass(obj):
+        return dataclass_dict(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist() # Non-contiguous arrays, which orjson refuses
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj) -> bytes:
+    """JSON of a DetectionResult, DetectionUpdate, ScanImageResult... (same shape as jsonable_encoder gave)."""
+    return orjson.dumps(obj, default=json_default, option=JSON_OPTIONS)
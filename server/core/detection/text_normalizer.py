@@ -0,0 +1,67 @@
+import re
+import unicodedata
+from typing import Dict, Iterable, List
+
+
+def _folding_table() -> Dict[int, str]:
+    """str.translate table: lower case, no accents, ligatures expanded, punctuation as spaces."""
+    table = {}
+    for code in range(0x41, 0x250): # ASCII letters, Latin-1 and Latin Extended-A/B
+        char = chr(code)
+        base = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c)).lower()
+        if base != char:
+            table[code] = base
+    table.update({ord("œ"): "oe", ord("Œ"): "oe", ord("æ"): "ae", ord("Æ"): "ae", ord("ß"): "ss"})
+    for char in "!\"#$%&'()*+,./:;<=>?@[\\]^_`{|}~-«»’‘“”…–—·":
+        table[ord(char)] = " "
+    return table
+
+
+class OcrTextNormalizer:
+    """
+    Text normalization of the matching step, compiled once.
+
+    - `clean`: removes the OCR garbage of a spine (logo misreadings, prices, barcodes, stray letters);
+    - `fold`: case, accent and punctuation folding, applied to both the OCR texts and the catalogue
+      signatures so that "L'ÉTRANGER" and "L'Étranger" compare equal.
+    """
+
+    # Erreurs OCR récurrentes pour "Folio" et autres logos, prix (ex: 12.96), séries de chiffres longues (codes barres)
+    GARBAGE_WORDS = ["dio", "fdio", "olio", "6ho", "Bo", "do", "OP", "folio"]
+    # Mots d'une lettre conservés (pour éviter de casser "il y a")
+    SHORT_WORDS = frozenset(["a", "y", "à", "l", "d"])
+
+    def __init__(self):
+        # One alternation instead of one re.sub per pattern (alternatives keep the original pattern order)
+        self._garbage = re.compile(r"\b(?:" + "|".join(self.GARBAGE_WORDS) + r")\b|\d+\.\d+|\b\d{4,}\b",
+                                   re.IGNORECASE)
+        self._folding = _folding_table()
+
+    def clean(self, text: str) -> str:
+        if not text:
+            return ""
+        # Les tirets isolés viennent du join(" - ") des lignes OCR
+        cleaned = self._garbage.sub("", text).replace("-", " ")
+        short_words = self.SHORT_WORDS
+        return " ".join([w for w in cleaned.split() if len(w) > 1 or w.lower() in short_words])
+
+    def fold(self, text: str) -> str:
+        return " ".join(text.translate(self._folding).split())
+
+    def normalize(self, text: str) -> str:
+        """Cleaned and folded OCR text, as compared with the signatures."""
+        return self.fold(self.clean(text))
+
+    def clean_batch(self, texts: Iterable[str]) -> List[str]:
+        """`clean` for every crop of an image."""
+        clean = self.clean
+        return [clean(text) for text in texts]
+
+    def fold_batch(self, texts: Iterable[str]) -> List[str]:
+        """`fold` for many texts, e.g. every signature of a catalogue."""
+        folding = self._folding
+        return [" ".join(text.translate(folding).split()) for text in texts]
+
+
+# Shared by the detection pipeline and the catalogue preparation (stateless once built)
+ocr_text_normalizer = OcrTextNormalizer()
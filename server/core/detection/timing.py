@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, Optional
+
+# Stages of a detection, in order (keys of DetectionResult.stage_timings_ms)
+STAGES = ("decode", "yolo", "warp", "ocr", "clean", "match", "decide")
+
+
+@contextmanager
+def timed(timings: Optional[Dict[str, float]], stage: str) -> Iterator[None]:
+    """Add the time spent in the block (ms) to timings[stage]. No-op when `timings` is None."""
+    if timings is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (perf_counter() - start) * 1_000
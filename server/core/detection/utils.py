@@ -1,10 +1,64 @@
 import numpy as np
-import re
 from rapidfuzz import process, fuzz
 import cv2
-from schema import BookCandidate
+from core.config import DETECTOR_MAX_SIDE, OCR_BATCH_SIZE, MATCH_WORKERS, MATCH_CHUNK_SIZE, MATCH_SHORTLIST_SIZE
+from core.detection.candidate_index import TrigramIndex
+from core.detection.ocr_cache import OcrCache, SpineFingerprint
+from core.detection.serialization import optional_str
+from core.detection.text_normalizer import ocr_text_normalizer
+from core.entities.detection import BookCandidate, DetectionStatus, STATUS_CODES
+from core.entities.exceptions import ImageNotFoundException, EmptyImageException
 import pandas as pd
-from typing import Iterable
+from statistics import mean
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+def decode_image(image: Union[str, bytes, np.ndarray]) -> np.ndarray:
+    """
+    Decode a shelf photo once, into the BGR array used by both YOLO and the crops.
+    `image` can be a file path, the encoded bytes (e.g. an upload body) or an already decoded BGR array.
+    """
+    if isinstance(image, np.ndarray):
+        return image
+
+    if isinstance(image, str):
+        try:
+            image = np.fromfile(image, dtype=np.uint8)
+        except (FileNotFoundError, IsADirectoryError):
+            raise ImageNotFoundException("Image path is incorrect")
+
+    img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ImageNotFoundException("Image cannot be decoded")
+    return img
+
+def resize_for_detector(img: np.ndarray, max_side: Optional[int] = DETECTOR_MAX_SIDE) -> Tuple[np.ndarray, float]:
+    """
+    Downscale the decoded image for the detector, which letterboxes it to its own input size anyway.
+    Returns the detector image and the factor to apply to its coordinates to get back to `img`.
+    """
+    longest_side = max(img.shape[:2])
+    if not max_side or longest_side <= max_side:
+        return img, 1.0
+
+    scale = max_side / longest_side
+    small = cv2.resize(img, (round(img.shape[1] * scale), round(img.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    return small, img.shape[1] / small.shape[1]
+
+def read_obb_result(yolo_results) -> Tuple[np.ndarray, np.ndarray]:
+    """Extract the OBB points (N, 4, 2) and confidences (N,) of one Ultralytics result."""
+    if yolo_results.obb is None:
+        raise EmptyImageException("Image is empty")
+    return yolo_results.obb.xyxyxyxy.cpu().numpy(), yolo_results.obb.conf.cpu().numpy()
+
+def predict_obbs(yolo_model, images: List[np.ndarray], conf: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Book segmentation of a batch of images, with an Ultralytics YOLO model or an ExportedObbDetector."""
+    if hasattr(yolo_model, "predict_obbs"):
+        return yolo_model.predict_obbs(images, conf)
+    return [read_obb_result(yolo_results) for yolo_results in yolo_model.predict(images, conf=conf, verbose=False)]
+
+def detect_books(yolo_model, img: np.ndarray, conf: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Book segmentation of a single image (no batching)."""
+    return predict_obbs(yolo_model, [img], conf)[0]
 
 def get_warped_crop(img, points):
     rect = np.zeros((4, 2), dtype="float32")
@@ -32,34 +86,59 @@ def get_warped_crop(img, points):
         warped = cv2.rotate(warped, cv2.ROTATE_90_CLOCKWISE)
     return warped
 
-def clean_ocr_text(text):
-    if not text: return ""
-
-    # A. Liste noire des erreurs OCR récurrentes pour "Folio" et autres logos
-    # On utilise des expressions régulières pour ne matcher que des mots entiers ou presque
-    garbage_patterns = [
-        r'\bdio\b', r'\bfdio\b', r'\bolio\b', r'\b6ho\b', r'\bBo\b', r'\bdo\b', r'\bOP\b', # Variantes Folio
-        r'\bfolio\b', # Le mot folio lui-même (souvent inutile pour le titre)
-        r'\d+\.\d+',  # Prix (ex: 12.96)
-        r'\b\d{4,}\b' # Séries de chiffres longues (codes barres, ex: 30875)
-    ]
+def read_ocr_result(ocr_result) -> Tuple[str, float]:
+    """Extract (raw_text, confidence) from a single PaddleOCR result."""
+    text = " - ".join(ocr_result["rec_texts"])
+    scores = ocr_result["rec_scores"]
+    confidence = float(mean(scores)) if len(scores) > 0 else 0.0
+    return text, confidence
 
-    cleaned = text
-    for pattern in garbage_patterns:
-        cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+def iter_batched_ocr(ocr_engine, crops: List[np.ndarray], batch_size: int = OCR_BATCH_SIZE,
+                     ocr_cache: Optional[OcrCache] = None,
+                     scope: str = "") -> Iterator[List[Tuple[int, Tuple[str, float]]]]:
+    """
+    Run OCR on every crop with one recognizer call per batch instead of one per crop,
+    yielding the (crop index, result) pairs of each batch as soon as it is read.
 
-    # B. Nettoyage des caractères spéciaux isolés (garder les lettres, accents et espaces)
-    # On enlève les tirets isolés qui viennent du join(" - ")
-    cleaned = cleaned.replace('-', ' ')
+    Crops are bucketed by aspect ratio so that each batch holds similarly shaped spines
+    (the recognizer pads every image of a batch to the widest one).
+    With `ocr_cache`, spines already read in the same `scope` (session) skip the recognizer:
+    they come first, in a single batch.
+    """
+    fingerprints: List[Optional[SpineFingerprint]] = [None] * len(crops)
+    pending = range(len(crops))
+    if ocr_cache is not None:
+        pending, hits = [], []
+        for i, crop in enumerate(crops):
+            fingerprints[i], cached = ocr_cache.get(scope, crop)
+            if cached is None:
+                pending.append(i)
+            else:
+                hits.append((i, cached))
+        if hits:
+            yield hits
+    order = sorted(pending, key=lambda i: crops[i].shape[1] / max(crops[i].shape[0], 1))
 
-    # C. Supprimer les caractères uniques parasites (ex: "i - Alejo")
-    # On supprime les mots de 1 lettre sauf 'a', 'y', 'à' (pour éviter de casser "il y a")
-    cleaned = ' '.join([w for w in cleaned.split() if len(w) > 1 or w.lower() in ['a', 'y', 'à', 'l', 'd']])
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        ocr_results = [read_ocr_result(ocr_result) for ocr_result in ocr_engine.predict([crops[i] for i in batch])]
+        if ocr_cache is not None:
+            for i, result in zip(batch, ocr_results):
+                ocr_cache.put(scope, fingerprints[i], result)
+        yield list(zip(batch, ocr_results))
 
-    # D. Espaces multiples
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+def run_batched_ocr(ocr_engine, crops: List[np.ndarray], batch_size: int = OCR_BATCH_SIZE,
+                    ocr_cache: Optional[OcrCache] = None, scope: str = "") -> List[Tuple[str, float]]:
+    """All the OCR results of iter_batched_ocr, in the same order as `crops`."""
+    results: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+    for batch in iter_batched_ocr(ocr_engine, crops, batch_size, ocr_cache, scope):
+        for i, result in batch:
+            results[i] = result
+    return results
 
-    return cleaned
+def clean_ocr_text(text):
+    """Remove the OCR garbage of a spine (see OcrTextNormalizer.clean)."""
+    return ocr_text_normalizer.clean(text)
 
 def find_top_matches(ocr_text, signatures: Iterable[str], df: pd.DataFrame, limit=3):
     """
@@ -80,18 +159,93 @@ def find_top_matches(ocr_text, signatures: Iterable[str], df: pd.DataFrame, limi
         limit=limit
     )
 
+    return build_candidates([idx for _, _, idx in matches], [score for _, score, _ in matches], df)
+
+def build_candidates(indices: Iterable[int], scores: Iterable[float], df: pd.DataFrame) -> List[BookCandidate]:
+    """Build the BookCandidate list of one detection from catalogue row indices (-1 = no candidate)."""
     results = []
-    for _, score, idx in matches:
+    for idx, score in zip(indices, scores):
+        if idx < 0:
+            break
         match = df.iloc[idx]
         results.append(
             BookCandidate(
-                title=match["title"],
-                author=match["author"],
-                editor=match["editor"],
-                isbn=match["isbn"],
-                db_id=idx,
-                match_score=score
+                title=str(match["title"]),
+                author=str(match["author"]),
+                editor=optional_str(match.get("editor")),
+                isbn=optional_str(match["isbn"]),
+                db_id=int(idx),
+                match_score=float(score)
             )
         )
-    
-    return results
\ No newline at end of file
+
+    return results
+
+def find_top_matches_batch(ocr_texts: List[str], signatures: List[str], limit: int = 3,
+                           candidate_index: Optional[TrigramIndex] = None,
+                           workers: int = MATCH_WORKERS, chunk_size: int = MATCH_CHUNK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every OCR text of an image against the catalogue.
+
+    Without `candidate_index`, the whole catalogue is scored with one multi-threaded cdist per chunk: as many
+    pairs as find_top_matches for each text, so it is only faster with several cores (`workers`).
+    With it, each text is only rescored against the shortlist of rows sharing the most trigrams with it.
+
+    Returns two (len(ocr_texts), limit) arrays, best match first:
+    the catalogue row indices (-1 when there is no candidate) and their token_set_ratio scores.
+    Texts shorter than 3 characters get no candidate, like in find_top_matches.
+    """
+    indices = np.full((len(ocr_texts), limit), -1, dtype=np.int64)
+    scores = np.zeros((len(ocr_texts), limit), dtype=np.float32)
+
+    rows = [i for i, text in enumerate(ocr_texts) if text and len(text) >= 3]
+    if not rows or not signatures:
+        return indices, scores
+    queries = [ocr_texts[i] for i in rows]
+
+    if candidate_index is not None:
+        for row, query in zip(rows, queries):
+            candidates = candidate_index.shortlist(query, MATCH_SHORTLIST_SIZE)
+            matches = process.extract(query, [signatures[i] for i in candidates],
+                                      scorer=fuzz.token_set_ratio, limit=limit)
+            for rank, (_, score, position) in enumerate(matches):
+                indices[row, rank] = candidates[position]
+                scores[row, rank] = score
+        return indices, scores
+
+    # Keep the best `limit` columns of each chunk, then rank the survivors of every chunk
+    kept_indices, kept_scores = [], []
+    for start in range(0, len(signatures), chunk_size):
+        chunk_scores = process.cdist(queries, signatures[start:start + chunk_size],
+                                     scorer=fuzz.token_set_ratio, dtype=np.float32, workers=workers)
+        k = min(limit, chunk_scores.shape[1])
+        top = np.argpartition(-chunk_scores, k - 1, axis=1)[:, :k]
+        kept_indices.append(top + start)
+        kept_scores.append(np.take_along_axis(chunk_scores, top, axis=1))
+
+    kept_indices = np.concatenate(kept_indices, axis=1)
+    kept_scores = np.concatenate(kept_scores, axis=1)
+
+    # Best score first, lowest row index first on ties (same order as process.extract)
+    order = np.lexsort((kept_indices, -kept_scores), axis=1)[:, :limit]
+    k = order.shape[1]
+    indices[rows, :k] = np.take_along_axis(kept_indices, order, axis=1)
+    scores[rows, :k] = np.take_along_axis(kept_scores, order, axis=1)
+
+    return indices, scores
+
+def decide_statuses(indices: np.ndarray, scores: np.ndarray, detection_params) -> np.ndarray:
+    """
+    Apply the MATCHED / AMBIGUOUS / UNKNOWN decision to the top-k arrays of find_top_matches_batch.
+    Returns the status codes (uint8, see STATUS_CODES).
+    """
+    best = scores[:, 0]
+    second = scores[:, 1] if scores.shape[1] > 1 else np.zeros_like(best)
+
+    confident = (indices[:, 0] >= 0) & (best >= detection_params.match_conf_threshold)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unambiguous = (second <= 0) | (best / second >= detection_params.match_ambiguity_ratio)
+
+    return np.where(confident & unambiguous, STATUS_CODES[DetectionStatus.MATCHED],
+                    np.where(confident, STATUS_CODES[DetectionStatus.AMBIGUOUS],
+                             STATUS_CODES[DetectionStatus.UNKNOWN])).astype(np.uint8)
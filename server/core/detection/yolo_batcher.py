@@ -0,0 +1,88 @@
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+from time import perf_counter
+from typing import Dict, Tuple
+from core.config import YOLO_BATCH_MAX_SIZE, YOLO_BATCH_WINDOW_MS
+from core.detection.utils import predict_obbs
+
+
+class YoloBatcher:
+    """
+    Micro-batching scheduler in front of a YOLO model (Ultralytics or ExportedObbDetector).
+
+    Images submitted by concurrent detections within `window_ms` of each other (up to `max_batch_size`)
+    go through a single batched `predict` call on a dedicated thread;
+    each caller gets back the OBB result of its own image.
+    """
+
+    def __init__(self, yolo_model, max_batch_size: int = YOLO_BATCH_MAX_SIZE, window_ms: float = YOLO_BATCH_WINDOW_MS):
+        self.yolo_model = yolo_model
+        self.max_batch_size = max_batch_size
+        self.window_s = window_ms / 1_000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="yolo-batcher", daemon=True)
+        self._thread.start()
+
+        # Counters
+        self.batches = 0
+        self.images = 0
+
+    def detect(self, img: np.ndarray, conf: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as utils.detect_books: blocks until the batch holding `img` has been processed."""
+        future = Future()
+        self._queue.put((img, conf, future))
+        return future.result()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "mean_batch_size": self.images / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self):
+        self._queue.put(None)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            # Collect the images arriving during the window
+            batch = [item]
+            deadline = perf_counter() + self.window_s
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._run(batch)
+                    return
+                batch.append(item)
+
+            self._run(batch)
+
+    def _run(self, batch):
+        # One predict for everybody, at the lowest threshold asked; each caller's threshold is applied afterwards
+        conf = min(item_conf for _, item_conf, _ in batch)
+        try:
+            results = predict_obbs(self.yolo_model, [img for img, _, _ in batch], conf)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.images += len(batch)
+
+        for (_, item_conf, future), (obb_points, confidences) in zip(batch, results):
+            keep = confidences >= item_conf
+            future.set_result((obb_points[keep], confidences[keep]))
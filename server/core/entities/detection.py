@@ -1,5 +1,7 @@
-from dataclasses import dataclass
-from typing import List, Optional
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 from time import time
 from enum import Enum
 from core.config import DEFAULT_YOLO_CONF_THRESHOLD, DEFAULT_MATCH_AMBIGUITY_RATIO, DEFAULT_MATCH_CONF_THRESHOLD
@@ -9,6 +11,17 @@ class DetectionStatus(str, Enum):
     AMBIGUOUS = "ambiguous"  # ⚠️ Plusieurs choix possibles ou score moyen
     UNKNOWN = "unknown"      # ❌ Livre détecté mais titre illisible ou absent du CSV
 
+class MatchMethod(str, Enum):
+    ISBN = "isbn"            # ISBN lu sur le livre et trouvé tel quel dans le CSV
+    FUZZY = "fuzzy"          # Titre/auteur comparés aux signatures
+    NONE = "none"            # Aucun candidat retenu (UNKNOWN)
+
+# Codes de DetectionColumns.statuses / match_methods : position dans ces listes
+DETECTION_STATUSES = list(DetectionStatus)
+MATCH_METHODS = list(MatchMethod)
+STATUS_CODES = {status: code for code, status in enumerate(DETECTION_STATUSES)}
+METHOD_CODES = {method: code for code, method in enumerate(MATCH_METHODS)}
+
 # --- A. Un candidat potentiel (pour le Top 3) ---
 @dataclass
 class BookCandidate:
@@ -38,17 +51,48 @@ class BookDetection:
     # 4. Intelligence (Le résultat du matching)
     status: DetectionStatus        # MATCHED, AMBIGUOUS, UNKNOWN
     best_matches: List[BookCandidate]
+    match_method: MatchMethod = MatchMethod.NONE # Chemin qui a produit le résultat
+
+# --- B bis. Les détections d'une image en colonnes (un tableau par champ de BookDetection) ---
+# C'est ce que le pipeline produit : quelques tableaux au lieu de milliers de petits objets.
+# BookDetection / BookCandidate restent la forme JSON d'une détection (voir core/detection/serialization.py).
+@dataclass(slots=True)
+class DetectionColumns:
+    polygons: np.ndarray            # (N, 4, 2) float32, box_polygon de chaque livre
+    yolo_confidences: np.ndarray    # (N,) float32
+    ocr_confidences: np.ndarray     # (N,) float32
+    ocr_raw_texts: List[str]
+    ocr_cleaned_texts: List[str]
+    statuses: np.ndarray            # (N,) uint8, indice dans DETECTION_STATUSES
+    match_methods: np.ndarray       # (N,) uint8, indice dans MATCH_METHODS
+    candidate_rows: np.ndarray      # (N, k) int32, lignes du CSV (best_matches), -1 = pas de candidat
+    candidate_scores: np.ndarray    # (N, k) float32
+    catalogue: Optional[pd.DataFrame] = None # CSV des candidate_rows : titre, auteur... lus à la sérialisation
+
+    @classmethod
+    def empty(cls, k: int = 3) -> "DetectionColumns":
+        return cls(polygons=np.zeros((0, 4, 2), dtype=np.float32), yolo_confidences=np.zeros(0, dtype=np.float32),
+                   ocr_confidences=np.zeros(0, dtype=np.float32), ocr_raw_texts=[], ocr_cleaned_texts=[],
+                   statuses=np.zeros(0, dtype=np.uint8), match_methods=np.zeros(0, dtype=np.uint8),
+                   candidate_rows=np.full((0, k), -1, dtype=np.int32),
+                   candidate_scores=np.zeros((0, k), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.statuses)
 
 # --- C. Le Résultat Global de l'Image (L'objet racine) ---
-@dataclass
+@dataclass(slots=True)
 class DetectionResult:
-    # La liste des livres trouvés
-    detections: List[BookDetection]
+    # Les livres trouvés (un tableau par champ, voir DetectionColumns)
+    detections: DetectionColumns
     
     # Métadonnées de l'analyse
     session_id: str                 # Lien avec l'utilisateur/session upload
-    timestamp: float = time()
+    image_id: Optional[str] = None  # Pour re-décider sans relancer les modèles (POST /inventory/detect/{image_id}/decision)
+    timestamp: float = field(default_factory=time)
     processing_time_ms: float = 0.0       # Pour surveiller la performance (ex: 450ms)
+    queue_wait_ms: float = 0.0            # Attente d'un worker d'inférence, non comprise dans processing_time_ms
+    stage_timings_ms: Dict[str, float] = field(default_factory=dict) # Par étape : decode, yolo, warp, ocr, clean, match, decide
     
     # Résumé rapide (pour les compteurs en haut de l'app)
     total_detected: int = 0
@@ -61,4 +105,60 @@ class DetectionResult:
 class DetectionParams:
     yolo_conf_threshold: float = DEFAULT_YOLO_CONF_THRESHOLD
     match_conf_threshold: float = DEFAULT_MATCH_CONF_THRESHOLD
-    match_ambiguity_ratio: float = DEFAULT_MATCH_AMBIGUITY_RATIO
\ No newline at end of file
+    match_ambiguity_ratio: float = DEFAULT_MATCH_AMBIGUITY_RATIO
+
+# --- E. Sorties des modèles pour une image (pour ré-appliquer la décision sans relancer YOLO ni l'OCR) ---
+@dataclass
+class DetectionIntermediates:
+    session_id: str
+    catalogue_id: str               # Catalogue des indices de match_indices
+    floor_conf: float               # Boîtes conservées jusqu'à cette confiance YOLO
+    obb_points: np.ndarray          # (N, 4, 2)
+    yolo_confidences: np.ndarray    # (N,)
+    ocr_results: List[Tuple[str, float]] # (texte brut, confiance) par boîte
+    ocr_cleaned_texts: List[str]
+    match_indices: np.ndarray       # (N, k) lignes du CSV, -1 = pas de candidat
+    match_scores: np.ndarray        # (N, k)
+    isbn_matched: np.ndarray        # (N,) livre identifié par son ISBN
+    processing_time_ms: float = 0.0
+    stage_timings_ms: Dict[str, float] = field(default_factory=dict)
+
+# --- F. Détection en flux (SSE) : les boîtes d'abord, puis les livres au fil de l'OCR ---
+@dataclass
+class DetectionUpdate:
+    event: str                      # "boxes" (juste après YOLO), "detections" (par lot d'OCR), "result" (à la fin)
+    elapsed_ms: float = 0.0         # Depuis le début de la détection
+    indices: List[int] = field(default_factory=list)  # Position de chaque boîte / détection dans result.detections
+    polygons: List[List[List[float]]] = field(default_factory=list) # "boxes" : polygones OBB, pour l'AR
+    yolo_confidences: List[float] = field(default_factory=list)     # "boxes"
+    detections: DetectionColumns = field(default_factory=DetectionColumns.empty) # "detections" : statut et candidats
+    result: Optional[DetectionResult] = None                        # "result" : comme POST /inventory/detect
+
+# --- G. Scan d'une bibliothèque entière (plusieurs photos qui se recouvrent) ---
+@dataclass
+class ScanImageResult:
+    image_index: int                # Position de la photo dans le scan
+    image_id: Optional[str] = None  # Comme DetectionResult.image_id, pour re-décider une photo du scan
+    result: Optional[DetectionResult] = None
+    error: Optional[str] = None     # Photo illisible ou vide (le scan continue avec les suivantes)
+    new_book_ids: List[int] = field(default_factory=list)        # db_id vus pour la première fois dans ce scan
+    duplicate_detections: List[int] = field(default_factory=list) # Index des détections déjà vues sur une photo précédente
+
+@dataclass
+class ScanBook:
+    db_id: int
+    title: str
+    author: str
+    copies: int                     # Max d'exemplaires visibles sur une même photo
+    image_indices: List[int]        # Photos où le livre apparaît
+
+@dataclass
+class ScanSummary:
+    session_id: str
+    images: int = 0
+    failed_images: int = 0
+    total_detected: int = 0         # Somme sur les photos, doublons compris
+    unique_books: int = 0           # Livres MATCHED distincts après fusion des photos
+    books: List[ScanBook] = field(default_factory=list)
+    wall_time_ms: float = 0.0
+    stage_busy_ms: dict = field(default_factory=dict) # Temps de travail de chaque étage : le plus lent borne le débit
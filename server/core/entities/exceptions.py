@@ -4,4 +4,24 @@ class ImageNotFoundException(Exception):
 
 class EmptyImageException(Exception):
     def __init__(self, message):
-        self.message = message
\ No newline at end of file
+        self.message = message
+
+class InferenceQueueFullException(Exception):
+    def __init__(self, message):
+        self.message = message
+
+class ModelsNotLoadedException(Exception):
+    def __init__(self, message):
+        self.message = message
+
+class BadCatalogueException(Exception):
+    def __init__(self, message):
+        self.message = message
+
+class PasswordHashQueueFullException(Exception):
+    def __init__(self, message):
+        self.message = message
+
+class ProfilerBusyException(Exception):
+    def __init__(self, message):
+        self.message = message
@@ -1,5 +1,7 @@
-from typing import List
+from typing import List, Optional
 from core.entities.detection import DetectionParams
+from core.detection.candidate_index import TrigramIndex
+from core.detection.isbn import IsbnIndex
 import pandas as pd
 from dataclasses import dataclass
 
@@ -10,4 +12,9 @@ class InventorySession:
     df: pd.DataFrame
     last_access: float
     detection_params: DetectionParams
+    candidate_index: Optional[TrigramIndex] = None # Only built for large catalogues
+    isbn_index: Optional[IsbnIndex] = None # Exact ISBN lookup, tried before fuzzy matching
+    nbytes: int = 0 # Memory footprint of the catalogue, used by the LRU eviction
+    catalogue_id: str = "" # Changes with the uploaded catalogue (cached detections refer to its rows)
+    scan_session_id: str = "" # Row of scan_sessions the detections are saved under (see InventoryStore)
     
\ No newline at end of file
@@ -1,3 +1,4 @@
 from .user import User
+from .inventory import Catalogue, CatalogueBook, ScanSession, Detection
 
-__all__ = ["User"]
+__all__ = ["User", "Catalogue", "CatalogueBook", "ScanSession", "Detection"]
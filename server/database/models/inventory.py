@@ -0,0 +1,61 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Index, JSON
+from sqlalchemy.sql import func
+from database.database import Base
+
+
+class Catalogue(Base):
+    """Uploaded library catalogue (its books are in catalogue_books)."""
+
+    __tablename__ = "catalogues"
+
+    id = Column(String(64), primary_key=True) # catalogue_id of the sessions: hash of the CSV (or random)
+    row_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class CatalogueBook(Base):
+    """Book of a catalogue, at its row of the uploaded CSV (the db_id of the detections)."""
+
+    __tablename__ = "catalogue_books"
+
+    catalogue_id = Column(String(64), ForeignKey("catalogues.id", ondelete="CASCADE"), primary_key=True)
+    row = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String)
+    author = Column(String)
+    isbn = Column(String)
+    editor = Column(String)
+
+
+class ScanSession(Base):
+    """Inventory session of a user: the catalogue loaded and the detection params (latest one = current)."""
+
+    __tablename__ = "scan_sessions"
+
+    id = Column(String(32), primary_key=True) # Generated by the app, so that detections can refer to it right away
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    catalogue_id = Column(String(64), ForeignKey("catalogues.id"), nullable=False)
+    detection_params = Column(JSON, nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False) # Set by the app when the session is created (orders "latest")
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+class Detection(Base):
+    """Book detected on a photo of a scan session, as last decided (a re-decision replaces the photo's rows)."""
+
+    __tablename__ = "detections"
+    __table_args__ = (Index("ix_detections_session_image", "scan_session_id", "image_id"),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    scan_session_id = Column(String(32), ForeignKey("scan_sessions.id", ondelete="CASCADE"), nullable=False)
+    image_id = Column(String(40), nullable=False) # sha1 of the photo
+    position = Column(Integer, nullable=False) # Index in DetectionResult.detections
+    status = Column(String(16), nullable=False)
+    match_method = Column(String(16), nullable=False)
+    box_polygon = Column(JSON, nullable=False) # 4 [x, y] points
+    yolo_confidence = Column(Float, nullable=False)
+    ocr_confidence = Column(Float, nullable=False)
+    ocr_raw_text = Column(String, nullable=False)
+    ocr_cleaned_text = Column(String, nullable=False)
+    catalogue_row = Column(Integer) # Best candidate (catalogue_books.row), None without candidate
+    match_score = Column(Float)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
@@ -1,20 +1,49 @@
 from fastapi import Depends, HTTPException, status, Header
-from services.auth_service import AuthService
-from sqlalchemy.orm import Session
-from database.database import SessionLocal
+from services.auth_service import AuthService, auth_service
+from services.inventory_session_service import InventorySessionService, inventory_session_service
+from services.inference_executor import InferenceExecutor, inference_executor
+from services.detection_cache import DetectionCache, detection_cache
+from services.detection_service import DetectionService, get_detection_service as get_shared_detection_service
+from core.entities.exceptions import ModelsNotLoadedException
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import AsyncSessionLocal
 from database.models.user import User
 
-def get_db():
-    """Dependency to get database session."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency to get database session (lazy: no connection is checked out until the first query)."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def get_current_user(authorization: str = Header(None),
-                     db: Session = Depends(get_db),
-                     auth_service: AuthService = Depends(AuthService)) -> User:
+def get_auth_service() -> AuthService:
+    """Dependency to get the auth service shared by every request of this worker (JWT secret, token and user caches)."""
+    return auth_service
+
+def get_inventory_session_service() -> InventorySessionService:
+    """Dependency to get the session store shared by every request of this worker."""
+    return inventory_session_service
+
+def get_inference_executor() -> InferenceExecutor:
+    """Dependency to get the inference executor shared by every request of this worker."""
+    return inference_executor
+
+def get_detection_cache() -> DetectionCache:
+    """Dependency to get the model outputs of the last images analyzed (by any worker with the "arrow_file" backend)."""
+    return detection_cache
+
+def get_detection_service() -> DetectionService:
+    """Dependency to get the detection models (sync, so that a lazy loading never blocks the event loop)."""
+    try:
+        return get_shared_detection_service()
+    except ModelsNotLoadedException as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=e.message,
+            headers={"Retry-After": "5"}
+        )
+
+async def get_current_user(authorization: str = Header(None),
+                           db: AsyncSession = Depends(get_db),
+                           auth_service: AuthService = Depends(get_auth_service)) -> User:
     """Dependency to get the current authenticated user from JWT token."""
     if not authorization:
         raise HTTPException(
@@ -42,7 +71,7 @@ def get_current_user(authorization: str = Header(None),
         )
     
     # Get user from database
-    user = auth_service.get_user_by_id(db, user_id)
+    user = await auth_service.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
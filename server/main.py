@@ -1,13 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database.database import Base, engine
+from core.config import SESSION_SWEEP_INTERVAL_SECONDS, MODELS_LOAD_AT_STARTUP, MODELS_LOAD_IN_BACKGROUND, \
+    PERSISTENCE_ENABLED, PERSISTENCE_FLUSH_INTERVAL_SECONDS
+from core.entities.exceptions import ModelsNotLoadedException
+from database.database import Base, engine, async_engine
 from database.models import User
-from routers import auth, inventory_session
+from routers import auth, inventory_session, metrics
+from services.inventory_session_service import inventory_session_service
+from services.inventory_store import inventory_store
+from services.inference_executor import inference_executor
+from services.password_hasher import password_hasher
+from services.detection_service import load_detection_service, get_model_status
 
 # Create all database tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Book Detective API", version="1.0.0")
+
+def load_models():
+    """Load and warm up the detection models of this worker (the error is kept for /health)."""
+    try:
+        load_detection_service()
+    except ModelsNotLoadedException as e:
+        print(e.message)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background tasks with the worker, stop them on shutdown."""
+    sweeper = asyncio.create_task(inventory_session_service.run_sweeper(SESSION_SWEEP_INTERVAL_SECONDS))
+    writer = None
+    if PERSISTENCE_ENABLED:
+        writer = asyncio.create_task(inventory_store.run(PERSISTENCE_FLUSH_INTERVAL_SECONDS))
+    if MODELS_LOAD_AT_STARTUP:
+        loading = asyncio.get_running_loop().run_in_executor(None, load_models)
+        if not MODELS_LOAD_IN_BACKGROUND:
+            await loading
+    yield
+    sweeper.cancel()
+    inference_executor.shutdown()
+    password_hasher.shutdown()
+    if writer is not None:
+        inventory_store.stop()
+        await writer # Its last flush writes what is still queued (cancelling it would lose the batch in progress)
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Book Detective API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS to allow frontend requests
 app.add_middleware(
@@ -25,9 +65,15 @@ app.add_middleware(
 # Include routers with /api prefix
 app.include_router(auth.router, prefix="/api")
 app.include_router(inventory_session.router, prefix="/api")
+# Prometheus scrapes /metrics, next to /health
+app.include_router(metrics.router)
 
 
 @app.get("/health")
 def health_check():
-    """Health check endpoint."""
-    return {"status": "ok"}
+    """Health check endpoint ("warming" while the detection models load)."""
+    models = get_model_status()
+    return {
+        "status": "warming" if models["state"] in ("loading", "warming") else "ok",
+        "models": models
+    }
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.auth import UserCreate, UserLogin, TokenResponse, UserResponse
 from services.auth_service import AuthService
-from dependencies import get_current_user, get_db
+from core.entities.exceptions import PasswordHashQueueFullException
+from dependencies import get_current_user, get_db, get_auth_service
 
 router = APIRouter(
     prefix="/auth",
@@ -10,17 +11,19 @@ router = APIRouter(
 )
 
 @router.post("/register",response_model=TokenResponse)
-def register(user_create: UserCreate,
-             db: Session = Depends(get_db),
-             auth_service: AuthService = Depends(AuthService)):
+async def register(user_create: UserCreate,
+                   db: AsyncSession = Depends(get_db),
+                   auth_service: AuthService = Depends(get_auth_service)):
     """Register a new user."""
     try:
-        user, token = auth_service.register_user(db, user_create)
+        user, token = await auth_service.register_user(db, user_create)
         return TokenResponse(
             message="User registered successfully",
             user=UserResponse.from_orm(user),
             token=token
         )
+    except PasswordHashQueueFullException as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=e.message, headers={"Retry-After": "1"})
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -34,17 +37,19 @@ def register(user_create: UserCreate,
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(user_login: UserLogin,
-          db: Session = Depends(get_db),
-          auth_service: AuthService = Depends(AuthService)):
+async def login(user_login: UserLogin,
+                db: AsyncSession = Depends(get_db),
+                auth_service: AuthService = Depends(get_auth_service)):
     """Authenticate a user and return JWT token."""
     try:
-        user, token = auth_service.login_user(db, user_login.email, user_login.password)
+        user, token = await auth_service.login_user(db, user_login.email, user_login.password)
         return TokenResponse(
             message="Login successful",
             user=UserResponse.from_orm(user),
             token=token
         )
+    except PasswordHashQueueFullException as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=e.message, headers={"Retry-After": "1"})
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -2,25 +2,50 @@ from pydantic import ValidationError
 from fastapi import APIRouter, Depends, HTTPException, status, Header
 from database.models.user import User
 from services.inventory_session_service import InventorySessionService
-import pandas as pd
-from dependencies import get_current_user
+from dependencies import get_current_user, get_inventory_session_service, get_inference_executor, get_detection_service, \
+    get_detection_cache
+from services.inference_executor import InferenceExecutor
+from services.detection_cache import DetectionCache
+from services.profiling import run_profiled
+from core.config import DETECTION_FLOOR_CONF, SCAN_MAX_IMAGES, PROFILING_ENABLED
+from core.detection.ocr_cache import empty_ocr_cache_stats
+from core.detection.detection_pipeline import decide_detections
+from core.detection.serialization import dumps, dataclass_dict
+from core.entities.detection import DetectionUpdate
+from services.detection_service import DetectionService, loaded_detection_service
+from core.entities.exceptions import ImageNotFoundException, EmptyImageException, InferenceQueueFullException, \
+    BadCatalogueException, ProfilerBusyException
 from fastapi import File, UploadFile, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from schemas.detection import DetectionResultSchema
 from schemas.detection_params import DetectionParamsSchema
 from pydantic import Json
-import io
+import hashlib
+from functools import partial
+from typing import List, Optional
 
 router = APIRouter(
     prefix="/inventory",
     tags=["inventory"]
 )
 
-mandatory_columns = {"title", "author", "isbn"}
+
+class DetectionResponse(JSONResponse):
+    """
+    JSON of a DetectionResult, written by orjson straight from its arrays (see core/detection/serialization.py).
+    A JSON response class: the routes returning it document their response_model (DetectionResultSchema) in OpenAPI.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
 
 @router.post("/session")
 async def register(csv_file: UploadFile = File(...),
              detection_params: str = Form(...),
              current_user: User = Depends(get_current_user),
-             inventory_session_service: InventorySessionService = Depends(InventorySessionService)):
+             inventory_session_service: InventorySessionService = Depends(get_inventory_session_service)):
     """Create a new inventory session"""
     # TODO: étudier aspect sécurité ?
     # CSV file is uploaded as binary file
@@ -34,36 +59,32 @@ async def register(csv_file: UploadFile = File(...),
     except ValidationError as e:
         raise HTTPException(status_code=422, detail=f"Invalid JSON params: {e}")
 
-    # Convert CSV to pandas dataframe
+    # Convert CSV to pandas dataframe, parsed straight from the spooled upload (off the event loop),
+    # unless the same file is in the catalogue cache
     try:
-        contents = await csv_file.read()
-        df = pd.read_csv(io.BytesIO(contents), sep=None, engine='python')
-    except Exception as e:
-        raise HTTPException(status_code=400, detail="Bad CSV")
+        count = await run_in_threadpool(
+            inventory_session_service.create_session_from_csv,
+            session_id=current_user.id,
+            csv_file=csv_file.file,
+            detection_params=detection_params
+        )
+    except BadCatalogueException as e:
+        raise HTTPException(status_code=400, detail=e.message)
     finally:
         await csv_file.close()
     
-    if len(df) == 0 or not mandatory_columns.issubset(set(df.columns.values)):
-        raise HTTPException(status_code=400, detail="CSV is empty or doesn't have mandatory columns")
-
-    inventory_session_service.create_session(
-        session_id=current_user.id,
-        df=df,
-        detection_params=detection_params
-    )
-    
     return {
         "status": "success", 
         "message": "Inventory received", 
-        "count": len(df)
+        "count": count
     }
 
 @router.get("/session")
-def register(current_user: User = Depends(get_current_user),
-             inventory_session_service: InventorySessionService = Depends(InventorySessionService)):
-    """Get an existing inventory session"""
+async def register(current_user: User = Depends(get_current_user),
+             inventory_session_service: InventorySessionService = Depends(get_inventory_session_service)):
+    """Get an existing inventory session (restored from the database if it is no longer in memory)"""
 
-    session = inventory_session_service.get_session_data(current_user.id)
+    session = await inventory_session_service.get_or_restore_session(current_user.id)
     
     if not session:
         raise HTTPException(status_code=404, detail="No session found")
@@ -72,4 +93,262 @@ def register(current_user: User = Depends(get_current_user),
         "status": "success", 
         "message": "Inventory received", 
         "session_id": session.session_id
-    }
\ No newline at end of file
+    }
+
+@router.get("/session/stats")
+def get_session_stats(current_user: User = Depends(get_current_user),
+                      inventory_session_service: InventorySessionService = Depends(get_inventory_session_service)):
+    """Get the counters of the inventory session store"""
+    return inventory_session_service.stats()
+
+@router.get("/cache/stats")
+def get_cache_stats(current_user: User = Depends(get_current_user),
+                    inventory_session_service: InventorySessionService = Depends(get_inventory_session_service)):
+    """Get the counters of the catalogue cache"""
+    return inventory_session_service.cache_stats()
+
+@router.get("/ocr-cache/stats")
+def get_ocr_cache_stats(current_user: User = Depends(get_current_user)):
+    """Get the counters (hit rate, memory) of the OCR cache"""
+    # Never loads the models: before they are loaded, their cache is empty
+    detection_service = loaded_detection_service()
+    if detection_service is None:
+        return empty_ocr_cache_stats()
+    return detection_service.ocr_cache_stats()
+
+
+@router.post("/detect", response_class=DetectionResponse, response_model=DetectionResultSchema)
+async def detect(image: UploadFile = File(...),
+                 x_profile: Optional[str] = Header(None),
+                 current_user: User = Depends(get_current_user),
+                 inventory_session_service: InventorySessionService = Depends(get_inventory_session_service),
+                 inference_executor: InferenceExecutor = Depends(get_inference_executor),
+                 detection_service: DetectionService = Depends(get_detection_service),
+                 detection_cache: DetectionCache = Depends(get_detection_cache)):
+    """
+    Detect and identify the books of a shelf photo, against the user's inventory session.
+    With PROFILING_ENABLED, the header "X-Profile: 1" dumps a profile of the detection (file name in X-Profile-File).
+    """
+    session = await inventory_session_service.get_or_restore_session(current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="No session found")
+    profile = x_profile not in (None, "", "0")
+    if profile and not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled")
+
+    # The photo stays in memory: it is decoded once by the pipeline, no temp file
+    try:
+        contents = await image.read()
+    finally:
+        await image.close()
+
+    # Same photo as before: the model outputs are reused
+    image_id = hashlib.sha1(contents).hexdigest()
+    floor_conf = min(DETECTION_FLOOR_CONF, session.detection_params.yolo_conf_threshold)
+    intermediates = detection_cache.get(session.session_id, image_id) if not profile else None
+    if intermediates is not None and intermediates.catalogue_id == session.catalogue_id \
+            and intermediates.floor_conf <= floor_conf:
+        detection_result = decide_detections(intermediates, session.df, session.detection_params,
+                                             include_analysis_time=False)
+        detection_result.image_id = image_id
+        inventory_session_service.save_result(session, detection_result)
+        return DetectionResponse(detection_result)
+
+    # Every box down to the floor confidence is read, so that the thresholds can be re-applied later
+    analyze = detection_service.analyze_bookshelf
+    if profile:
+        analyze = partial(run_profiled, analyze, profile_name=image_id[:12])
+    try:
+        intermediates, queue_wait_ms = await inference_executor.run(
+            analyze,
+            contents,
+            session.session_id,
+            session.signatures,
+            floor_conf,
+            candidate_index=session.candidate_index,
+            isbn_index=session.isbn_index,
+            catalogue_id=session.catalogue_id
+        )
+    except (InferenceQueueFullException, ProfilerBusyException) as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=e.message, headers={"Retry-After": "1"})
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    except EmptyImageException as e:
+        raise HTTPException(status_code=422, detail=e.message)
+
+    headers = {}
+    if profile:
+        intermediates, headers["X-Profile-File"] = intermediates
+    detection_cache.put(session.session_id, image_id, intermediates)
+    detection_result = decide_detections(intermediates, session.df, session.detection_params)
+    detection_result.image_id = image_id
+    detection_result.queue_wait_ms = queue_wait_ms
+    inventory_session_service.save_result(session, detection_result)
+    return DetectionResponse(detection_result, headers=headers)
+
+@router.post("/detect/stream")
+async def detect_stream(image: UploadFile = File(...),
+                        current_user: User = Depends(get_current_user),
+                        inventory_session_service: InventorySessionService = Depends(get_inventory_session_service),
+                        inference_executor: InferenceExecutor = Depends(get_inference_executor),
+                        detection_service: DetectionService = Depends(get_detection_service),
+                        detection_cache: DetectionCache = Depends(get_detection_cache)):
+    """
+    Same as /detect, as Server-Sent Events: "boxes" (polygons, right after YOLO), "detections" (books decided
+    after each OCR batch, with their position in the final list), then "result" (the DetectionResult of /detect).
+    An image already analyzed only gets the "result" event.
+    """
+    session = await inventory_session_service.get_or_restore_session(current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="No session found")
+
+    try:
+        contents = await image.read()
+    finally:
+        await image.close()
+
+    image_id = hashlib.sha1(contents).hexdigest()
+    floor_conf = min(DETECTION_FLOOR_CONF, session.detection_params.yolo_conf_threshold)
+    intermediates = detection_cache.get(session.session_id, image_id)
+    if intermediates is not None and intermediates.catalogue_id == session.catalogue_id \
+            and intermediates.floor_conf <= floor_conf:
+        detection_result = decide_detections(intermediates, session.df, session.detection_params,
+                                             include_analysis_time=False)
+        detection_result.image_id = image_id
+        inventory_session_service.save_result(session, detection_result)
+        return StreamingResponse(iter([_sse_event(DetectionUpdate(event="result", result=detection_result))]),
+                                 media_type="text/event-stream")
+
+    updates = detection_service.stream_detection(
+        contents,
+        session.session_id,
+        session.signatures,
+        session.df,
+        session.detection_params,
+        floor_conf=floor_conf,
+        candidate_index=session.candidate_index,
+        isbn_index=session.isbn_index,
+        catalogue_id=session.catalogue_id,
+        on_analyzed=partial(detection_cache.put, session.session_id, image_id)
+    )
+    try:
+        results = inference_executor.stream(updates)
+        # The image errors come with the first event (YOLO): wait for it, so that they get a proper status
+        first = await anext(results)
+    except InferenceQueueFullException as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=e.message, headers={"Retry-After": "1"})
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    except EmptyImageException as e:
+        raise HTTPException(status_code=422, detail=e.message)
+
+    async def events():
+        try:
+            yield _sse_event(first)
+            async for update in results:
+                if update.result is not None:
+                    update.result.image_id = image_id
+                    inventory_session_service.save_result(session, update.result)
+                yield _sse_event(update)
+        except Exception as e:
+            yield f"event: error\ndata: {dumps({'detail': str(e)}).decode()}\n\n"
+        finally:
+            await results.aclose() # Client gone: stops the detection at the next OCR batch
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _sse_event(update: DetectionUpdate) -> str:
+    return f"event: {update.event}\ndata: {dumps(update).decode()}\n\n"
+
+@router.post("/detect/{image_id}/decision", response_class=DetectionResponse,
+             response_model=DetectionResultSchema)
+def redecide(image_id: str,
+             detection_params: DetectionParamsSchema,
+             current_user: User = Depends(get_current_user),
+             inventory_session_service: InventorySessionService = Depends(get_inventory_session_service),
+             detection_cache: DetectionCache = Depends(get_detection_cache)):
+    """
+    Re-apply new detection params to an already analyzed photo, without running the models again.
+    The model outputs are shared by the uvicorn workers with the "arrow_file" session backend only: with the
+    "memory" one, a re-decision reaching another worker than the detection gets a 404 (re-run /detect).
+    """
+    session = inventory_session_service.get_session_data(current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="No session found")
+
+    intermediates = detection_cache.get(session.session_id, image_id)
+    if intermediates is None:
+        raise HTTPException(status_code=404, detail="Image not analyzed by this worker (or expired), "
+                                                    "run POST /inventory/detect again")
+    if intermediates.catalogue_id != session.catalogue_id:
+        raise HTTPException(status_code=409, detail="The inventory changed since the analysis, run the detection again")
+    if detection_params.yolo_conf_threshold < intermediates.floor_conf:
+        raise HTTPException(status_code=409, detail=f"yolo_conf_threshold below {intermediates.floor_conf}, "
+                                                    "run the detection again")
+
+    detection_result = decide_detections(intermediates, session.df, detection_params, include_analysis_time=False)
+    detection_result.image_id = image_id
+    # Replaces the saved detections of the photo
+    inventory_session_service.save_result(session, detection_result)
+    return DetectionResponse(detection_result)
+
+@router.post("/scan")
+async def scan(images: List[UploadFile] = File(...),
+               current_user: User = Depends(get_current_user),
+               inventory_session_service: InventorySessionService = Depends(get_inventory_session_service),
+               inference_executor: InferenceExecutor = Depends(get_inference_executor),
+               detection_service: DetectionService = Depends(get_detection_service),
+               detection_cache: DetectionCache = Depends(get_detection_cache)):
+    """
+    Detect the books of a whole bookcase from many (overlapping) photos, the stages of successive photos overlapping.
+    Streams NDJSON: one {"type": "image"} line per photo as soon as it is done, then a {"type": "summary"} line
+    with the books merged across the photos.
+    """
+    session = await inventory_session_service.get_or_restore_session(current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="No session found")
+    if len(images) > SCAN_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {SCAN_MAX_IMAGES} photos per scan")
+
+    contents = []
+    for image in images:
+        try:
+            contents.append(await image.read())
+        finally:
+            await image.close()
+
+    # Every photo of the scan can be re-decided later, like a single detection
+    shelf_scan = detection_service.scan_shelf(
+        contents,
+        session.session_id,
+        session.signatures,
+        session.df,
+        session.detection_params,
+        floor_conf=min(DETECTION_FLOOR_CONF, session.detection_params.yolo_conf_threshold),
+        candidate_index=session.candidate_index,
+        isbn_index=session.isbn_index,
+        catalogue_id=session.catalogue_id,
+        image_ids=[hashlib.sha1(image).hexdigest() for image in contents],
+        on_analyzed=partial(detection_cache.put, session.session_id)
+    )
+    try:
+        # Own limit: a scan of many photos doesn't hold the inference slot of single detections
+        results = inference_executor.stream(shelf_scan, scan=True)
+    except InferenceQueueFullException as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=e.message, headers={"Retry-After": "1"})
+
+    async def ndjson():
+        try:
+            async for image_result in results:
+                if image_result.result is not None:
+                    inventory_session_service.save_result(session, image_result.result)
+                yield dumps({"type": "image", **dataclass_dict(image_result)}) + b"\n"
+        except Exception as e:
+            # The status is already sent: the failure is reported in the stream
+            yield dumps({"type": "error", "detail": str(e)}) + b"\n"
+            return
+        finally:
+            await results.aclose() # Client gone: stops the scan at the next photo
+        yield dumps({"type": "summary", **dataclass_dict(shelf_scan.summary)}) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
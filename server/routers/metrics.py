@@ -0,0 +1,75 @@
+import secrets
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from core.config import METRICS_TOKEN
+from services.metrics import metrics, cache_samples
+from services.auth_service import auth_service
+from services.inference_executor import inference_executor
+from services.detection_cache import detection_cache
+from services.detection_service import loaded_detection_service
+from services.inventory_session_service import inventory_session_service
+from services.inventory_store import inventory_store
+from services.password_hasher import password_hasher
+
+router = APIRouter(tags=["metrics"])
+
+
+def collect_services():
+    """Gauges and counters read from the services of this worker when /metrics is scraped."""
+    executor = inference_executor.stats()
+    sessions = inventory_session_service.stats()
+    hasher = password_hasher.stats()
+    store = inventory_store.stats()
+    samples = [
+        ("book_detective_inference_in_flight", "gauge", "Detections running or waiting for an inference worker",
+         [({}, executor["in_flight"])]),
+        ("book_detective_inference_queued", "gauge", "Detections waiting for an inference worker",
+         [({}, executor["queued"])]),
+        ("book_detective_inference_rejected_total", "counter", "Detections rejected with a 429 (queue full)",
+         [({}, executor["rejected"])]),
+        ("book_detective_scans_in_flight", "gauge", "Multi-photo scans running",
+         [({}, executor["scans_in_flight"])]),
+        ("book_detective_scans_rejected_total", "counter", "Scans rejected with a 429 (too many scans)",
+         [({}, executor["rejected_scans"])]),
+        ("book_detective_password_hash_in_flight", "gauge", "Password hashes running or waiting for a process",
+         [({}, hasher["in_flight"])]),
+        ("book_detective_password_hash_rejected_total", "counter", "Registers / logins rejected with a 429 (hash queue full)",
+         [({}, hasher["rejected"])]),
+        ("book_detective_persistence_pending", "gauge", "Writes queued for the database",
+         [({}, store["pending"])]),
+        ("book_detective_persistence_dropped_total", "counter", "Writes dropped (database queue full)",
+         [({}, store["dropped"])]),
+        ("book_detective_persistence_failed_total", "counter", "Writes lost on a database error",
+         [({}, store["failed"])]),
+        ("book_detective_persistence_flush_seconds_total", "counter", "Time spent writing to the database",
+         [({}, store["flush_ms"] / 1_000)]),
+        ("book_detective_sessions", "gauge", "Inventory sessions in the store", [({}, sessions["sessions"])]),
+        ("book_detective_detection_cache_images", "gauge", "Images whose model outputs are cached",
+         [({}, detection_cache.stats()["images"])]),
+    ]
+    samples += cache_samples("book_detective_session_store", "Session store", sessions)
+    samples += cache_samples("book_detective_detection_cache", "Detection cache", detection_cache.stats())
+    samples += cache_samples("book_detective_catalogue_cache", "Catalogue cache", inventory_session_service.cache_stats())
+    auth_stats = auth_service.cache_stats()
+    samples += cache_samples("book_detective_token_cache", "Verified token cache", auth_stats["tokens"])
+    samples += cache_samples("book_detective_user_cache", "Authenticated user cache", auth_stats["users"])
+    detection_service = loaded_detection_service()
+    if detection_service is not None:
+        samples += cache_samples("book_detective_ocr_cache", "OCR cache", detection_service.ocr_cache_stats())
+    return samples
+
+
+metrics.add_collector(collect_services)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Metrics of this worker in the Prometheus text format.
+    Internal only: not behind the user authentication, so keep it off the public proxy, or set METRICS_TOKEN.
+    """
+    if METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return metrics.render()
@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from core.entities.detection import BookDetection
+
+
+class DetectionResultSchema(BaseModel):
+    """
+    Schema of a DetectionResult as the API returns it, for the OpenAPI documentation only:
+    the response is written by DetectionResponse (orjson), never validated against it.
+    """
+    detections: List[BookDetection]
+    session_id: str
+    image_id: Optional[str] = None
+    timestamp: float
+    processing_time_ms: float = 0.0
+    queue_wait_ms: float = 0.0
+    stage_timings_ms: Dict[str, float] = {}
+    total_detected: int = 0
+    count_matched: int = 0
+    count_ambiguous: int = 0
+    count_unknown: int = 0
@@ -0,0 +1,85 @@
+"""
+Export the detection models for the "onnx" and "openvino" inference backends (see INFERENCE_BACKEND in core/config.py).
+
+Writes, next to the original weights:
+    models_weights/yolo/best.onnx, best.int8.onnx, best_openvino_model/, best_int8_openvino_model/
+    models_weights/paddleocr/inference.onnx (and the recognizer's, if PADDLEOCR_REC_MODEL_PATH is set)
+    models_weights/paddleocr_int8/ (same folder, with INT8 weights)
+
+INT8: ONNX models are quantized dynamically (weights only, no calibration data needed);
+the OpenVINO YOLO model is calibrated by NNCF on the images of the `--data` dataset yaml.
+Always check the accuracy of a quantized model with benchmarks/bench_inference_backends.py before using it.
+
+Run from the server folder:
+    python -m scripts.export_models
+    python -m scripts.export_models --only yolo --data ../datasets/books/data.yaml
+"""
+import argparse
+import os
+import shutil
+import subprocess
+from core.config import YOLO_MODEL_PATH, PADDLEOCR_MODEL_PATH, PADDLEOCR_REC_MODEL_PATH, \
+    YOLO_ONNX_PATH, YOLO_ONNX_INT8_PATH, YOLO_OPENVINO_INT8_PATH
+from core.detection.models import int8_model_dir
+
+
+def quantize_onnx(src: str, dst: str):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+    print("written:", dst)
+
+
+def export_yolo(imgsz: int, data: str):
+    from ultralytics import YOLO
+    model = YOLO(YOLO_MODEL_PATH)
+
+    # ONNX (dynamic batch and image size, so that YoloBatcher can send any batch)
+    path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    print("written:", path)
+    quantize_onnx(YOLO_ONNX_PATH, YOLO_ONNX_INT8_PATH)
+
+    # OpenVINO FP32, then INT8 (NNCF post-training quantization, calibrated on `data`)
+    path = model.export(format="openvino", imgsz=imgsz, dynamic=True)
+    print("written:", path)
+    if data:
+        path = model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=True, data=data)
+        print("written:", path)
+    else:
+        print(f"no --data given, {os.path.dirname(YOLO_OPENVINO_INT8_PATH)} not exported")
+
+
+def export_paddleocr_model(model_dir: str):
+    # Paddle -> ONNX, through PaddleX (the ONNX file is written in the model folder, where PaddleOCR's HPI looks for it)
+    subprocess.run(["paddlex", "--paddle2onnx", "--paddle_model_dir", model_dir, "--onnx_model_dir", model_dir],
+                   check=True)
+    print("written:", os.path.join(model_dir, "inference.onnx"))
+
+    # INT8 copy of the folder
+    int8_dir = int8_model_dir(model_dir)
+    shutil.copytree(model_dir, int8_dir, dirs_exist_ok=True)
+    quantize_onnx(os.path.join(model_dir, "inference.onnx"), os.path.join(int8_dir, "inference.onnx"))
+
+
+def export_paddleocr():
+    export_paddleocr_model(PADDLEOCR_MODEL_PATH)
+    if PADDLEOCR_REC_MODEL_PATH:
+        export_paddleocr_model(PADDLEOCR_REC_MODEL_PATH)
+    else:
+        print("PADDLEOCR_REC_MODEL_PATH is not set: the recognizer is left to PaddleOCR's default model")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["yolo", "paddleocr"], help="export a single model")
+    parser.add_argument("--imgsz", type=int, default=640, help="YOLO input size")
+    parser.add_argument("--data", help="dataset yaml used to calibrate the OpenVINO INT8 YOLO model")
+    args = parser.parse_args()
+
+    if args.only in (None, "yolo"):
+        export_yolo(args.imgsz, args.data)
+    if args.only in (None, "paddleocr"):
+        export_paddleocr()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, TypeVar
+from core.config import AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES
+
+V = TypeVar("V")
+
+
+class TtlCache(Generic[V]):
+    """
+    Small in-memory cache whose entries expire `ttl_seconds` after being put (or at their own deadline if sooner).
+    Least recently used entries are dropped above `max_entries`.
+    `version()` changes on every invalidation: a value read from the database before an invalidation
+    is not put back (see `put`).
+    """
+
+    def __init__(self, ttl_seconds: float = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._version = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def put(self, key: Hashable, value: V, expires_at: Optional[float] = None, version: Optional[int] = None):
+        """
+        Cache `value`; `expires_at` (time.monotonic() clock) shortens the TTL, e.g. for a token about to expire.
+        With `version` (taken before reading `value`), nothing is cached if an invalidation happened since.
+        """
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        deadline = time.monotonic() + self.ttl_seconds
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = (value, deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._version += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,36 +1,37 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
 import os
-from sqlalchemy.orm import Session
-from bcrypt import hashpw, gensalt, checkpw
+import time
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 from jose import JWTError, jwt
 from database.models.user import User
 from schemas.auth import UserCreate, UserResponse
 import os
 from dotenv import load_dotenv
 from core.config import JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from services.auth_cache import TtlCache
+from services.password_hasher import PasswordHasher, password_hasher
 
 class AuthService:
     # TODO : étudier sécurité
 
-    def __init__(self):
-        # JWT Configuration
+    def __init__(self, hasher: Optional[PasswordHasher] = None):
+        # JWT Configuration (read once: the service is shared by every request, see dependencies.get_auth_service)
         load_dotenv(".env")
 
         self.SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
         self.JWT_ALGORITHM = JWT_ALGORITHM
         self.ACCESS_TOKEN_EXPIRE_MINUTES = ACCESS_TOKEN_EXPIRE_MINUTES
 
+        # Verified tokens (token -> user id) and user rows (user id -> detached User), so that an
+        # authenticated request costs neither a JWT decode nor a DB query while they are fresh
+        self.token_cache: TtlCache[int] = TtlCache()
+        self.user_cache: TtlCache[User] = TtlCache()
 
-    def _hash_password(self, password: str) -> str:
-        """Hash a password using bcrypt."""
-        salt = gensalt()
-        return hashpw(password.encode('utf-8'), salt).decode('utf-8')
-
-
-    def _verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Verify a plain password against a hashed password."""
-        return checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+        # bcrypt runs in its own process pool (PasswordHashQueueFullException when it is saturated)
+        self.password_hasher = hasher if hasher is not None else password_hasher
 
 
     def _create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -50,28 +51,33 @@ class AuthService:
 
     def verify_token(self, token: str) -> Optional[int]:
         """Verify a JWT token and return the user ID if valid."""
-        print("token to verify:", token)
+        user_id = self.token_cache.get(token)
+        if user_id is not None:
+            return user_id
+
         try:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.JWT_ALGORITHM])
-            user_id: int = payload.get("sub")
-            
-            if user_id is None:
-                return None
-            
-            return user_id
-        except JWTError:
+            user_id = int(payload.get("sub"))
+        except (JWTError, TypeError, ValueError):
             return None
 
+        # Never cached past the expiry of the token
+        expires_at = None
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = time.monotonic() + payload["exp"] - time.time()
+        self.token_cache.put(token, user_id, expires_at)
+        return user_id
+
 
-    def register_user(self, db: Session, user_create: UserCreate) -> Tuple[User, str]:
+    async def register_user(self, db: AsyncSession, user_create: UserCreate) -> Tuple[User, str]:
         """Register a new user and return the user and JWT token."""
         # Check if user already exists
-        existing_user = db.query(User).filter(User.email == user_create.email).first()
+        existing_user = await self._get_user_by_email(db, user_create.email)
         if existing_user:
             raise ValueError("Email already registered")
         
         # Hash password and create new user
-        hashed_password = self._hash_password(user_create.password)
+        hashed_password = await self.password_hasher.hash(user_create.password)
         db_user = User(
             email=user_create.email,
             name=user_create.name,
@@ -79,8 +85,8 @@ class AuthService:
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         # Create JWT token
         token = self._create_access_token(data={"sub": str(db_user.id)})
@@ -88,21 +94,70 @@ class AuthService:
         return db_user, token
 
 
-    def login_user(self, db: Session, email: str, password: str) -> Tuple[User, str]:
+    async def login_user(self, db: AsyncSession, email: str, password: str) -> Tuple[User, str]:
         """Authenticate a user and return the user and JWT token."""
         # Find user by email
-        user = db.query(User).filter(User.email == email).first()
+        user = await self._get_user_by_email(db, email)
         
-        if not user or not self._verify_password(password, user.hashed_password):
+        if not user or not await self.password_hasher.verify(password, user.hashed_password):
             raise ValueError("Invalid email or password")
         
         # Create JWT token
         token = self._create_access_token(data={"sub": str(user.id)})
-        print("token generated:", token)
         
         return user, token
 
 
-    def get_user_by_id(self, db: Session, user_id: int) -> Optional[User]:
-        """Get a user by ID."""
-        return db.query(User).filter(User.id == user_id).first()
+    async def _get_user_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
+        return (await db.execute(select(User).where(User.email == email))).scalars().first()
+
+
+    async def get_user_by_id(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        """Get a user by ID (detached from `db` when it comes from the cache: read only)."""
+        user = self.user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        # Taken before the read: if the row is updated meanwhile, the (maybe old) row read is not cached
+        version = self.user_cache.version()
+        user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
+        if user is not None:
+            # Shared between requests: detach it so that no request session refreshes or modifies it
+            db.expunge(user)
+            self.user_cache.put(user_id, user, version=version)
+        return user
+
+
+    def invalidate_user(self, user_id: int):
+        """Forget the cached row of a user (updated or deleted). Other workers see the change after the TTL."""
+        self.user_cache.invalidate(user_id)
+
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {"tokens": self.token_cache.stats(), "users": self.user_cache.stats()}
+
+
+# One service per worker process (see dependencies.get_auth_service)
+auth_service = AuthService()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User):
+    # At flush, and again once committed: a request reading the row between the two still sees the old one
+    auth_service.invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("invalidated_users", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session):
+    for user_id in session.info.pop("invalidated_users", ()):
+        auth_service.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_invalidated_users(session: Session):
+    session.info.pop("invalidated_users", None)
+
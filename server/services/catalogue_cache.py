@@ -0,0 +1,121 @@
+import hashlib
+import os
+import threading
+from time import perf_counter
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+import pandas as pd
+from core.catalogue import save_catalogue, load_catalogue, catalogue_files, remove_files
+from core.config import CATALOGUE_CACHE_DIR, CATALOGUE_CACHE_MAX_BYTES
+from core.detection.candidate_index import TrigramIndex
+from core.detection.isbn import IsbnIndex
+
+# Bump when the preparation of catalogues changes (columns, signatures, index): older entries are then ignored
+CATALOGUE_FORMAT_VERSION = 3
+
+
+def hash_upload(file: BinaryIO) -> str:
+    """SHA-256 of an uploaded file, read in chunks. The file is rewound afterwards."""
+    file.seek(0)
+    digest = hashlib.file_digest(file, "sha256").hexdigest()
+    file.seek(0)
+    return digest
+
+
+class CatalogueCache:
+    """
+    Prepared catalogues (parsed columns, signatures, trigram index) stored on local disk,
+    keyed by the hash of the uploaded CSV: re-uploading the same file skips parsing and preparation.
+
+    Entries are shared by every worker process. The file modification time is the last access time,
+    the least recently used entries are deleted above `max_bytes`.
+    """
+
+    def __init__(self, directory: str = CATALOGUE_CACHE_DIR, max_bytes: int = CATALOGUE_CACHE_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        # Counters (of this worker)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_ms = 0.0
+
+    def get(self, content_hash: str) -> Optional[Tuple[pd.DataFrame, List[str], Optional[TrigramIndex], IsbnIndex]]:
+        """Prepared catalogue of an upload (df, signatures, candidate index, ISBN index), or None."""
+        base = self._base_path(content_hash)
+        start = perf_counter()
+        try:
+            os.utime(f"{base}.arrow")
+            df, signatures, candidate_index, isbn_index, _ = load_catalogue(base)
+        except FileNotFoundError:
+            # Not cached, or evicted by another worker meanwhile
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.load_ms += (perf_counter() - start) * 1_000
+        return df, signatures, candidate_index, isbn_index
+
+    def put(self, content_hash: str, df: pd.DataFrame, signatures: List[str], candidate_index: Optional[TrigramIndex],
+            isbn_index: IsbnIndex):
+        base = self._base_path(content_hash)
+        save_catalogue(base, df, signatures, candidate_index, isbn_index, {"content_hash": content_hash})
+        self._evict_over_size_cap(keep=f"{base}.arrow")
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "entries": len(entries),
+                "bytes": sum(self._entry_bytes(path) for path, _ in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+                "evictions": self.evictions,
+                "mean_load_ms": self.load_ms / self.hits if self.hits else 0.0,
+            }
+
+    def _evict_over_size_cap(self, keep: str):
+        """Delete the least recently used entries until the cache fits in `max_bytes`."""
+        entries = sorted(self._entries(), key=lambda item: item[1].st_mtime)
+        sizes = {path: self._entry_bytes(path) for path, _ in entries}
+        total_bytes = sum(sizes.values())
+        for path, _ in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            remove_files(*catalogue_files(path[:-len(".arrow")]))
+            total_bytes -= sizes[path]
+            with self._lock:
+                self.evictions += 1
+
+    def _entries(self) -> List[tuple]:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".arrow"):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((path, os.stat(path)))
+                except FileNotFoundError:
+                    pass # Evicted by another worker meanwhile
+        return entries
+
+    @staticmethod
+    def _entry_bytes(arrow_path: str) -> int:
+        total = 0
+        for path in catalogue_files(arrow_path[:-len(".arrow")]):
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _base_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.v{CATALOGUE_FORMAT_VERSION}")
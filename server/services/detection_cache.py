@@ -0,0 +1,127 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from core.config import DETECTION_CACHE_MAX_IMAGES, DETECTION_CACHE_DIR, SESSION_BACKEND
+from core.entities.detection import DetectionIntermediates
+
+
+class DetectionCache:
+    """
+    Model outputs (DetectionIntermediates) of the last images analyzed by this worker,
+    so that new thresholds can be applied without running YOLO and OCR again.
+    Least recently used images are dropped above `max_images`.
+
+    With a `directory` (shared by the uvicorn workers, like the "arrow_file" session backend), the outputs
+    are also written there, so that a re-decision reaching another worker than the detection finds them.
+    The file modification time is the last access time, the least recently used files are deleted
+    above `max_images`.
+    """
+
+    def __init__(self, max_images: int = DETECTION_CACHE_MAX_IMAGES, directory: Optional[str] = None):
+        self.max_images = max_images
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._entries: "OrderedDict[Tuple[str, str], DetectionIntermediates]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.shared_hits = 0 # Part of the hits read from `directory`
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, session_id: str, image_id: str, intermediates: DetectionIntermediates):
+        with self._lock:
+            self._put_in_memory((session_id, image_id), intermediates)
+        if self.directory is not None:
+            self._write(self._path(session_id, image_id), intermediates)
+
+    def get(self, session_id: str, image_id: str) -> Optional[DetectionIntermediates]:
+        with self._lock:
+            intermediates = self._entries.get((session_id, image_id))
+            if intermediates is not None:
+                self.hits += 1
+                self._entries.move_to_end((session_id, image_id))
+                return intermediates
+
+        intermediates = self._read(self._path(session_id, image_id)) if self.directory is not None else None
+        with self._lock:
+            if intermediates is None:
+                self.misses += 1
+            else:
+                # Analyzed by another worker
+                self.hits += 1
+                self.shared_hits += 1
+                self._put_in_memory((session_id, image_id), intermediates)
+            return intermediates
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "images": len(self._entries),
+                "max_images": self.max_images,
+                "shared": self.directory is not None,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _put_in_memory(self, key: Tuple[str, str], intermediates: DetectionIntermediates):
+        """Caller holds the lock."""
+        self._entries[key] = intermediates
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_images:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, session_id: str, image_id: str) -> str:
+        # image_id comes from the URL: hashed with the session, never used as a path
+        return os.path.join(self.directory, hashlib.sha1(f"{session_id}/{image_id}".encode()).hexdigest() + ".pkl")
+
+    def _write(self, path: str, intermediates: DetectionIntermediates):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(intermediates, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict_files(keep=path)
+
+    def _read(self, path: str) -> Optional[DetectionIntermediates]:
+        try:
+            with open(path, "rb") as file:
+                intermediates = pickle.load(file)
+        except FileNotFoundError:
+            return None # Never analyzed, or evicted meanwhile
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return intermediates
+
+    def _evict_files(self, keep: str):
+        """Delete the least recently used files above `max_images`."""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((os.stat(path).st_mtime, path))
+                except FileNotFoundError:
+                    pass # Deleted by another worker meanwhile
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.max_images)]:
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# One cache per worker process (see dependencies.get_detection_cache), its files shared with the other workers
+# when the sessions are (a re-decision needs the session too)
+detection_cache = DetectionCache(directory=DETECTION_CACHE_DIR if SESSION_BACKEND == "arrow_file" else None)
@@ -1,19 +1,173 @@
-from server.core.config import YOLO_MODEL_PATH, PADDLEOCR_MODEL_PATH
-from server.core.detection import detection_pipeline
-from server.core.entities.detection import DetectionResult
-from ultralytics import YOLO
-from paddleocr import PaddleOCR
+from core.config import OCR_BATCH_SIZE, YOLO_BATCH_MAX_SIZE, MODELS_WARMUP, INFERENCE_BACKEND, OCR_CACHE_MAX_BYTES, \
+    INFERENCE_WORKERS, MODELS_RETRY_SECONDS
+from core.detection.detection_pipeline import detection_pipeline, analyze_bookshelf, stream_detection
+from core.detection.scan_pipeline import ShelfScan
+from core.detection.models import load_yolo_model, load_ocr_engine, LockedOcrEngine
+from core.detection.ocr_cache import OcrCache
+from core.detection.utils import detect_books, run_batched_ocr
+from core.detection.yolo_batcher import YoloBatcher
+from services.metrics import observe_analysis
+from functools import partial
+from core.entities.detection import DetectionResult, DetectionIntermediates, DetectionUpdate
+from core.entities.exceptions import ModelsNotLoadedException, EmptyImageException
+import cv2
+import numpy as np
+import threading
+from enum import Enum
+from time import monotonic, perf_counter
+from typing import Any, Dict, Iterator, Optional
 
 
 class DetectionService:
 
     def __init__(self):
-        # 1. Load YOLO model
-        self.yolo_model = YOLO(YOLO_MODEL_PATH)
+        # Per-stage startup timings (ms), exposed by /health
+        self.startup_timings_ms: Dict[str, float] = {}
+
+        # 1. Load YOLO model (PyTorch, ONNX Runtime or OpenVINO, see INFERENCE_BACKEND)
+        start = perf_counter()
+        self.yolo_model = load_yolo_model()
+        self.startup_timings_ms["load_yolo"] = (perf_counter() - start) * 1_000
 
         # 2. Load PaddleOCR model
-        self.ocr_engine = PaddleOCR(text_detection_model_dir=PADDLEOCR_MODEL_PATH, use_doc_orientation_classify=True, lang="fr")
+        start = perf_counter()
+        self.ocr_engine = LockedOcrEngine(load_ocr_engine())
+        self.startup_timings_ms["load_ocr"] = (perf_counter() - start) * 1_000
+
+        # 3. YOLO batcher, started once both models are loaded (its thread is stopped by close)
+        # A single inference worker never has concurrent images: the batch window would only add latency
+        if YOLO_BATCH_MAX_SIZE > 1 and INFERENCE_WORKERS > 1:
+            self.yolo_batcher = YoloBatcher(self.yolo_model)
+            self.detector = self.yolo_batcher.detect
+        else:
+            self.yolo_batcher = None
+            self.detector = partial(detect_books, self.yolo_model)
+
+        # 4. OCR results of the spines already read, per session (see OcrCache)
+        self.ocr_cache = OcrCache() if OCR_CACHE_MAX_BYTES > 0 else None
+
+    def warm_up(self):
+        """Run a synthetic inference through both models (graph compilation, memory allocation...)."""
+        # 1. YOLO, through the batcher if any
+        start = perf_counter()
+        img = np.full((640, 480, 3), 200, dtype=np.uint8)
+        cv2.rectangle(img, (100, 40), (160, 600), (40, 60, 150), -1)
+        try:
+            self.detector(img, 0.25)
+        except EmptyImageException:
+            pass
+        self.startup_timings_ms["warmup_yolo"] = (perf_counter() - start) * 1_000
+
+        # 2. OCR, with a full batch of spine-like crops
+        start = perf_counter()
+        crop = np.full((48, 320, 3), 255, dtype=np.uint8)
+        cv2.putText(crop, "Book Detective", (5, 35), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        run_batched_ocr(self.ocr_engine, [crop] * OCR_BATCH_SIZE)
+        self.startup_timings_ms["warmup_ocr"] = (perf_counter() - start) * 1_000
 
     def process_bookshelf(self, *args, **kwargs) -> DetectionResult:
-        return detection_pipeline(self.yolo_model, self.ocr_engine, *args, **kwargs)
+        return detection_pipeline(self.detector, self.ocr_engine, *args, ocr_cache=self.ocr_cache, **kwargs)
+
+    def analyze_bookshelf(self, *args, **kwargs) -> DetectionIntermediates:
+        """Model stages only (see detection_pipeline.analyze_bookshelf), the decision is applied by the caller."""
+        intermediates = analyze_bookshelf(self.detector, self.ocr_engine, *args, ocr_cache=self.ocr_cache, **kwargs)
+        observe_analysis(intermediates)
+        return intermediates
+
+    def stream_detection(self, *args, on_analyzed=None, **kwargs) -> Iterator[DetectionUpdate]:
+        """Detection yielded as it goes, boxes first (see detection_pipeline.stream_detection)."""
+        def analyzed(intermediates: DetectionIntermediates):
+            observe_analysis(intermediates)
+            if on_analyzed is not None:
+                on_analyzed(intermediates)
+        return stream_detection(self.detector, self.ocr_engine, *args, ocr_cache=self.ocr_cache,
+                                on_analyzed=analyzed, **kwargs)
+
+    def scan_shelf(self, *args, on_analyzed=None, **kwargs) -> ShelfScan:
+        """Pipelined detection of many photos (see scan_pipeline.ShelfScan), run when iterated."""
+        def analyzed(image_id: Optional[str], intermediates: DetectionIntermediates):
+            observe_analysis(intermediates)
+            if on_analyzed is not None:
+                on_analyzed(image_id, intermediates)
+        return ShelfScan(self.detector, self.ocr_engine, *args, ocr_cache=self.ocr_cache, on_analyzed=analyzed,
+                         **kwargs)
+
+    def ocr_cache_stats(self) -> Dict[str, Any]:
+        return self.ocr_cache.stats() if self.ocr_cache is not None else {"enabled": False}
+
+    def close(self):
+        if self.yolo_batcher is not None:
+            self.yolo_batcher.close()
+
+
+class ModelState(str, Enum):
+    NOT_LOADED = "not_loaded"
+    LOADING = "loading"
+    WARMING = "warming"
+    READY = "ready"
+    FAILED = "failed"
+
+
+_detection_service: Optional[DetectionService] = None
+_detection_service_lock = threading.Lock()
+_model_state = ModelState.NOT_LOADED
+_model_error: Optional[str] = None
+_failed_at: Optional[float] = None
+
+def load_detection_service(warm_up: bool = MODELS_WARMUP) -> DetectionService:
+    """
+    Load (and warm up) the models once per worker. Concurrent callers wait for the first one.
+    After a failure, raises right away for MODELS_RETRY_SECONDS instead of loading again on every request.
+    """
+    global _detection_service, _model_state, _model_error, _failed_at
+    with _detection_service_lock:
+        if _detection_service is not None:
+            return _detection_service
+        if _model_state == ModelState.FAILED and monotonic() - _failed_at < MODELS_RETRY_SECONDS:
+            raise ModelsNotLoadedException(f"Detection models could not be loaded: {_model_error}")
+
+        start = perf_counter()
+        _model_state = ModelState.LOADING
+        service = None
+        try:
+            service = DetectionService()
+            if warm_up:
+                _model_state = ModelState.WARMING
+                service.warm_up()
+        except Exception as e:
+            if service is not None:
+                service.close()
+            _model_state = ModelState.FAILED
+            _model_error = str(e)
+            _failed_at = monotonic()
+            raise ModelsNotLoadedException(f"Detection models could not be loaded: {e}")
+
+        service.startup_timings_ms["total"] = (perf_counter() - start) * 1_000
+        _detection_service = service
+        _model_state = ModelState.READY
+        _model_error = None
+        print(f"detection models ready ({INFERENCE_BACKEND}), startup timings (ms):", service.startup_timings_ms)
+        if service.yolo_batcher is None:
+            print(f"YOLO micro-batching off (INFERENCE_WORKERS={INFERENCE_WORKERS}, YOLO_BATCH_MAX_SIZE={YOLO_BATCH_MAX_SIZE}),"
+                  " see 'YOLO micro-batching' in the README")
+        return service
+
+def get_detection_service() -> DetectionService:
+    """Shared DetectionService of this worker. Never waits for a loading in progress: raises instead."""
+    if _detection_service is not None:
+        return _detection_service
+    if _model_state in (ModelState.LOADING, ModelState.WARMING):
+        raise ModelsNotLoadedException("Detection models are warming up, retry later")
+    return load_detection_service()
+
+def loaded_detection_service() -> Optional[DetectionService]:
+    """DetectionService of this worker if its models are loaded, without loading them (e.g. for /metrics)."""
+    return _detection_service
 
+def get_model_status() -> Dict[str, Any]:
+    """State of the models of this worker, for /health."""
+    return {
+        "state": _model_state.value,
+        "startup_timings_ms": _detection_service.startup_timings_ms if _detection_service is not None else {},
+        "error": _model_error,
+    }
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from time import perf_counter
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Tuple
+from core.config import INFERENCE_WORKERS, INFERENCE_MAX_QUEUE, SCAN_MAX_CONCURRENT, SCAN_QUEUE_SIZE
+from core.entities.exceptions import InferenceQueueFullException
+from services.metrics import queue_depth
+
+
+class InferenceExecutor:
+    """
+    Runs blocking inference (YOLO + OCR) on dedicated threads, off the event loop and off
+    the threadpool used by FastAPI for sync routes.
+
+    At most `max_workers` jobs run at once and `max_queue` more may wait;
+    further jobs are rejected right away instead of piling up.
+    Multi-photo scans (which run for many photos, with stage threads of their own) don't take these slots:
+    at most `max_scans` run at once, on their own threads, and the next ones are rejected.
+    """
+
+    def __init__(self, max_workers: int = INFERENCE_WORKERS, max_queue: int = INFERENCE_MAX_QUEUE,
+                 max_scans: int = SCAN_MAX_CONCURRENT):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_scans = max_scans
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._scan_executor = ThreadPoolExecutor(max_workers=max_scans, thread_name_prefix="scan")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._scans_in_flight = 0
+        self.rejected = 0
+        self.rejected_scans = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+        """Run `fn` on an inference thread. Returns its result and the time spent waiting for a thread (ms)."""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFullException("Too many detections in progress, retry later")
+            queue_depth.observe(self._in_flight)
+            self._in_flight += 1
+
+        submitted_at = perf_counter()
+
+        def job():
+            queue_wait_ms = (perf_counter() - submitted_at) * 1_000
+            return fn(*args, **kwargs), queue_wait_ms
+
+        # The slot is released when the job ends, even if the client went away before
+        try:
+            future = self._executor.submit(job)
+        except RuntimeError:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def stream(self, items: Iterable, scan: bool = False) -> AsyncIterator:
+        """
+        Iterate `items` (e.g. stream_detection) on an inference thread, and hand each item over to the event loop.
+        With `scan`, `items` (a ShelfScan) runs on a scan thread instead, within the `max_scans` limit.
+        The slot is taken right away (InferenceQueueFullException before any item), and released when the
+        iteration ends; if the consumer stops early, no further item is started.
+        """
+        with self._lock:
+            if scan:
+                if self._scans_in_flight >= self.max_scans:
+                    self.rejected_scans += 1
+                    raise InferenceQueueFullException("Too many scans in progress, retry later")
+                self._scans_in_flight += 1
+            else:
+                if self._in_flight >= self.max_workers + self.max_queue:
+                    self.rejected += 1
+                    raise InferenceQueueFullException("Too many detections in progress, retry later")
+                queue_depth.observe(self._in_flight)
+                self._in_flight += 1
+        executor, release = (self._scan_executor, self._release_scan) if scan else (self._executor, self._release)
+
+        loop = asyncio.get_running_loop()
+        # Bounded: a slow client holds back the iteration instead of letting the results pile up in memory
+        handover: asyncio.Queue = asyncio.Queue(maxsize=SCAN_QUEUE_SIZE)
+        cancelled = threading.Event()
+        done = object()
+
+        def hand_over(entry) -> bool:
+            """Put `entry` in the handover, waiting while it is full. False if the consumer went away."""
+            put = asyncio.run_coroutine_threadsafe(handover.put(entry), loop)
+            while True:
+                try:
+                    put.result(timeout=0.1)
+                    return True
+                except FutureTimeoutError:
+                    if cancelled.is_set():
+                        put.cancel()
+                        return False
+
+        def job():
+            iterator = iter(items)
+            try:
+                # Checked before each item: nothing new is started once the consumer stopped
+                while not cancelled.is_set():
+                    item = next(iterator, done)
+                    if item is done:
+                        break
+                    if not hand_over((item, None)):
+                        return
+            except Exception as e:
+                hand_over((done, e))
+                return
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+            if not cancelled.is_set():
+                hand_over((done, None))
+
+        try:
+            future = executor.submit(job)
+        except RuntimeError:
+            release()
+            raise
+        future.add_done_callback(lambda _: release())
+
+        async def consume():
+            try:
+                while True:
+                    item, error = await handover.get()
+                    if error is not None:
+                        raise error
+                    if item is done:
+                        return
+                    yield item
+            finally:
+                cancelled.set()
+
+        return consume()
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _release_scan(self):
+        with self._lock:
+            self._scans_in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "rejected": self.rejected,
+                "max_scans": self.max_scans,
+                "scans_in_flight": self._scans_in_flight,
+                "rejected_scans": self.rejected_scans,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._scan_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# One executor per worker process (see dependencies.get_inference_executor)
+inference_executor = InferenceExecutor()
@@ -1,50 +1,185 @@
+import asyncio
 import pandas as pd
+import threading
 import time
-from typing import Dict, Any
-from core.config import TTL_SECONDS
-from core.entities.detection import DetectionParams
+import uuid
+from typing import BinaryIO, Dict, Any, List, Optional
+from core.catalogue import read_catalogue_csv, build_signatures, build_candidate_index, build_isbn_index, \
+    to_arrow_dtypes
+from core.config import TTL_SECONDS, CATALOGUE_CACHE_ENABLED, PERSISTENCE_ENABLED
+from core.detection.candidate_index import TrigramIndex
+from core.detection.isbn import IsbnIndex
+from core.entities.detection import DetectionParams, DetectionResult
 from core.entities.inventory_session import InventorySession
-import pandas as pd
+from services.catalogue_cache import CatalogueCache, hash_upload
+from services.inventory_store import InventoryStore, inventory_store
+from services.metrics import catalogue_rows
+from services.session_backends import SessionBackend, make_session_backend
 
 class InventorySessionService:
-    def __init__(self):
-        self._sessions: Dict[str, InventorySession] = {}
+    def __init__(self, backend: Optional[SessionBackend] = None, catalogue_cache: Optional[CatalogueCache] = None,
+                 store: Optional[InventoryStore] = None):
+        # Where sessions are stored: this worker's RAM, or files shared by every worker (see core/config.py)
+        self.backend = backend if backend is not None else make_session_backend()
+        # Prepared catalogues of previous uploads (None = disabled)
+        if catalogue_cache is None and CATALOGUE_CACHE_ENABLED:
+            catalogue_cache = CatalogueCache()
+        self.catalogue_cache = catalogue_cache
+        # Database copy of the sessions and their detections (None = not persisted)
+        self.store = store
+        self._restoring: Dict[str, asyncio.Future] = {}
         self.TTL_SECONDS = TTL_SECONDS
 
-    def create_session(self, session_id: str, df: pd.DataFrame, detection_params: DetectionParams):
-        """Charge le CSV, prépare les signatures et stocke le tout en RAM."""       
-        # Préparation des signatures pour le Fuzzy Matching (Optimisation)
-        signatures = (df['author'].astype(str) + " " + df['title'].astype(str)).tolist()
+        # Counters
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.restored = 0
+
+    def create_session_from_csv(self, session_id: str, csv_file: BinaryIO, detection_params: DetectionParams) -> int:
+        """
+        Parse an uploaded CSV (or load it from the catalogue cache if the same file was uploaded before)
+        and create the session. Returns the number of books. Blocking: call it off the event loop.
+        """
+        if self.catalogue_cache is None:
+            df = read_catalogue_csv(csv_file)
+            self.create_session(session_id, df, detection_params)
+            return len(df)
+
+        content_hash = hash_upload(csv_file)
+        cached = self.catalogue_cache.get(content_hash)
+        if cached is not None:
+            df, signatures, candidate_index, isbn_index = cached
+            print("catalogue loaded from cache:", content_hash)
+        else:
+            df = read_catalogue_csv(csv_file)
+            signatures = build_signatures(df)
+            candidate_index = build_candidate_index(signatures)
+            isbn_index = build_isbn_index(df)
+            self.catalogue_cache.put(content_hash, df, signatures, candidate_index, isbn_index)
+
+        self.create_session(session_id, df, detection_params, signatures, candidate_index, isbn_index,
+                            catalogue_id=content_hash)
+        return len(df)
+
+    def create_session(self, session_id: str, df: pd.DataFrame, detection_params: DetectionParams,
+                       signatures: Optional[List[str]] = None, candidate_index: Optional[TrigramIndex] = None,
+                       isbn_index: Optional[IsbnIndex] = None, catalogue_id: Optional[str] = None,
+                       scan_session_id: Optional[str] = None):
+        """Charge le CSV, prépare les signatures et stocke le tout en RAM (et en base, sauf pour une restauration)."""
+        if signatures is None:
+            # Préparation des signatures pour le Fuzzy Matching (Optimisation)
+            signatures = build_signatures(df)
+            candidate_index = build_candidate_index(signatures)
+        if isbn_index is None:
+            isbn_index = build_isbn_index(df)
+        # Parsed, restored or loaded from the catalogue cache: the session holds the same dtypes
+        df = to_arrow_dtypes(df)
 
-        self._sessions[session_id] = InventorySession(
+        catalogue_rows.observe(len(df))
+        nbytes = int(df.memory_usage(deep=True).sum()) + isbn_index.nbytes
+        if candidate_index is not None:
+            nbytes += candidate_index.nbytes
+
+        catalogue_id = catalogue_id or uuid.uuid4().hex
+        if scan_session_id is None and self.store is not None:
+            # Queued only (written by the store's background task); "" = not saved, nor will its detections be
+            scan_session_id = uuid.uuid4().hex
+            if not (self.store.add_catalogue(catalogue_id, df)
+                    and self.store.add_session(scan_session_id, session_id, catalogue_id, detection_params)):
+                scan_session_id = ""
+        self.backend.put(InventorySession(
             session_id=session_id,
             signatures=signatures,
             df=df,
             last_access=time.time(),
-            detection_params=detection_params
-        )
-
-        print("saved new session with df columns:", list(df.columns.values))
-        print(len(df), "rows")
-        print("session_id:", session_id)
-        print("detection_params:", detection_params)
+            detection_params=detection_params,
+            candidate_index=candidate_index,
+            isbn_index=isbn_index,
+            nbytes=nbytes,
+            catalogue_id=catalogue_id,
+            scan_session_id=scan_session_id or ""
+        ))
 
     def get_session_data(self, session_id: str):
         """Récupère les données d'un utilisateur et met à jour son temps d'accès."""
-        if session_id not in self._sessions:
+        session = self.backend.get(session_id)
+        with self._lock:
+            if session is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return session
+
+    async def get_or_restore_session(self, session_id: str) -> Optional[InventorySession]:
+        """
+        Like get_session_data, but a session missing from the store (restart, expiry, eviction) is restored from
+        the database: its catalogue comes from the catalogue cache if still there, else from catalogue_books.
+        Concurrent requests of the same session wait for a single restore.
+        """
+        session = self.get_session_data(session_id)
+        if session is not None or self.store is None:
+            return session
+
+        restoring = self._restoring.get(session_id)
+        if restoring is None:
+            restoring = self._restoring[session_id] = asyncio.ensure_future(self._restore(session_id))
+            restoring.add_done_callback(lambda _: self._restoring.pop(session_id, None))
+        return await asyncio.shield(restoring)
+
+    async def _restore(self, session_id: str) -> Optional[InventorySession]:
+        saved = await self.store.load_latest_session(session_id)
+        if saved is None:
             return None
-        
-        self._sessions[session_id].last_access = time.time()
-        return self._sessions[session_id]
+
+        cached = None
+        if self.catalogue_cache is not None:
+            cached = await asyncio.to_thread(self.catalogue_cache.get, saved.catalogue_id)
+        if cached is not None:
+            df, signatures, candidate_index, isbn_index = cached
+        else:
+            df = await self.store.load_catalogue(saved.catalogue_id)
+            if df is None:
+                return None
+            signatures = candidate_index = isbn_index = None
+
+        # Signatures and indexes are rebuilt off the event loop
+        await asyncio.to_thread(self.create_session, session_id, df, saved.detection_params, signatures,
+                                candidate_index, isbn_index, catalogue_id=saved.catalogue_id,
+                                scan_session_id=saved.scan_session_id)
+        with self._lock:
+            self.restored += 1
+        print("session restored from the database:", session_id)
+        return self.backend.get(session_id)
+
+    def save_result(self, session: InventorySession, result: DetectionResult):
+        """Queue the detections of a photo for the database (replacing the previous decision of that photo)."""
+        if self.store is not None and session.scan_session_id and result.image_id:
+            self.store.add_result(session.scan_session_id, result)
 
     def cleanup_inactive_sessions(self):
         """Supprime les sessions trop vieilles pour libérer la RAM."""
-        now = time.time()
-        expired_sessions = [
-            sid for sid, data in self._sessions.items() 
-            if (now - data.last_access) > self.TTL_SECONDS
-        ]
-        
-        for sid in expired_sessions:
-            del self._sessions[sid]
-            print(f"Nettoyage : Session {sid} expirée et supprimée.")
\ No newline at end of file
+        for sid in self.backend.expire(self.TTL_SECONDS):
+            print(f"Nettoyage : Session {sid} expirée et supprimée.")
+
+    async def run_sweeper(self, interval_seconds: float):
+        """Background task: expire inactive sessions every `interval_seconds`."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            self.cleanup_inactive_sessions()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Counters of the catalogue cache."""
+        if self.catalogue_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.catalogue_cache.stats()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the session store."""
+        with self._lock:
+            counters = {"hits": self.hits, "misses": self.misses, "restored": self.restored}
+        return {**self.backend.stats(), **counters}
+
+
+# One shared store per worker process (see dependencies.get_inventory_session_service)
+inventory_session_service = InventorySessionService(store=inventory_store if PERSISTENCE_ENABLED else None)
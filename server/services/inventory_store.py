@@ -0,0 +1,318 @@
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+import pandas as pd
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.catalogue import COLUMN_DTYPES
+from core.config import PERSISTENCE_MAX_PENDING, PERSISTENCE_CHUNK_ROWS
+from core.entities.detection import DetectionParams, DetectionResult, DETECTION_STATUSES, MATCH_METHODS
+from database.database import async_engine
+from database.models.inventory import Catalogue, CatalogueBook, ScanSession, Detection
+
+BOOK_COLUMNS = ["title", "author", "isbn", "editor"]
+
+
+@dataclass
+class SavedSession:
+    scan_session_id: str
+    catalogue_id: str
+    detection_params: DetectionParams
+
+
+def catalogue_records(catalogue_id: str, df: pd.DataFrame) -> List[tuple]:
+    """(catalogue_id, row, title, author, isbn, editor) of every book, None for the missing cells."""
+    columns = []
+    for column in BOOK_COLUMNS:
+        if column in df.columns:
+            values = df[column].astype(object)
+            columns.append(values.where(values.notna(), None).tolist())
+        else:
+            columns.append([None] * len(df))
+    return list(zip([catalogue_id] * len(df), range(len(df)), *columns))
+
+
+def detection_rows(scan_session_id: str, result: DetectionResult) -> List[Dict[str, Any]]:
+    detections = result.detections
+    # Columns as Python lists once, rather than a numpy scalar per cell
+    polygons = detections.polygons.tolist()
+    yolo_confidences = detections.yolo_confidences.tolist()
+    ocr_confidences = detections.ocr_confidences.tolist()
+    statuses, methods = detections.statuses.tolist(), detections.match_methods.tolist()
+    best_rows, best_scores = detections.candidate_rows[:, 0].tolist(), detections.candidate_scores[:, 0].tolist()
+
+    rows = []
+    for position in range(len(detections)):
+        best_row = best_rows[position]
+        rows.append({
+            "scan_session_id": scan_session_id,
+            "image_id": result.image_id,
+            "position": position,
+            "status": DETECTION_STATUSES[statuses[position]].value,
+            "match_method": MATCH_METHODS[methods[position]].value,
+            "box_polygon": polygons[position],
+            "yolo_confidence": yolo_confidences[position],
+            "ocr_confidence": ocr_confidences[position],
+            "ocr_raw_text": detections.ocr_raw_texts[position],
+            "ocr_cleaned_text": detections.ocr_cleaned_texts[position],
+            "catalogue_row": best_row if best_row >= 0 else None,
+            "match_score": best_scores[position] if best_row >= 0 else None,
+        })
+    return rows
+
+
+class InventoryStore:
+    """
+    Database persistence of the inventory sessions: catalogues, sessions and the detections of every photo.
+
+    Requests only queue what to write (no I/O); a background task (see main.lifespan) flushes the queue
+    in batches: catalogue books are bulk-loaded (COPY with asyncpg, executemany otherwise) and the detections
+    of a photo replace the previous ones (re-decisions). Above `max_pending` queued writes, new ones are
+    dropped and counted instead of piling up while the database is unreachable. Each session (and its
+    detections) is written in its own savepoint, so that a failing one doesn't lose the others of the flush.
+    """
+
+    def __init__(self, engine: Optional[AsyncEngine] = None, max_pending: int = PERSISTENCE_MAX_PENDING,
+                 chunk_rows: int = PERSISTENCE_CHUNK_ROWS):
+        self.engine = engine if engine is not None else async_engine
+        self.max_pending = max_pending
+        self.chunk_rows = chunk_rows
+        self._pending: Deque[tuple] = deque()
+        self._known_catalogues: Set[str] = set() # Already in the database (or queued): never written twice
+        self._lost_sessions: Set[str] = set() # Sessions that could not be written: their results are not queued
+        self._stopping = asyncio.Event()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.written = {"catalogues": 0, "books": 0, "sessions": 0, "images": 0, "detections": 0}
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.flush_ms = 0.0
+
+    # --- Queueing (any thread, no I/O) ---
+
+    def add_catalogue(self, catalogue_id: str, df: pd.DataFrame) -> bool:
+        """Queue a catalogue, unless already written or queued. False if it was dropped (queue full)."""
+        with self._lock:
+            if catalogue_id in self._known_catalogues:
+                return True
+        if not self._enqueue(("catalogue", catalogue_id, df)):
+            return False
+        with self._lock:
+            self._known_catalogues.add(catalogue_id)
+        return True
+
+    def add_session(self, scan_session_id: str, user_id: int, catalogue_id: str,
+                    detection_params: DetectionParams) -> bool:
+        """Queue a scan session (call add_catalogue first). False if it was dropped: don't save its results."""
+        params = {f.name: getattr(detection_params, f.name) for f in fields(DetectionParams)}
+        # Set now, not by the database: sessions written in one flush would share the same now()
+        return self._enqueue(("session", {"id": scan_session_id, "user_id": user_id, "catalogue_id": catalogue_id,
+                                          "detection_params": params, "started_at": datetime.now(timezone.utc)}))
+
+    def add_result(self, scan_session_id: str, result: DetectionResult):
+        with self._lock:
+            if scan_session_id in self._lost_sessions:
+                self.failed += 1
+                return
+        self._enqueue(("result", scan_session_id, result))
+
+    def _enqueue(self, item: tuple) -> bool:
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append(item)
+            return True
+
+    def _lose_sessions(self, scan_session_ids):
+        with self._lock:
+            self._lost_sessions.update(scan_session_ids)
+
+    # --- Writing (event loop) ---
+
+    async def run(self, interval_seconds: float):
+        """Background task: flush the queued writes every `interval_seconds`, until stop() (then flushes once more)."""
+        self._stopping.clear()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def stop(self):
+        """Ends run() after its current flush: await the task rather than cancelling it, a cancelled batch is lost."""
+        self._stopping.set()
+
+    async def flush(self):
+        with self._lock:
+            items = list(self._pending)
+            self._pending.clear()
+        if not items:
+            return
+        start = perf_counter()
+
+        # Foreign keys: catalogues, then sessions, then photos (the last result of a photo wins)
+        catalogues = [(item[1], item[2]) for item in items if item[0] == "catalogue"]
+        sessions = [item[1] for item in items if item[0] == "session"]
+        results = {(item[1], item[2].image_id): item[2] for item in items if item[0] == "result"}
+
+        failed_catalogues = set()
+        for catalogue_id, df in catalogues:
+            if not await self._attempt(self._write_catalogue(catalogue_id, df), 1):
+                failed_catalogues.add(catalogue_id)
+                with self._lock:
+                    self._known_catalogues.discard(catalogue_id) # Written again by its next upload
+
+        # A session whose catalogue is not in the database can't be written, nor its results
+        orphans = [session["id"] for session in sessions if session["catalogue_id"] in failed_catalogues]
+        if orphans:
+            self.failed += len(orphans)
+            self._lose_sessions(orphans)
+        sessions = [session for session in sessions if session["catalogue_id"] not in failed_catalogues]
+        if sessions and not await self._attempt(self._write_sessions(sessions), len(sessions)):
+            self._lose_sessions(session["id"] for session in sessions)
+
+        with self._lock:
+            lost = {key for key in results if key[0] in self._lost_sessions}
+        self.failed += len(lost)
+        results = {key: result for key, result in results.items() if key not in lost}
+        if results:
+            await self._attempt(self._write_results(results), len(results))
+
+        self.flushes += 1
+        self.flush_ms += (perf_counter() - start) * 1_000
+
+    async def _attempt(self, write, n_items: int) -> bool:
+        # Persistence is best effort: a failed batch is reported and dropped, the sessions keep working in memory
+        try:
+            await write
+            return True
+        except Exception as e:
+            self.failed += n_items
+            print("inventory store: write failed:", repr(e))
+            return False
+
+    async def _write_catalogue(self, catalogue_id: str, df: pd.DataFrame):
+        try:
+            async with self.engine.begin() as conn:
+                exists = await conn.scalar(select(Catalogue.id).where(Catalogue.id == catalogue_id))
+                if exists is not None:
+                    return
+                await conn.execute(insert(Catalogue).values(id=catalogue_id, row_count=len(df)))
+                records = await asyncio.to_thread(catalogue_records, catalogue_id, df)
+                columns = ["catalogue_id", "row"] + BOOK_COLUMNS
+
+                if conn.dialect.driver == "asyncpg":
+                    # COPY: the fastest bulk load Postgres offers
+                    raw = await conn.get_raw_connection()
+                    for start in range(0, len(records), self.chunk_rows):
+                        await raw.driver_connection.copy_records_to_table(
+                            CatalogueBook.__tablename__, records=records[start:start + self.chunk_rows],
+                            columns=columns)
+                else:
+                    for start in range(0, len(records), self.chunk_rows):
+                        await conn.execute(insert(CatalogueBook), [dict(zip(columns, record)) for record
+                                                                   in records[start:start + self.chunk_rows]])
+        except IntegrityError:
+            # Another worker wrote the same catalogue (same CSV hash) first: its copy is the one kept
+            async with self.engine.connect() as conn:
+                if await conn.scalar(select(Catalogue.id).where(Catalogue.id == catalogue_id)) is None:
+                    raise
+            return
+        self.written["catalogues"] += 1
+        self.written["books"] += len(records)
+
+    async def _write_sessions(self, sessions: List[Dict[str, Any]]):
+        # One savepoint per session: a failing one (e.g. user deleted meanwhile) doesn't take the others with it
+        async with self.engine.begin() as conn:
+            for session in sessions:
+                try:
+                    async with conn.begin_nested():
+                        await conn.execute(insert(ScanSession), [session])
+                except DBAPIError as e:
+                    self.failed += 1
+                    self._lose_sessions([session["id"]])
+                    print("inventory store: session write failed:", repr(e))
+                else:
+                    self.written["sessions"] += 1
+
+    async def _write_results(self, results: Dict[Tuple[str, str], DetectionResult]):
+        by_session: Dict[str, Dict[str, DetectionResult]] = {}
+        for (scan_session_id, image_id), result in results.items():
+            by_session.setdefault(scan_session_id, {})[image_id] = result
+
+        # One savepoint per session, like _write_sessions
+        async with self.engine.begin() as conn:
+            for scan_session_id, session_results in by_session.items():
+                rows = [row for result in session_results.values() for row in detection_rows(scan_session_id, result)]
+                try:
+                    async with conn.begin_nested():
+                        await conn.execute(delete(Detection).where(Detection.scan_session_id == scan_session_id,
+                                                                   Detection.image_id.in_(list(session_results))))
+                        if rows:
+                            await conn.execute(insert(Detection), rows)
+                except DBAPIError as e:
+                    self.failed += len(session_results)
+                    print("inventory store: detections write failed:", repr(e))
+                else:
+                    self.written["images"] += len(session_results)
+                    self.written["detections"] += len(rows)
+
+    # --- Reading (session restore) ---
+
+    async def load_latest_session(self, user_id: int) -> Optional[SavedSession]:
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                select(ScanSession.id, ScanSession.catalogue_id, ScanSession.detection_params)
+                .where(ScanSession.user_id == user_id)
+                .order_by(ScanSession.started_at.desc(), ScanSession.id.desc())
+                .limit(1)
+            )).first()
+        if row is None:
+            return None
+        return SavedSession(scan_session_id=row.id, catalogue_id=row.catalogue_id,
+                            detection_params=DetectionParams(**row.detection_params))
+
+    async def load_catalogue(self, catalogue_id: str) -> Optional[pd.DataFrame]:
+        """Books of a catalogue, in the row order of the upload (same db_id), with the dtypes of read_catalogue_csv."""
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(*(getattr(CatalogueBook, column) for column in BOOK_COLUMNS))
+                .where(CatalogueBook.catalogue_id == catalogue_id)
+                .order_by(CatalogueBook.row)
+            )
+            records = result.all()
+        if not records:
+            return None
+
+        df = pd.DataFrame.from_records(records, columns=BOOK_COLUMNS)
+        if df["editor"].isna().all():
+            df = df.drop(columns="editor")
+        with self._lock:
+            self._known_catalogues.add(catalogue_id)
+        return df.astype({column: COLUMN_DTYPES[column] for column in df.columns})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "max_pending": self.max_pending,
+            **{f"written_{kind}": n for kind, n in self.written.items()},
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "flush_ms": self.flush_ms,
+        }
+
+
+# One store per worker process, flushed by a task of the FastAPI lifespan
+inventory_store = InventoryStore()
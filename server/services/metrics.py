@@ -0,0 +1,122 @@
+import bisect
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from core.detection.timing import STAGES
+from core.entities.detection import DetectionIntermediates
+
+# Collected samples: (name, type, help, [(labels, value)])
+Samples = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    """Prometheus histogram (cumulative buckets, sum and count), per combination of label values."""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = sorted(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], List[float]] = {} # label values -> bucket counts..., +Inf, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(counts) for key, counts in self._series.items()}
+        for key, counts in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + [float("inf")], counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {counts[-1]:g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of this worker in the Prometheus text format (GET /metrics).
+    Histograms are observed as requests go; counters and gauges are read from the services when scraped.
+    """
+
+    def __init__(self):
+        self._histograms: List[Histogram] = []
+        self._collectors: List[Callable[[], List[Samples]]] = []
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        histogram = Histogram(name, help, buckets, labelnames)
+        self._histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collector: Callable[[], List[Samples]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self._histograms:
+            lines += histogram.render()
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_format_labels(labels)} {float(value):g}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+# One registry per worker process (each worker is scraped on its own)
+metrics = MetricsRegistry()
+
+stage_latency = metrics.histogram(
+    "book_detective_stage_seconds", "Time spent in each stage of a detection",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10), labelnames=("stage",))
+detection_latency = metrics.histogram(
+    "book_detective_detection_seconds", "Model stages of a detection, from decoding to matching",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32))
+spines_per_image = metrics.histogram(
+    "book_detective_spines_per_image", "Boxes read on a photo (down to the floor confidence)",
+    buckets=(0, 5, 10, 20, 40, 60, 80, 120, 160, 240))
+catalogue_rows = metrics.histogram(
+    "book_detective_catalogue_rows", "Books of the catalogues loaded into sessions",
+    buckets=(100, 1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_000_000))
+queue_depth = metrics.histogram(
+    "book_detective_inference_queue_depth", "Detections in flight (running or waiting) when one is submitted",
+    buckets=(0, 1, 2, 4, 8, 16, 32))
+
+
+def observe_analysis(intermediates: DetectionIntermediates):
+    """Record the stage timings and spine count of a detection that ran the models."""
+    for stage in STAGES:
+        if stage in intermediates.stage_timings_ms:
+            stage_latency.observe(intermediates.stage_timings_ms[stage] / 1_000, stage=stage)
+    detection_latency.observe(intermediates.processing_time_ms / 1_000)
+    spines_per_image.observe(len(intermediates.obb_points))
+
+
+def cache_samples(prefix: str, help: str, stats: Optional[Dict[str, Any]]) -> List[Samples]:
+    """Hits, misses and hit rate of a cache, from its stats() (nothing if the cache is disabled)."""
+    if not stats or "hits" not in stats:
+        return []
+    lookups = stats["hits"] + stats["misses"]
+    return [
+        (f"{prefix}_hits_total", "counter", f"{help} hits", [({}, stats["hits"])]),
+        (f"{prefix}_misses_total", "counter", f"{help} misses", [({}, stats["misses"])]),
+        (f"{prefix}_hit_rate", "gauge", f"{help} hit rate since the worker started",
+         [({}, stats["hits"] / lookups if lookups else 0.0)]),
+    ]
@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Tuple
+from core.config import PROFILER, PROFILE_DIR
+from core.entities.exceptions import ProfilerBusyException
+
+# One profile at a time per worker: cProfile fails if another profiler is active, and overlapping runs
+# would each see the other's calls
+_profiling_lock = threading.Lock()
+
+
+def run_profiled(fn: Callable, *args, profile_name: str, profiler: str = PROFILER, **kwargs) -> Tuple[Any, str]:
+    """
+    Run `fn` under cProfile or pyinstrument, and dump the profile into PROFILE_DIR.
+    Returns the result of `fn` and the file name of the profile.
+    Raises ProfilerBusyException (without running `fn`) while another profile is running.
+    """
+    if not _profiling_lock.acquire(blocking=False):
+        raise ProfilerBusyException("A profile is already running, retry later")
+    try:
+        return _run_profiled(fn, *args, profile_name=profile_name, profiler=profiler, **kwargs)
+    finally:
+        _profiling_lock.release()
+
+
+def _run_profiled(fn: Callable, *args, profile_name: str, profiler: str, **kwargs) -> Tuple[Any, str]:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{profile_name}")
+
+    if profiler == "pyinstrument":
+        # Optional dependency: only imported when asked for
+        from pyinstrument import Profiler
+        sampler = Profiler(interval=0.001)
+        sampler.start()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            sampler.stop()
+            path = base + ".html"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(sampler.output_html())
+        return result, os.path.basename(path)
+
+    if profiler != "cprofile":
+        raise ValueError(f"Unknown profiler: {profiler}")
+    import cProfile
+    profile = cProfile.Profile()
+    try:
+        result = profile.runcall(fn, *args, **kwargs)
+    finally:
+        path = base + ".prof"
+        profile.dump_stats(path)
+    return result, os.path.basename(path)
@@ -0,0 +1,237 @@
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import fields
+from typing import Dict, Any, List, Optional
+from core.config import SESSION_BACKEND, SESSION_STORE_DIR, MAX_SESSIONS_BYTES
+from core.catalogue import save_catalogue, load_catalogue, catalogue_files, remove_files
+from core.entities.detection import DetectionParams
+from core.entities.inventory_session import InventorySession
+
+
+class SessionBackend(ABC):
+    """Storage of the inventory sessions used by InventorySessionService. Implementations are thread-safe."""
+
+    @abstractmethod
+    def put(self, session: InventorySession):
+        ...
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[InventorySession]:
+        """Return the session and mark it as accessed, or None."""
+        ...
+
+    @abstractmethod
+    def expire(self, ttl_seconds: float) -> List[str]:
+        """Remove the sessions inactive for more than `ttl_seconds` and return their ids."""
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Sessions kept in this process, evicted least recently used first above `max_bytes`."""
+
+    def __init__(self, max_bytes: int = MAX_SESSIONS_BYTES):
+        # Least recently used session first
+        self._sessions: "OrderedDict[str, InventorySession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+
+    def put(self, session: InventorySession):
+        with self._lock:
+            self._remove(session.session_id)
+            self._sessions[session.session_id] = session
+            self._total_bytes += session.nbytes
+
+            # The most recent session is always kept, even if it is larger than the cap on its own
+            while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+                sid = next(iter(self._sessions))
+                self._remove(sid)
+                self.evictions += 1
+                print(f"Nettoyage : Session {sid} évincée (mémoire).")
+
+    def get(self, session_id: str) -> Optional[InventorySession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = time.time()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def expire(self, ttl_seconds: float) -> List[str]:
+        now = time.time()
+        with self._lock:
+            expired_sessions = [
+                sid for sid, data in self._sessions.items()
+                if (now - data.last_access) > ttl_seconds
+            ]
+            for sid in expired_sessions:
+                self._remove(sid)
+            self.expirations += len(expired_sessions)
+        return expired_sessions
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, session_id: str):
+        """Drop a session (caller holds the lock)."""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session.nbytes
+
+
+class ArrowFileSessionBackend(SessionBackend):
+    """
+    Sessions serialized once as Arrow IPC files, shared by every worker process.
+
+    Each worker memory-maps the file: the catalogue columns are read zero-copy
+    (DataFrame backed by ArrowDtype), so N workers share one copy of the data in the page cache.
+    With the default directory in /dev/shm, the files never touch the disk.
+    The file modification time is the last access time, so TTL and LRU work across workers.
+    """
+
+    def __init__(self, directory: str = SESSION_STORE_DIR, max_bytes: int = MAX_SESSIONS_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        # Sessions already mapped by this worker (by file name), with the inode of the file they come from
+        self._mapped: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def put(self, session: InventorySession):
+        base = self._base_path(session.session_id)
+        metadata = {
+            "session_id": session.session_id,
+            "catalogue_id": session.catalogue_id,
+            "scan_session_id": session.scan_session_id,
+            "detection_params": {f.name: getattr(session.detection_params, f.name) for f in fields(DetectionParams)},
+        }
+        save_catalogue(base, session.df, session.signatures, session.candidate_index, session.isbn_index, metadata)
+
+        self._evict_over_memory_cap(keep=f"{base}.arrow")
+
+    def get(self, session_id: str) -> Optional[InventorySession]:
+        base = self._base_path(session_id)
+        key = os.path.basename(base)
+        # Twice at most: the session may be replaced by another worker between the .arrow and its arrays
+        for attempt in range(2):
+            try:
+                stat = os.stat(f"{base}.arrow")
+                os.utime(f"{base}.arrow")
+                with self._lock:
+                    mapped = self._mapped.get(key)
+                    if mapped is not None and mapped[0] == stat.st_ino:
+                        session = mapped[1]
+                    else:
+                        session = self._map(base, stat.st_size)
+                        self._mapped[key] = (stat.st_ino, session)
+                break
+            except FileNotFoundError:
+                with self._lock:
+                    self._mapped.pop(key, None)
+                if attempt:
+                    return None
+
+        session.last_access = time.time()
+        return session
+
+    def expire(self, ttl_seconds: float) -> List[str]:
+        now = time.time()
+        expired_sessions = []
+        for path, stat in self._session_files():
+            if (now - stat.st_mtime) > ttl_seconds:
+                expired_sessions.append(self._delete(path))
+        self.expirations += len(expired_sessions)
+        return expired_sessions
+
+    def stats(self) -> Dict[str, Any]:
+        files = self._session_files()
+        return {
+            "backend": "arrow_file",
+            "directory": self.directory,
+            "sessions": len(files),
+            "bytes": sum(stat.st_size for _, stat in files),
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _map(self, base: str, nbytes: int) -> InventorySession:
+        """Memory-map the session files of another (or this) worker."""
+        df, signatures, candidate_index, isbn_index, metadata = load_catalogue(base)
+        return InventorySession(
+            session_id=metadata["session_id"],
+            signatures=signatures,
+            df=df,
+            last_access=time.time(),
+            detection_params=DetectionParams(**metadata["detection_params"]),
+            candidate_index=candidate_index,
+            isbn_index=isbn_index,
+            nbytes=nbytes,
+            catalogue_id=metadata.get("catalogue_id", ""),
+            scan_session_id=metadata.get("scan_session_id", "")
+        )
+
+    def _evict_over_memory_cap(self, keep: str):
+        """Delete the least recently accessed session files until the store fits in `max_bytes`."""
+        files = sorted(self._session_files(), key=lambda item: item[1].st_mtime)
+        total_bytes = sum(stat.st_size for _, stat in files)
+        for path, stat in files:
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            sid = self._delete(path)
+            total_bytes -= stat.st_size
+            self.evictions += 1
+            print(f"Nettoyage : Session {sid} évincée (mémoire).")
+
+    def _session_files(self) -> List[tuple]:
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".arrow"):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((path, os.stat(path)))
+                except FileNotFoundError:
+                    pass # Deleted by another worker meanwhile
+        return files
+
+    def _delete(self, arrow_path: str) -> str:
+        base = arrow_path[:-len(".arrow")]
+        remove_files(*catalogue_files(base))
+        session_id = os.path.basename(base)
+        with self._lock:
+            self._mapped.pop(session_id, None)
+        return session_id
+
+    def _base_path(self, session_id: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w-]", "_", str(session_id)))
+
+
+def make_session_backend(name: str = SESSION_BACKEND) -> SessionBackend:
+    """Build the session backend selected in the config."""
+    if name == "memory":
+        return InMemorySessionBackend()
+    if name == "arrow_file":
+        return ArrowFileSessionBackend()
+    raise ValueError(f"Unknown session backend: {name}")